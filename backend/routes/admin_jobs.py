@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+
+from auth import require_admin
+from routes.admin_vehicles import AdminJSONResponse
+from services.job_service import get_job, list_jobs, serialize_job
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin-jobs"],
+    default_response_class=AdminJSONResponse
+)
+
+
+@router.get("/jobs")
+async def list_background_jobs(
+    type: Optional[str] = Query(default=None, description="Filter by job type (csv_import, vehicle_sync, clean_images)"),
+    status: Optional[str] = Query(default=None, description="Filter by status (queued, running, succeeded, failed)"),
+    limit: int = Query(default=20, ge=1, le=100),
+    _: bool = Depends(require_admin)
+):
+    """Most recent background jobs first."""
+    jobs = await list_jobs(job_type=type, status=status, limit=limit)
+    return {"jobs": [serialize_job(job) for job in jobs]}
+
+
+@router.get("/jobs/{job_id}")
+async def get_background_job(job_id: str, _: bool = Depends(require_admin)):
+    """
+    Poll a background job.
+
+    `progress` is updated while the job runs; `result` holds the same
+    report the synchronous endpoint would have returned once `status` is
+    "succeeded", `error` the failure reason once it is "failed".
+    """
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialize_job(job)
@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+
+from auth import require_admin
+from routes.admin_vehicles import AdminJSONResponse
+from services.outbox_service import (
+    get_outbox_stats, list_outbox_messages, requeue_outbox_messages, serialize_outbox_message
+)
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin-outbox"],
+    default_response_class=AdminJSONResponse
+)
+
+
+@router.get("/outbox")
+async def get_outbox_summary(_: bool = Depends(require_admin)):
+    """
+    Delivery backlog per channel (mailchimp, email, sms, slack).
+
+    Counts per status (pending, sending, sent, skipped, dead), when the
+    oldest pending message was queued, and counters of events vs. messages
+    actually sent (digests merge several events into one message).
+    """
+    return await get_outbox_stats()
+
+
+@router.get("/outbox/messages")
+async def list_outbox(
+    status: Optional[str] = Query(default=None, description="Filter by status (pending, sending, sent, skipped, dead)"),
+    channel: Optional[str] = Query(default=None, description="Filter by channel (mailchimp, email, sms, slack)"),
+    limit: int = Query(default=50, ge=1, le=200),
+    _: bool = Depends(require_admin)
+):
+    """Most recent outbox messages first, with their last delivery error."""
+    messages = await list_outbox_messages(status=status, channel=channel, limit=limit)
+    return {"messages": [serialize_outbox_message(message) for message in messages]}
+
+
+@router.post("/outbox/requeue")
+async def requeue_dead_messages(
+    channel: Optional[str] = Query(default=None, description="Only requeue this channel"),
+    _: bool = Depends(require_admin)
+):
+    """Retry every dead-lettered message (e.g. after fixing provider credentials)."""
+    requeued = await requeue_outbox_messages(channel=channel)
+    return {"success": True, "requeued": requeued}
+
+
+@router.post("/outbox/{message_id}/requeue")
+async def requeue_dead_message(message_id: str, _: bool = Depends(require_admin)):
+    """Retry one dead-lettered message."""
+    requeued = await requeue_outbox_messages(message_id=message_id)
+    if not requeued:
+        raise HTTPException(status_code=404, detail="Dead-lettered message not found")
+    return {"success": True, "requeued": requeued}
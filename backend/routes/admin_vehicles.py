@@ -7,6 +7,7 @@ import os
 import uuid
 import logging
 import io
+import asyncio
 
 from motor.motor_asyncio import AsyncIOMotorClient
 
@@ -19,10 +20,32 @@ from models.vehicle_admin import (
     AdminLoginResponse
 )
 from services.image_service import (
-    process_and_store_image,
+    process_and_store_image_file,
     ImageValidationError,
+    MAX_FILE_SIZE_MB,
     normalize_images_field,
     migrate_legacy_photo_urls,
+    decode_data_url,
+)
+from services.image_pipeline import (
+    ImagePipelineBusyError,
+    IMAGE_RETRY_AFTER_SECONDS,
+    get_image_pipeline_stats,
+)
+from services.vehicle_derived_fields import (
+    compute_derived_fields,
+    refresh_derived_fields,
+    backfill_derived_fields,
+)
+from services.derivative_cache import derivative_cache
+from services.indexes import ensure_indexes, get_index_report
+from services.inventory_cache import invalidate_inventory_cache, get_inventory_cache_stats
+from services.image_store import (
+    get_image_store,
+    build_image_url,
+    delete_image_blobs,
+    release_replaced_images,
+    get_blob_index_stats,
 )
 from services.csv_import_service import (
     process_csv_import,
@@ -36,6 +59,9 @@ from services.image_cleaning_service import (
     CROP_BOTTOM_PIXELS,
     CROP_TOP_PIXELS,
 )
+from services.vehicle_sync_service import run_vehicle_sync
+from services.job_service import submit_job, register_job_handler, JobContext, JobConflictError
+from utils.multipart_stream import iter_spooled_uploads, MultipartStreamError, SpooledUpload
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +84,26 @@ def set_db(database):
     global db
     db = database
 
+
+async def queue_admin_job(job_type: str, params: dict, payload=None, payload_filename: Optional[str] = None) -> JSONResponse:
+    """Submit a background job and answer 202 with its id (409 if one is already active)."""
+    try:
+        job = await submit_job(job_type, params, payload=payload, payload_filename=payload_filename)
+    except JobConflictError as e:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": str(e), "job_id": e.job_id, "status_url": f"/api/admin/jobs/{e.job_id}"}
+        )
+    return AdminJSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "job_id": job["_id"],
+            "status": job["status"],
+            "status_url": f"/api/admin/jobs/{job['_id']}",
+        }
+    )
+
 def get_vehicles_collection():
     return db["admin_vehicles"]
 
@@ -153,9 +199,11 @@ async def create_vehicle(payload: VehicleCreate, _: bool = Depends(require_admin
         "created_at": now,
         "updated_at": now,
     }
+    doc.update(compute_derived_fields(doc))
     
     result = await coll.insert_one(doc)
     doc["_id"] = result.inserted_id
+    invalidate_inventory_cache("create_vehicle")
     
     logger.info(f"Created vehicle: {payload.year} {payload.make} {payload.model} (VIN: {payload.vin})")
     return serialize_vehicle(doc)
@@ -274,6 +322,54 @@ async def debug_vehicle_counts(_: bool = Depends(require_admin)):
     }
 
 
+@router.get("/indexes")
+async def index_report(_: bool = Depends(require_admin)):
+    """
+    Compare the declared index registry with the live MongoDB indexes.
+    
+    - `missing`: declared but not present (queries on that path may scan)
+    - `mismatched`: same name, different keys/options
+    - `extra`: present but not declared (write overhead, maybe stale)
+    """
+    report = await get_index_report(db)
+    healthy = all(
+        not (entry["missing"] or entry["mismatched"])
+        for entry in report.values()
+    )
+    return {"healthy": healthy, "collections": report}
+
+
+@router.get("/cache/stats")
+async def inventory_cache_stats(_: bool = Depends(require_admin)):
+    """Hit/miss statistics for the public inventory response cache."""
+    return get_inventory_cache_stats()
+
+
+@router.get("/image-pipeline/stats")
+async def image_pipeline_stats(_: bool = Depends(require_admin)):
+    """Worker count, queue depth and rejections for the image process pool."""
+    return get_image_pipeline_stats()
+
+
+@router.get("/image-blobs/stats")
+async def image_blob_stats(_: bool = Depends(require_admin)):
+    """Content-addressed image index: stored blobs vs references (dedup savings)."""
+    return await get_blob_index_stats()
+
+
+@router.get("/image-derivatives/stats")
+async def image_derivative_stats(_: bool = Depends(require_admin)):
+    """On-demand derivative cache: size, hit ratio, evictions."""
+    return await derivative_cache.stats()
+
+
+@router.post("/indexes/ensure")
+async def ensure_index_registry(_: bool = Depends(require_admin)):
+    """Re-apply the index registry (same as on startup). Idempotent."""
+    results = await ensure_indexes(db)
+    return {"success": True, "results": results}
+
+
 # Rate limiting for sync (simple in-memory tracker)
 sync_last_run = {}
 SYNC_COOLDOWN_SECONDS = 60  # 1 minute cooldown
@@ -283,21 +379,28 @@ async def sync_vehicles_to_admin(
     request: Request,
     source_collection: str = Query(default="vehicles", description="Source collection name"),
     dry_run: bool = Query(default=False, description="Preview only - don't write to database"),
+    full: bool = Query(default=False, description="Ignore the last-sync watermark and read the whole source"),
+    async_job: bool = Query(default=False, description="Run as a background job; poll /api/admin/jobs/{job_id}"),
     _: bool = Depends(require_admin)
 ):
     """
     Sync vehicles from a source collection to admin_vehicles.
     
     This endpoint:
-    1. Reads from the specified source collection
-    2. Normalizes the data to admin format
-    3. Upserts into admin_vehicles by VIN
+    1. Reads source documents updated since the last sync (all of them
+       on the first run or with `full=true`)
+    2. Normalizes the data to admin format and fingerprints it
+    3. Writes only new or changed vehicles into admin_vehicles by VIN
     
     Use this to fix mismatches between public API and admin panel.
     
     **Parameters:**
     - `source_collection`: Collection to read from (default: "vehicles")
     - `dry_run`: If true, only preview what would happen (no writes)
+    - `full`: If true, re-read the whole source instead of only documents
+      whose `updated_at` advanced (unchanged vehicles are still not written)
+    - `async_job`: If true, respond 202 with a job id right away; the
+      report becomes the job's `result`
     
     **Rate limited**: Can only be run once per minute (dry_run excluded).
     """
@@ -322,191 +425,36 @@ async def sync_vehicles_to_admin(
             detail=f"Source collection '{source_collection}' not found. Available: {collections}"
         )
     
-    source = db[source_collection]
-    target = db["admin_vehicles"]
-    
-    inserted = 0
-    updated = 0
-    skipped = 0
-    unchanged = 0
-    errors = []
-    preview_samples = []  # For dry_run
-    
-    # Get all documents from source
-    cursor = source.find({})
-    docs = await cursor.to_list(length=1000)
+    if async_job:
+        response = await queue_admin_job("vehicle_sync", {
+            "source_collection": source_collection,
+            "dry_run": dry_run,
+            "full": full,
+        })
+        if not dry_run:
+            sync_last_run[client_ip] = current_time
+        return response
     
-    logger.info(f"Sync {'(DRY RUN) ' if dry_run else ''}starting: {len(docs)} documents from '{source_collection}'")
-    
-    for doc in docs:
-        try:
-            # Get VIN (try different field names)
-            vin = doc.get("vin") or doc.get("VIN") or doc.get("Vin")
-            
-            if not vin:
-                skipped += 1
-                continue
-            
-            # Normalize the document
-            normalized = normalize_vehicle_for_admin(doc)
-            normalized["vin"] = vin
-            normalized["updated_at"] = datetime.now(timezone.utc)
-            
-            # Check if exists
-            existing = await target.find_one({"vin": vin})
-            
-            if dry_run:
-                # Preview mode - just count what would happen
-                action = "update" if existing else "insert"
-                if existing:
-                    updated += 1
-                else:
-                    inserted += 1
-                
-                # Add sample for preview (first 10)
-                if len(preview_samples) < 10:
-                    preview_samples.append({
-                        "vin": vin,
-                        "action": action,
-                        "vehicle": f"{normalized.get('year')} {normalized.get('make')} {normalized.get('model')}",
-                        "stock": normalized.get("stock_number"),
-                    })
-            else:
-                # Actually perform the upsert
-                result = await target.update_one(
-                    {"vin": vin},
-                    {
-                        "$set": normalized,
-                        "$setOnInsert": {"created_at": datetime.now(timezone.utc)}
-                    },
-                    upsert=True
-                )
-                
-                if result.upserted_id:
-                    inserted += 1
-                elif result.modified_count:
-                    updated += 1
-                else:
-                    unchanged += 1
-                
-        except Exception as e:
-            logger.error(f"Sync error for doc: {e}")
-            errors.append(str(e)[:100])
-            skipped += 1
+    result = await run_vehicle_sync(db, source_collection, dry_run=dry_run, full=full)
     
     # Update rate limit tracker (only for actual runs)
     if not dry_run:
         sync_last_run[client_ip] = current_time
     
-    # Get counts
-    source_count = await source.count_documents({})
-    target_count = await target.count_documents({})
-    
-    logger.info(f"Sync {'(DRY RUN) ' if dry_run else ''}complete: {inserted} inserted, {updated} updated, {skipped} skipped")
-    
-    result = {
-        "success": True,
-        "dry_run": dry_run,
-        "source_collection": source_collection,
-        "target_collection": "admin_vehicles",
-        "source_count": source_count,
-        "results": {
-            "would_insert" if dry_run else "inserted": inserted,
-            "would_update" if dry_run else "updated": updated,
-            "skipped": skipped,
-        },
-        "target_count_before" if dry_run else "target_count_after": target_count,
-        "errors": errors[:5] if errors else [],
-    }
-    
-    # Add preview samples for dry_run
-    if dry_run:
-        result["preview_samples"] = preview_samples
-        result["message"] = f"DRY RUN: Would insert {inserted}, update {updated}, skip {skipped}. Run without dry_run=true to execute."
-    else:
-        result["unchanged"] = unchanged
-    
     return result
 
 
-def normalize_vehicle_for_admin(doc: dict) -> dict:
-    """
-    Normalize a vehicle document from any source to admin_vehicles format.
-    
-    Handles common field name variations and data type differences.
-    """
-    # Price normalization
-    price = doc.get("price") or doc.get("internetPrice") or doc.get("salePrice") or doc.get("Price")
-    if price is not None:
-        try:
-            if isinstance(price, str):
-                price = float(price.replace(",", "").replace("$", "").strip())
-            price = float(price)
-        except (ValueError, TypeError):
-            price = None
-    
-    # Mileage normalization
-    mileage = doc.get("mileage") or doc.get("odometer") or doc.get("Mileage")
-    if mileage is not None:
-        try:
-            if isinstance(mileage, str):
-                mileage = int(mileage.replace(",", "").strip())
-            mileage = int(mileage)
-        except (ValueError, TypeError):
-            mileage = None
-    
-    # Year normalization
-    year = doc.get("year") or doc.get("Year")
-    if year is not None:
-        try:
-            year = int(year)
-        except (ValueError, TypeError):
-            year = None
-    
-    # Images normalization
-    images = doc.get("images") or doc.get("photos") or doc.get("image_urls") or []
-    if isinstance(images, str):
-        images = [{"url": images, "is_primary": True}]
-    elif isinstance(images, list):
-        # Normalize to [{url, is_primary}] format
-        normalized_images = []
-        for i, img in enumerate(images):
-            if isinstance(img, str):
-                normalized_images.append({"url": img, "is_primary": i == 0})
-            elif isinstance(img, dict):
-                normalized_images.append(img)
-        images = normalized_images
-    
-    # Handle primary_image_url separately
-    primary_url = doc.get("primary_image_url") or doc.get("image_url")
-    if primary_url and not images:
-        images = [{"url": primary_url, "is_primary": True}]
-    
-    return {
-        "stock_number": doc.get("stock_number") or doc.get("stock") or doc.get("stockNumber") or doc.get("stock_id"),
-        "year": year,
-        "make": (doc.get("make") or doc.get("Make") or "").strip(),
-        "model": (doc.get("model") or doc.get("Model") or "").strip(),
-        "trim": (doc.get("trim") or doc.get("Trim") or "").strip(),
-        "mileage": mileage,
-        "price": price,
-        "condition": doc.get("condition") or doc.get("Condition") or "Used",
-        "body_style": doc.get("body_style") or doc.get("bodyStyle") or doc.get("body") or "",
-        "exterior_color": doc.get("exterior_color") or doc.get("exteriorColor") or doc.get("color") or "",
-        "interior_color": doc.get("interior_color") or doc.get("interiorColor") or "",
-        "transmission": doc.get("transmission") or doc.get("Transmission") or "",
-        "drivetrain": doc.get("drivetrain") or doc.get("driveType") or "",
-        "fuel_type": doc.get("fuel_type") or doc.get("fuelType") or "",
-        "engine": doc.get("engine") or doc.get("Engine") or "",
-        "carfax_url": doc.get("carfax_url") or doc.get("carfaxUrl") or "",
-        "window_sticker_url": doc.get("window_sticker_url") or doc.get("windowStickerUrl") or "",
-        "images": images,
-        "is_active": doc.get("is_active", True),
-        "is_featured_homepage": doc.get("is_featured_homepage", False),
-        "featured_rank": doc.get("featured_rank"),
-        "call_for_availability_enabled": doc.get("call_for_availability_enabled", False),
-        "sync_source": "admin_sync",
-    }
+async def run_vehicle_sync_job(job: JobContext) -> dict:
+    return await run_vehicle_sync(
+        db,
+        job.params["source_collection"],
+        dry_run=job.params["dry_run"],
+        full=job.params.get("full", False),
+        progress=job.progress,
+    )
+
+
+register_job_handler("vehicle_sync", run_vehicle_sync_job)
 
 
 # Get Single Vehicle
@@ -547,12 +495,15 @@ async def update_vehicle(
     # Only update fields that are provided
     update_data = {k: v for k, v in payload.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc)
+    update_data.update(compute_derived_fields({**vehicle, **update_data}))
     
     await coll.update_one(
         {"_id": ObjectId(vehicle_id)},
         {"$set": update_data}
     )
     
+    invalidate_inventory_cache("update_vehicle")
+    
     updated = await coll.find_one({"_id": ObjectId(vehicle_id)})
     logger.info(f"Updated vehicle: {vehicle_id}")
     return serialize_vehicle(updated)
@@ -565,38 +516,74 @@ async def delete_vehicle(vehicle_id: str, _: bool = Depends(require_admin)):
     coll = get_vehicles_collection()
     
     try:
-        result = await coll.delete_one({"_id": ObjectId(vehicle_id)})
+        deleted = await coll.find_one_and_delete(
+            {"_id": ObjectId(vehicle_id)},
+            projection={"images": 1}
+        )
     except:
         raise HTTPException(status_code=400, detail="Invalid vehicle ID")
     
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
+    invalidate_inventory_cache("delete_vehicle")
+    await delete_image_blobs(deleted.get("images") or [])
+    
     logger.info(f"Deleted vehicle: {vehicle_id}")
     return {"message": "Vehicle deleted successfully"}
 
 
-# Upload Photos - NEW IMPLEMENTATION with Base64 storage
+# Upload Photos - streamed to temp files, stored as binary blobs in the image store
 MAX_IMAGES_PER_VEHICLE = int(os.environ.get("MAX_IMAGES_PER_VEHICLE", "12"))
 
-@router.post("/vehicles/{vehicle_id}/photos")
+# Multipart framing allowed per file on top of its bytes (Content-Length pre-check)
+UPLOAD_PART_OVERHEAD_BYTES = 64 * 1024
+
+UPLOAD_PHOTOS_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["files"],
+            "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+        }}},
+    }
+}
+
+@router.post("/vehicles/{vehicle_id}/photos", openapi_extra=UPLOAD_PHOTOS_OPENAPI)
 async def upload_vehicle_photos(
     vehicle_id: str,
-    files: List[UploadFile] = File(...),
+    request: Request,
     _: bool = Depends(require_admin)
 ):
     """
-    Upload photos for a vehicle.
+    Upload photos for a vehicle (multipart field "files").
     
-    Images are processed, optimized, and stored as Base64 data URLs in MongoDB.
-    This ensures persistence across deploys/restarts.
+    The body is streamed: each file is spooled to a temp file as it arrives
+    (size limit enforced while reading), processed in the image pool from
+    that file, and appended to the vehicle with its own $push as soon as it
+    is stored. Images are appended in upload order. Memory use does not
+    grow with the number of files.
     
     Limits:
-    - Max 12 images per vehicle (configurable)
-    - Max 8MB per image
+    - Max 12 images per vehicle (configurable); extra files are rejected
+      individually
+    - Max 15MB per image (MAX_UPLOAD_MB)
     - Accepts: JPG, PNG, WebP
     """
     coll = get_vehicles_collection()
+    max_file_bytes = MAX_FILE_SIZE_MB * 1024 * 1024
+    
+    # Refuse bodies that can't possibly fit before reading any of them
+    content_length = request.headers.get("content-length", "")
+    max_body_bytes = MAX_IMAGES_PER_VEHICLE * (max_file_bytes + UPLOAD_PART_OVERHEAD_BYTES)
+    if content_length.isdigit() and int(content_length) > max_body_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail={
+                "message": f"Upload too large. Maximum {MAX_IMAGES_PER_VEHICLE} images of {MAX_FILE_SIZE_MB}MB each.",
+            }
+        )
     
     try:
         vehicle = await coll.find_one({"_id": ObjectId(vehicle_id)})
@@ -609,51 +596,129 @@ async def upload_vehicle_photos(
     # Get existing images
     existing_images = normalize_images_field(vehicle)
     current_count = len(existing_images)
+    remaining_slots = MAX_IMAGES_PER_VEHICLE - current_count
     
-    # Check if adding these would exceed the limit
-    if current_count + len(files) > MAX_IMAGES_PER_VEHICLE:
-        remaining_slots = MAX_IMAGES_PER_VEHICLE - current_count
+    if remaining_slots <= 0:
         raise HTTPException(
             status_code=400,
             detail={
                 "message": f"Image limit exceeded. Maximum {MAX_IMAGES_PER_VEHICLE} images per vehicle.",
                 "current_count": current_count,
-                "remaining_slots": remaining_slots,
-                "attempted_upload": len(files)
+                "remaining_slots": 0,
             }
         )
     
-    uploaded_images = []
-    errors = []
+    # Legacy documents keep photos in photo_urls only; materialize images[]
+    # once so the per-image $push appends after them
+    if existing_images and vehicle.get("images") != existing_images:
+        await coll.update_one(
+            {"_id": vehicle["_id"]},
+            {"$set": {
+                "images": existing_images,
+                "photo_urls": [img.get("url", "") for img in existing_images],
+            }}
+        )
+    
+    needs_primary = current_count == 0
     
-    for i, file in enumerate(files):
+    async def process_upload(upload: SpooledUpload, previous_pushed: asyncio.Event, pushed: asyncio.Event):
+        """Returns (image_dict, None) or (None, error_dict)."""
+        nonlocal needs_primary
         try:
-            # Read file content
-            content = await file.read()
+            if upload.error:
+                raise ImageValidationError(upload.error)
             
-            # Determine if this should be primary (first image if none exist)
-            is_primary = len(existing_images) == 0 and i == 0
-            
-            # Process and store image
-            vehicle_image = await process_and_store_image(
-                content=content,
-                filename=file.filename,
-                content_type=file.content_type,
-                is_primary=is_primary,
+            # Process (in the image pool, reading the spool file) and store image
+            vehicle_image = await process_and_store_image_file(
+                path=upload.path,
+                filename=upload.filename,
+                size_bytes=upload.size,
+                digest=upload.sha256,
+                content_type=upload.content_type,
                 create_thumb=True,
             )
+            image = vehicle_image.to_dict()
             
-            uploaded_images.append(vehicle_image.to_dict())
-            logger.info(f"Processed image: {file.filename} for vehicle {vehicle_id}")
+            # Append in upload order; the guard keeps concurrent requests
+            # from pushing past the per-vehicle limit
+            await previous_pushed.wait()
+            image["is_primary"] = needs_primary
+            result = await coll.update_one(
+                {"_id": vehicle["_id"], f"images.{MAX_IMAGES_PER_VEHICLE - 1}": {"$exists": False}},
+                {
+                    "$push": {"images": image, "photo_urls": image["url"]},
+                    "$set": {"updated_at": datetime.now(timezone.utc)},
+                }
+            )
+            if not result.matched_count:
+                await delete_image_blobs([image])
+                raise ImageValidationError(
+                    f"Image limit exceeded. Maximum {MAX_IMAGES_PER_VEHICLE} images per vehicle."
+                )
+            needs_primary = False
+            
+            logger.info(f"Processed image: {upload.filename} for vehicle {vehicle_id}")
+            return image, None
             
         except ImageValidationError as e:
-            errors.append({"filename": file.filename, "error": str(e)})
-            logger.warning(f"Image validation failed: {file.filename} - {e}")
+            logger.warning(f"Image validation failed: {upload.filename} - {e}")
+            return None, {"filename": upload.filename, "error": str(e)}
+        except ImagePipelineBusyError as e:
+            logger.warning(f"Image pipeline busy: {upload.filename}")
+            return None, {"filename": upload.filename, "error": str(e), "busy": True}
         except Exception as e:
-            errors.append({"filename": file.filename, "error": f"Processing failed: {str(e)}"})
-            logger.error(f"Image processing error: {file.filename} - {e}")
-    
-    if not uploaded_images and errors:
+            logger.error(f"Image processing error: {upload.filename} - {e}")
+            return None, {"filename": upload.filename, "error": f"Processing failed: {str(e)}"}
+        finally:
+            upload.cleanup()
+            await previous_pushed.wait()
+            pushed.set()
+    
+    # Each file starts processing as soon as it has been received
+    tasks = []
+    previous_pushed = asyncio.Event()
+    previous_pushed.set()
+    stream_error = None
+    try:
+        async for upload in iter_spooled_uploads(request, "files", remaining_slots, max_file_bytes):
+            pushed = asyncio.Event()
+            tasks.append(asyncio.create_task(process_upload(upload, previous_pushed, pushed)))
+            previous_pushed = pushed
+    except MultipartStreamError as e:
+        stream_error = str(e)
+    
+    results = await asyncio.gather(*tasks)
+    uploaded_images = [image for image, _ in results if image]
+    errors = [error for _, error in results if error]
+    
+    if uploaded_images:
+        # Derived fields once for the whole batch
+        vehicle = await coll.find_one({"_id": vehicle["_id"]})
+        await coll.update_one(
+            {"_id": vehicle["_id"]},
+            {"$set": {
+                "updated_at": datetime.now(timezone.utc),
+                **compute_derived_fields(vehicle),
+            }}
+        )
+        invalidate_inventory_cache("upload_photos")
+    
+    if stream_error and not uploaded_images:
+        raise HTTPException(status_code=400, detail={"message": stream_error, "errors": errors})
+    
+    if not results:
+        raise HTTPException(status_code=400, detail={"message": "No files uploaded"})
+    
+    if not uploaded_images:
+        if any(error.get("busy") for error in errors):
+            raise HTTPException(
+                status_code=503,
+                detail={
+                    "message": "Image processing is busy. Please retry shortly.",
+                    "errors": errors
+                },
+                headers={"Retry-After": str(IMAGE_RETRY_AFTER_SECONDS)},
+            )
         raise HTTPException(
             status_code=400,
             detail={
@@ -662,22 +727,9 @@ async def upload_vehicle_photos(
             }
         )
     
-    # Merge with existing images
-    all_images = existing_images + uploaded_images
-    
-    # Extract URLs for legacy photo_urls field
+    all_images = normalize_images_field(vehicle)
     photo_urls = [img.get("url", "") for img in all_images]
     
-    # Update vehicle
-    await coll.update_one(
-        {"_id": vehicle["_id"]},
-        {"$set": {
-            "images": all_images,
-            "photo_urls": photo_urls,
-            "updated_at": datetime.now(timezone.utc)
-        }}
-    )
-    
     logger.info(f"Uploaded {len(uploaded_images)} photos for vehicle: {vehicle_id}")
     
     response = {
@@ -688,9 +740,16 @@ async def upload_vehicle_photos(
         "photo_urls": photo_urls,
     }
     
-    if errors:
+    if errors or stream_error:
         response["errors"] = errors
-        response["message"] = f"Uploaded {len(uploaded_images)} of {len(files)} files"
+        response["message"] = f"Uploaded {len(uploaded_images)} of {len(results)} files"
+    if stream_error:
+        # Files after the point the stream broke were never received
+        response["stream_error"] = stream_error
+        response["message"] = (
+            f"Uploaded {len(uploaded_images)} of {len(results)} files received before the upload broke off: "
+            f"{stream_error}"
+        )
     
     return response
 
@@ -734,9 +793,13 @@ async def delete_vehicle_photo(
         {"$set": {
             "images": images,
             "photo_urls": photo_urls,
-            "updated_at": datetime.now(timezone.utc)
+            "updated_at": datetime.now(timezone.utc),
+            **compute_derived_fields({**vehicle, "images": images}),
         }}
     )
+    invalidate_inventory_cache("photos_changed")
+    
+    await delete_image_blobs([removed_image])
     
     logger.info(f"Deleted photo {photo_index} from vehicle: {vehicle_id}")
     
@@ -791,9 +854,13 @@ async def delete_vehicle_photo_by_id(
         {"$set": {
             "images": images,
             "photo_urls": photo_urls,
-            "updated_at": datetime.now(timezone.utc)
+            "updated_at": datetime.now(timezone.utc),
+            **compute_derived_fields({**vehicle, "images": images}),
         }}
     )
+    invalidate_inventory_cache("photos_changed")
+    
+    await delete_image_blobs([removed_image])
     
     return {
         "success": True,
@@ -841,9 +908,11 @@ async def set_primary_photo(
         {"$set": {
             "images": images,
             "photo_urls": photo_urls,
-            "updated_at": datetime.now(timezone.utc)
+            "updated_at": datetime.now(timezone.utc),
+            **compute_derived_fields({**vehicle, "images": images}),
         }}
     )
+    invalidate_inventory_cache("photos_changed")
     
     return {
         "success": True,
@@ -886,10 +955,15 @@ async def migrate_all_images(_: bool = Depends(require_admin)):
             {"$set": {
                 "images": images,
                 "photo_urls": photo_urls,
+                **compute_derived_fields({**vehicle, "images": images}),
+                "updated_at": datetime.now(timezone.utc),
             }}
         )
+        await release_replaced_images(vehicle.get("images"), images)
         migrated += 1
     
+    if migrated:
+        invalidate_inventory_cache("migrate_images")
     logger.info(f"Image migration complete: {migrated} migrated, {skipped} skipped")
     
     return {
@@ -900,6 +974,132 @@ async def migrate_all_images(_: bool = Depends(require_admin)):
     }
 
 
+@router.post("/migrate-derived-fields")
+async def migrate_derived_fields(
+    force: bool = Query(default=False, description="Recompute for all vehicles, not only missing ones"),
+    _: bool = Depends(require_admin)
+):
+    """
+    Backfill precomputed list-view fields (primary_thumbnail_url, card)
+    and normalized facet fields (make_norm, model_norm, ...).
+    Safe to run multiple times (idempotent).
+    """
+    coll = get_vehicles_collection()
+    
+    if force:
+        updated = await refresh_derived_fields(coll, {})
+    else:
+        updated = await backfill_derived_fields(coll)
+    
+    invalidate_inventory_cache("migrate_derived_fields")
+    logger.info(f"Derived fields backfill complete: {updated} vehicles updated")
+    
+    return {
+        "success": True,
+        "updated": updated,
+        "force": force,
+    }
+
+
+# Image fields that may hold inline data URLs, mapped to store variant names
+DATA_URL_VARIANTS = {
+    "orig": "orig",
+    "clean": "clean",
+    "full": "full",
+    "display": "display",
+    "thumb": "thumb",
+    "url": "full",
+    "thumbnail_url": "thumb",
+}
+
+
+@router.post("/migrate-images-to-store")
+async def migrate_images_to_store(
+    limit: int = Query(default=100, ge=1, le=1000, description="Max vehicles to migrate per run"),
+    _: bool = Depends(require_admin)
+):
+    """
+    Move inline Base64 data URLs out of vehicle documents into the image store.
+    
+    Each distinct data URL is stored once as raw bytes and replaced by its
+    /api/images/{upload_id}/{variant} URL. Safe to run multiple times.
+    """
+    coll = get_vehicles_collection()
+    store = get_image_store()
+    
+    query = {"$or": [
+        {"images.url": {"$regex": "^data:"}},
+        {"images.thumbnail_url": {"$regex": "^data:"}},
+        {"photo_urls": {"$regex": "^data:"}},
+    ]}
+    
+    migrated = 0
+    blobs_written = 0
+    errors = []
+    
+    async for vehicle in coll.find(query).limit(limit):
+        try:
+            # Entries are rewritten in place; keep the originals to release dropped blobs
+            old_images = [dict(img) if isinstance(img, dict) else img for img in vehicle.get("images") or []]
+            images = normalize_images_field(vehicle)
+            
+            for img in images:
+                # Deduplicated entries share their upload_id; never write into it
+                if img.get("blob_id"):
+                    continue
+                upload_id = img.get("upload_id") or str(uuid.uuid4())
+                img["upload_id"] = upload_id
+                stored = {}  # data URL -> new URL
+                used_variants = set()
+                
+                for field, variant in DATA_URL_VARIANTS.items():
+                    value = img.get(field)
+                    if not isinstance(value, str) or not value.startswith("data:"):
+                        continue
+                    
+                    if value not in stored:
+                        if variant in used_variants:
+                            variant = field
+                        content, mime_type = decode_data_url(value)
+                        await store.put(upload_id, variant, content, mime_type)
+                        used_variants.add(variant)
+                        stored[value] = build_image_url(upload_id, variant)
+                        blobs_written += 1
+                    
+                    img[field] = stored[value]
+            
+            photo_urls = [img.get("url", "") for img in images]
+            await coll.update_one(
+                {"_id": vehicle["_id"]},
+                {"$set": {
+                    "images": images,
+                    "photo_urls": photo_urls,
+                    **compute_derived_fields({**vehicle, "images": images}),
+                    "updated_at": datetime.now(timezone.utc),
+                }}
+            )
+            await release_replaced_images(old_images, images)
+            migrated += 1
+        
+        except Exception as e:
+            logger.error(f"Image store migration error for {vehicle['_id']}: {e}")
+            errors.append(f"{vehicle['_id']}: {str(e)[:100]}")
+    
+    if migrated:
+        invalidate_inventory_cache("migrate_images_to_store")
+    
+    remaining = await coll.count_documents(query)
+    logger.info(f"Image store migration: {migrated} vehicles, {blobs_written} blobs written, {remaining} remaining")
+    
+    return {
+        "success": not errors,
+        "migrated": migrated,
+        "blobs_written": blobs_written,
+        "remaining": remaining,
+        "errors": errors[:10],
+    }
+
+
 # ============================================================
 # CSV IMPORT ENDPOINTS
 # ============================================================
@@ -913,6 +1113,7 @@ async def import_vehicles_csv(
     request: Request,
     file: UploadFile = File(...),
     dry_run: bool = Query(default=True, description="Preview only, no database changes"),
+    async_job: bool = Query(default=False, description="Run as a background job; poll /api/admin/jobs/{job_id}"),
     _: bool = Depends(require_admin)
 ):
     """
@@ -920,9 +1121,14 @@ async def import_vehicles_csv(
     
     - **dry_run=true**: Preview import (default) - validates and shows what would happen
     - **dry_run=false**: Execute import - creates/updates vehicles in database
+    - **async_job=true**: Store the file and respond 202 with a job id; the
+      import runs in the background with progress on /api/admin/jobs/{job_id}
     
     VIN is the unique identifier. Existing VINs will be updated, new VINs will be created.
     
+    Files up to MAX_CSV_SIZE_MB (100MB by default) are streamed and written
+    in batches. Only the first 200 row errors are listed; counts are exact.
+    
     Required CSV columns: vin, year, make, model, price
     """
     # Rate limiting
@@ -943,23 +1149,27 @@ async def import_vehicles_csv(
     if not file.filename.lower().endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be a CSV file")
     
-    # Read file content
-    try:
-        content = await file.read()
-    except Exception as e:
-        logger.error(f"CSV upload read error: {e}")
-        raise HTTPException(status_code=400, detail="Failed to read uploaded file")
-    
-    # Check file size
-    if len(content) > MAX_CSV_SIZE_MB * 1024 * 1024:
+    # Check file size (the upload is already spooled to a temp file)
+    if file.size is not None and file.size > MAX_CSV_SIZE_MB * 1024 * 1024:
         raise HTTPException(
             status_code=400, 
             detail=f"File too large. Maximum size is {MAX_CSV_SIZE_MB}MB"
         )
     
+    if async_job:
+        # The job re-reads the file from GridFS, so it survives a restart
+        response = await queue_admin_job(
+            "csv_import", {"dry_run": dry_run, "filename": file.filename},
+            payload=file.file, payload_filename=file.filename,
+        )
+        if not dry_run:
+            csv_import_tracker[client_ip] = current_time
+        return response
+    
     # Process import
     try:
-        result = await process_csv_import(content, db, dry_run=dry_run)
+        # Streamed from the spool file in batches; never read into memory whole
+        result = await process_csv_import(file.file, db, dry_run=dry_run)
         
         # Update rate limit tracker on successful non-dry-run import
         if not dry_run and result['success']:
@@ -976,6 +1186,14 @@ async def import_vehicles_csv(
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
 
 
+async def run_csv_import_job(job: JobContext) -> dict:
+    with await job.open_payload() as payload:
+        return await process_csv_import(payload, db, dry_run=job.params["dry_run"], progress=job.progress)
+
+
+register_job_handler("csv_import", run_csv_import_job)
+
+
 # ============================================================
 # IMAGE CLEANING ENDPOINTS
 # ============================================================
@@ -992,6 +1210,7 @@ async def batch_clean_vehicle_images(
     force_reprocess: bool = Query(default=False, description="Reprocess all images, even if already cleaned"),
     limit: int = Query(default=50, ge=1, le=200, description="Max vehicles to process"),
     dry_run: bool = Query(default=False, description="Preview only - don't modify database"),
+    async_job: bool = Query(default=False, description="Run as a background job; poll /api/admin/jobs/{job_id}"),
     _: bool = Depends(require_admin)
 ):
     """
@@ -1009,7 +1228,8 @@ async def batch_clean_vehicle_images(
     - `crop_top`: Pixels to remove from top
     - `force_reprocess`: Reprocess even if clean versions exist
     - `limit`: Max vehicles to process (default: 50)
-    - `dry_run`: Preview without writing changes
+    - `dry_run`: Preview without writing changes (always answered inline)
+    - `async_job`: Respond 202 with a job id and clean in the background
     
     **Rate limited**: 2 minutes between batch runs.
     """
@@ -1060,30 +1280,55 @@ async def batch_clean_vehicle_images(
             "message": f"DRY RUN: Would process up to {min(total, limit)} vehicles. Run without dry_run=true to execute."
         }
     
+    if async_job:
+        response = await queue_admin_job("clean_images", {
+            "crop_bottom": crop_bottom,
+            "crop_top": crop_top,
+            "force_reprocess": force_reprocess,
+            "limit": limit,
+        })
+        image_clean_last_run[client_ip] = current_time
+        return response
+    
     # Actually run the cleaning
     try:
-        result = await run_batch_image_cleaning(
-            db,
-            crop_bottom=crop_bottom,
-            crop_top=crop_top,
-            force_reprocess=force_reprocess,
-            limit=limit
-        )
+        result = await run_image_cleaning(crop_bottom, crop_top, force_reprocess, limit)
         
         # Update rate limiter
         image_clean_last_run[client_ip] = current_time
         
-        return {
-            "success": True,
-            "crop_settings": {"bottom": crop_bottom, "top": crop_top},
-            **result
-        }
+        return result
         
     except Exception as e:
         logger.error(f"Batch image cleaning error: {e}")
         raise HTTPException(status_code=500, detail=f"Image cleaning failed: {str(e)}")
 
 
+async def run_image_cleaning(crop_bottom: int, crop_top: int, force_reprocess: bool, limit: int, progress=None) -> dict:
+    result = await run_batch_image_cleaning(
+        db,
+        crop_bottom=crop_bottom,
+        crop_top=crop_top,
+        force_reprocess=force_reprocess,
+        limit=limit,
+        progress=progress,
+    )
+    invalidate_inventory_cache("clean_images")
+    
+    return {
+        "success": True,
+        "crop_settings": {"bottom": crop_bottom, "top": crop_top},
+        **result
+    }
+
+
+async def run_image_cleaning_job(job: JobContext) -> dict:
+    return await run_image_cleaning(progress=job.progress, **job.params)
+
+
+register_job_handler("clean_images", run_image_cleaning_job)
+
+
 @router.post("/vehicles/{vehicle_id}/clean-images")
 async def clean_single_vehicle_images(
     vehicle_id: str,
@@ -1116,6 +1361,7 @@ async def clean_single_vehicle_images(
         result = await clean_vehicle_images(
             vehicle, db, crop_bottom, crop_top, force_reprocess
         )
+        invalidate_inventory_cache("clean_vehicle_images")
         return {
             "success": True,
             "crop_settings": {"bottom": crop_bottom, "top": crop_top},
@@ -0,0 +1,225 @@
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response
+
+from services.derivative_cache import derivative_cache
+from services.image_pipeline import (
+    run_in_image_pool,
+    ImagePipelineBusyError,
+    IMAGE_RETRY_AFTER_SECONDS,
+)
+from services.image_service import (
+    render_derivative,
+    snap_quality,
+    snap_width,
+    DERIVATIVE_FORMATS,
+    IMAGE_AVIF_ENABLED,
+)
+from services.image_store import get_image_store, ImageStoreError
+from utils.http_cache import etag_matches
+
+router = APIRouter()
+
+# Blobs are immutable per upload_id, so browsers/CDN can cache them forever
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Extensionless variants (full, w640, ...) may have an AVIF sibling
+AVIF_SUFFIX = ".avif"
+
+# Stored variants lazy derivatives are rendered from, best first
+DERIVATIVE_SOURCE_VARIANTS = ("clean", "full")
+
+
+def parse_range_header(range_header: str, length: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range.
+
+    Returns:
+        (start, end) inclusive, or None if the header should be ignored
+
+    Raises:
+        ValueError: If the range is unsatisfiable
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        # Multipart ranges are not supported - serve the full image
+        return None
+
+    start_str, _, end_str = spec.partition("-")
+    try:
+        if start_str == "":
+            # Suffix range: last N bytes
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise ValueError("Empty suffix range")
+            start = max(0, length - suffix)
+            end = length - 1
+        else:
+            start = int(start_str)
+            end = int(end_str) if end_str else length - 1
+    except ValueError:
+        raise ValueError(f"Invalid range '{range_header}'")
+
+    end = min(end, length - 1)
+    if start >= length or start > end:
+        raise ValueError(f"Range not satisfiable '{range_header}'")
+
+    return start, end
+
+
+@router.api_route("/images/{upload_id}/{variant}", methods=["GET", "HEAD"])
+async def get_image(upload_id: str, variant: str, request: Request):
+    """
+    Serve a stored vehicle image variant (full, thumb, display, w640, ...).
+
+    Extensionless variants are format-negotiated: browsers that send
+    "Accept: image/avif" get the "<variant>.avif" sibling when one exists,
+    everyone else gets WebP. Supports conditional requests (ETag /
+    If-None-Match) and byte ranges.
+    """
+    store = get_image_store()
+    negotiable = "." not in variant
+
+    try:
+        blob = None
+        if negotiable and "image/avif" in request.headers.get("accept", ""):
+            blob = await store.stat(upload_id, variant + AVIF_SUFFIX)
+            if blob:
+                variant += AVIF_SUFFIX
+        if not blob:
+            blob = await store.stat(upload_id, variant)
+    except ImageStoreError:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    if not blob:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    etag = f'"{blob.etag}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Last-Modified": blob.uploaded_at.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+    }
+    if negotiable:
+        headers["Vary"] = "Accept"
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    # Honor Range only if If-Range (when sent) still matches this version
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range_header(range_header, blob.length)
+    except ValueError:
+        return Response(
+            status_code=416,
+            headers={**headers, "Content-Range": f"bytes */{blob.length}"},
+        )
+
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{blob.length}"
+        headers["Content-Length"] = str(end - start + 1)
+        body = b"" if request.method == "HEAD" else await store.read(upload_id, variant, start, end - start + 1)
+        return Response(content=body, status_code=206, media_type=blob.content_type, headers=headers)
+
+    headers["Content-Length"] = str(blob.length)
+    body = b"" if request.method == "HEAD" else await store.read(upload_id, variant)
+    return Response(content=body, media_type=blob.content_type, headers=headers)
+
+
+@router.api_route("/images/{upload_id}", methods=["GET", "HEAD"])
+async def get_image_derivative(
+    upload_id: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=10000),
+    fmt: str = Query("auto"),
+    q: Optional[int] = Query(None, ge=1, le=100),
+):
+    """
+    Serve a width/format/quality derivative rendered on demand.
+
+    The derivative is rendered from the stored clean (or full) variant on
+    first request and kept in the on-disk derivative cache. Width snaps to
+    the configured ladder and quality to steps of 5, so arbitrary query
+    values map onto a small set of cacheable files. fmt=auto picks AVIF
+    for browsers that accept it (when enabled), WebP otherwise; fmt=avif
+    is refused with 400 unless AVIF is enabled (and Pillow can encode it).
+    """
+    if fmt == "auto":
+        negotiate = IMAGE_AVIF_ENABLED and "image/avif" in request.headers.get("accept", "")
+        fmt = "avif" if negotiate else "webp"
+        vary_accept = True
+    elif fmt == "avif" and not IMAGE_AVIF_ENABLED:
+        raise HTTPException(status_code=400, detail="AVIF derivatives are not enabled")
+    elif fmt in DERIVATIVE_FORMATS:
+        vary_accept = False
+    else:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}'")
+
+    store = get_image_store()
+    source = None
+    try:
+        for source_variant in DERIVATIVE_SOURCE_VARIANTS:
+            source = await store.stat(upload_id, source_variant)
+            if source:
+                break
+    except ImageStoreError:
+        source = None
+
+    if not source:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    width = snap_width(w)
+    quality = snap_quality(q, fmt)
+    # Source etag in both keys: a re-processed source never serves stale bytes
+    etag = f'"{source.etag}-w{width}-q{quality}-{fmt}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMAGE_CACHE_CONTROL,
+        "Last-Modified": source.uploaded_at.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+    }
+    if vary_accept:
+        headers["Vary"] = "Accept"
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    async def render() -> bytes:
+        content = await store.read(upload_id, source_variant)
+        return await run_in_image_pool(render_derivative, content, width, fmt, quality)
+
+    cache_key = f"{upload_id}/{source.etag}-w{width}-q{quality}.{fmt}"
+    if request.method == "HEAD":
+        # Answer from the cache index; only uncached derivatives are rendered
+        size = await derivative_cache.size_of(cache_key)
+        if size is not None:
+            headers["X-Cache"] = "HIT"
+            headers["Content-Length"] = str(size)
+            return Response(media_type=DERIVATIVE_FORMATS[fmt], headers=headers)
+
+    try:
+        body, cache_status = await derivative_cache.get_or_render(cache_key, render)
+    except ImagePipelineBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(IMAGE_RETRY_AFTER_SECONDS)},
+        )
+    except ImageStoreError:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    headers["X-Cache"] = cache_status
+    headers["Content-Length"] = str(len(body))
+    if request.method == "HEAD":
+        body = b""
+    return Response(content=body, media_type=DERIVATIVE_FORMATS[fmt], headers=headers)
@@ -1,21 +1,23 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, Query, status, Depends
 from fastapi.responses import StreamingResponse
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timezone
 from bson import ObjectId
 import os
-import requests
 import logging
 import csv
 import io
+import zlib
 
 from models.lead import (
     LeadCreate, LeadOut, LeadStatusUpdate, LegacyLeadCreate, Lead,
     NoteCreate, AssignmentUpdate, LeadNote
 )
 from auth import require_admin
-from utils.alerts import notify_new_lead, notify_status_change
+from services.lead_notifications import queue_new_lead_notifications, queue_status_change_notifications
+from services.lead_stats import get_lead_stats, invalidate_lead_stats
+from utils.pagination import encode_cursor, apply_keyset, InvalidCursorError
 
 logger = logging.getLogger(__name__)
 
@@ -32,10 +34,15 @@ def get_leads_collection():
     return db["leads"]
 
 
-# Mailchimp configuration
-MAILCHIMP_API_KEY = os.getenv("MAILCHIMP_API_KEY")
-MAILCHIMP_SERVER_PREFIX = os.getenv("MAILCHIMP_SERVER_PREFIX")
-MAILCHIMP_LIST_ID = os.getenv("MAILCHIMP_LIST_ID")
+# CSV export: documents fetched per cursor batch / bytes per streamed chunk
+LEADS_EXPORT_BATCH_SIZE = int(os.environ.get("LEADS_EXPORT_BATCH_SIZE", "500"))
+LEADS_EXPORT_CHUNK_BYTES = int(os.environ.get("LEADS_EXPORT_CHUNK_BYTES", "65536"))
+
+LEADS_EXPORT_COLUMNS = [
+    "created_at", "lead_type", "status", "first_name", "last_name",
+    "phone", "email", "year", "make", "model", "trim", "vin",
+    "stock_number", "assigned_to", "notes_count", "source", "message"
+]
 
 
 class FormLeadPayload(BaseModel):
@@ -108,13 +115,8 @@ def map_form_type_to_lead_type(form_type: str) -> str:
     return mapping.get(form_type.lower(), "contact")
 
 
-def send_to_mailchimp(lead: FormLeadPayload):
-    """Send lead data to Mailchimp audience."""
-    if not all([MAILCHIMP_API_KEY, MAILCHIMP_SERVER_PREFIX, MAILCHIMP_LIST_ID]):
-        return
-    
-    url = f"https://{MAILCHIMP_SERVER_PREFIX}.api.mailchimp.com/3.0/lists/{MAILCHIMP_LIST_ID}/members"
-    
+def mailchimp_member(lead: FormLeadPayload) -> dict:
+    """Mailchimp audience member body for a form lead."""
     merge_fields = {
         "FNAME": lead.firstName,
         "LNAME": lead.lastName,
@@ -129,26 +131,12 @@ def send_to_mailchimp(lead: FormLeadPayload):
     if lead.type:
         merge_fields["LEADTYPE"] = lead.type
     
-    data = {
+    return {
         "email_address": lead.email,
         "status": "subscribed",
         "merge_fields": merge_fields,
         "tags": [lead.type, lead.source or "unknown"]
     }
-    
-    try:
-        response = requests.post(
-            url,
-            auth=("anystring", MAILCHIMP_API_KEY),
-            json=data,
-            timeout=10
-        )
-        if response.status_code in (200, 201):
-            logger.info("✅ Lead sent to Mailchimp successfully")
-        else:
-            logger.warning(f"⚠️ Mailchimp API error: {response.status_code}")
-    except Exception as e:
-        logger.warning(f"⚠️ Mailchimp error: {str(e)}")
 
 
 # =============================================================================
@@ -159,7 +147,8 @@ def send_to_mailchimp(lead: FormLeadPayload):
 async def create_form_lead(lead: FormLeadPayload):
     """
     Capture lead from any form (Pre-Approval, Test Drive, Contact).
-    Saves to MongoDB and optionally sends to Mailchimp.
+    Saves to MongoDB and queues the Mailchimp subscribe and staff alerts
+    in the outbox (delivered in the background, with retries).
     """
     coll = get_leads_collection()
     now = datetime.now(timezone.utc)
@@ -187,22 +176,17 @@ async def create_form_lead(lead: FormLeadPayload):
     # Save to MongoDB
     result = await coll.insert_one(doc)
     doc["_id"] = result.inserted_id
+    invalidate_lead_stats()
     
     logger.info(
         f"📩 New {lead.type} lead saved - ID: {result.inserted_id} | "
         f"Name: {lead.firstName} {lead.lastName} | Email: {lead.email}"
     )
     
-    # Send to Mailchimp (async, don't block)
+    # Queue Mailchimp + alerts; the lead is saved even if queueing fails
+    alert_result = {"email_status": "disabled"}
     try:
-        send_to_mailchimp(lead)
-    except Exception as e:
-        logger.warning(f"⚠️ Mailchimp error: {str(e)}")
-    
-    # Send alerts and capture status
-    alert_result = {"email_status": "disabled", "notified": False}
-    try:
-        alert_result = notify_new_lead(doc)
+        alert_result = await queue_new_lead_notifications(doc, mailchimp_member(lead))
     except Exception as e:
         logger.warning(f"⚠️ Alert error: {str(e)}")
     
@@ -249,15 +233,16 @@ async def create_availability_lead(payload: LegacyLeadCreate):
     
     result = await coll.insert_one(doc)
     doc["_id"] = result.inserted_id
+    invalidate_lead_stats()
     
     logger.info(
         f"🚗 New availability lead - ID: {result.inserted_id} | "
         f"Stock: {payload.stock_id} | Customer: {payload.name}"
     )
     
-    # Send alerts
+    # Queue alerts
     try:
-        notify_new_lead(doc)
+        await queue_new_lead_notifications(doc)
     except Exception as e:
         logger.warning(f"⚠️ Alert error: {str(e)}")
     
@@ -325,100 +310,139 @@ async def list_all_leads(
     return [serialize_lead(d) for d in docs]
 
 
+def lead_export_row(d: dict) -> list:
+    """One CSV row (LEADS_EXPORT_COLUMNS order) from a projected lead document"""
+    created = d.get("created_at")
+    if created:
+        created = created.strftime("%Y-%m-%d %H:%M:%S") if hasattr(created, 'strftime') else str(created)
+    
+    return [
+        created,
+        d.get("lead_type"),
+        d.get("status"),
+        d.get("first_name"),
+        d.get("last_name"),
+        d.get("phone"),
+        d.get("email"),
+        d.get("year"),
+        d.get("make"),
+        d.get("model"),
+        d.get("trim"),
+        d.get("vin"),
+        d.get("stock_number"),
+        d.get("assigned_to"),
+        d.get("notes_count", 0),
+        d.get("source"),
+        d.get("message", "")[:100] if d.get("message") else "",
+    ]
+
+
+async def stream_leads_csv(pipeline: List[dict], compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Run the export pipeline and yield the CSV as encoded chunks of about
+    LEADS_EXPORT_CHUNK_BYTES, optionally gzip-compressed, while the
+    cursor is still being read.
+    """
+    gzip = zlib.compressobj(wbits=31) if compress else None
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(LEADS_EXPORT_COLUMNS)
+    
+    def flush() -> bytes:
+        data = output.getvalue().encode("utf-8")
+        output.seek(0)
+        output.truncate(0)
+        return gzip.compress(data) if gzip else data
+    
+    cursor = get_leads_collection().aggregate(pipeline, batchSize=LEADS_EXPORT_BATCH_SIZE)
+    async for d in cursor:
+        writer.writerow(lead_export_row(d))
+        if output.tell() >= LEADS_EXPORT_CHUNK_BYTES:
+            chunk = flush()
+            if chunk:
+                yield chunk
+    
+    chunk = flush()
+    if gzip:
+        chunk += gzip.flush()
+    if chunk:
+        yield chunk
+
+
 @router.get("/leads/export.csv")
 async def export_leads_csv(
     status: Optional[str] = None,
     lead_type: Optional[str] = None,
+    created_from: Optional[datetime] = Query(None, description="Only leads created at or after (ISO 8601)"),
+    created_to: Optional[datetime] = Query(None, description="Only leads created before (ISO 8601)"),
+    cursor: Optional[str] = Query(None, description="Continue after a previous export (X-Next-Cursor)"),
+    limit: Optional[int] = Query(None, ge=1, description="Max rows; X-Next-Cursor is set when more remain"),
+    gzip: bool = Query(False, description="Send choosemeauto-leads.csv.gz instead"),
     _: bool = Depends(require_admin)
 ):
-    """Export leads as CSV (admin only)"""
-    coll = get_leads_collection()
+    """
+    Export leads as CSV (admin only), newest first.
     
+    Rows are streamed straight from a MongoDB cursor (no row cap, constant
+    memory). Large histories can be exported in parts: with limit=N the
+    X-Next-Cursor header holds the token to pass as cursor for the next part.
+    """
     query = {}
     if status:
         query["status"] = status
     if lead_type:
         query["lead_type"] = lead_type
+    if created_from or created_to:
+        if created_from and created_to and created_from >= created_to:
+            raise HTTPException(status_code=400, detail="created_from must be before created_to")
+        query["created_at"] = {}
+        if created_from:
+            query["created_at"]["$gte"] = created_from
+        if created_to:
+            query["created_at"]["$lt"] = created_to
     
-    docs = await coll.find(query).sort("created_at", -1).to_list(5000)
-    
-    def generate():
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Header row
-        writer.writerow([
-            "created_at", "lead_type", "status", "first_name", "last_name",
-            "phone", "email", "year", "make", "model", "trim", "vin",
-            "stock_number", "assigned_to", "notes_count", "source", "message"
-        ])
-        yield output.getvalue()
-        output.seek(0)
-        output.truncate(0)
-        
-        # Data rows
-        for d in docs:
-            created = d.get("created_at")
-            if created:
-                created = created.strftime("%Y-%m-%d %H:%M:%S") if hasattr(created, 'strftime') else str(created)
-            
-            writer.writerow([
-                created,
-                d.get("lead_type"),
-                d.get("status"),
-                d.get("first_name"),
-                d.get("last_name"),
-                d.get("phone"),
-                d.get("email"),
-                d.get("year"),
-                d.get("make"),
-                d.get("model"),
-                d.get("trim"),
-                d.get("vin"),
-                d.get("stock_number"),
-                d.get("assigned_to"),
-                len(d.get("notes", [])),
-                d.get("source"),
-                d.get("message", "")[:100] if d.get("message") else "",
-            ])
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
-    
-    headers = {"Content-Disposition": "attachment; filename=choosemeauto-leads.csv"}
-    return StreamingResponse(generate(), media_type="text/csv", headers=headers)
+    try:
+        query = apply_keyset(query, "created_at", cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    sort = {"created_at": -1, "_id": -1}
+    headers = {
+        "Content-Disposition": f"attachment; filename=choosemeauto-leads.csv{'.gz' if gzip else ''}"
+    }
+    
+    pipeline = [{"$match": query}, {"$sort": sort}]
+    if limit:
+        # Position of the last exported row, found before streaming starts
+        # (headers can't change once the body is under way)
+        boundary = await get_leads_collection().find(query, {"created_at": 1}).sort(
+            list(sort.items())
+        ).skip(limit - 1).limit(2).to_list(2)
+        if len(boundary) == 2:
+            headers["X-Next-Cursor"] = encode_cursor(boundary[0].get("created_at"), boundary[0]["_id"])
+        pipeline.append({"$limit": limit})
+    
+    # Only the exported fields; notes are counted server-side, never shipped
+    projection = {column: 1 for column in LEADS_EXPORT_COLUMNS if column != "notes_count"}
+    projection["notes_count"] = {"$size": {"$ifNull": ["$notes", []]}}
+    pipeline.append({"$project": projection})
+    
+    return StreamingResponse(
+        stream_leads_csv(pipeline, compress=gzip),
+        media_type="application/gzip" if gzip else "text/csv",
+        headers=headers,
+    )
 
 
 @router.get("/leads/stats/summary")
 async def get_leads_stats(_: bool = Depends(require_admin)):
-    """Get lead statistics (admin only)"""
-    coll = get_leads_collection()
-    
-    total = await coll.count_documents({})
-    new_count = await coll.count_documents({"status": "new"})
-    
-    # Count by type
-    pipeline = [
-        {"$group": {"_id": "$lead_type", "count": {"$sum": 1}}}
-    ]
-    type_counts = {}
-    async for doc in coll.aggregate(pipeline):
-        type_counts[doc["_id"] or "unknown"] = doc["count"]
-    
-    # Count by status
-    status_pipeline = [
-        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
-    ]
-    status_counts = {}
-    async for doc in coll.aggregate(status_pipeline):
-        status_counts[doc["_id"] or "unknown"] = doc["count"]
+    """
+    Get lead statistics (admin only)
     
-    return {
-        "total": total,
-        "new": new_count,
-        "by_type": type_counts,
-        "by_status": status_counts
-    }
+    Totals, status/type/source breakdowns and per-day / per-week counts
+    from a single aggregation, cached briefly (see services/lead_stats.py).
+    """
+    return await get_lead_stats(get_leads_collection())
 
 
 @router.get("/leads/{lead_id}", response_model=LeadOut)
@@ -470,14 +494,15 @@ async def update_lead_status(
         {"_id": ObjectId(lead_id)},
         {"$set": update_fields}
     )
+    invalidate_lead_stats()
     
     updated = await coll.find_one({"_id": ObjectId(lead_id)})
     logger.info(f"📝 Lead {lead_id} status updated: {old_status} → {new_status}")
     
-    # Send status change alert
+    # Queue status change alert
     if old_status != new_status:
         try:
-            notify_status_change(updated, old_status, new_status)
+            await queue_status_change_notifications(updated, old_status, new_status)
         except Exception as e:
             logger.warning(f"⚠️ Alert error: {str(e)}")
     
@@ -505,6 +530,7 @@ async def assign_lead(
         {"_id": ObjectId(lead_id)},
         {"$set": {"assigned_to": assignment.assigned_to, "updated_at": datetime.now(timezone.utc)}}
     )
+    invalidate_lead_stats()
     
     updated = await coll.find_one({"_id": ObjectId(lead_id)})
     logger.info(f"👤 Lead {lead_id} assigned to: {assignment.assigned_to}")
@@ -560,6 +586,7 @@ async def delete_lead(lead_id: str, _: bool = Depends(require_admin)):
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Lead not found")
+    invalidate_lead_stats()
     
     logger.info(f"🗑️ Lead {lead_id} deleted")
     return {"message": "Lead deleted successfully"}
@@ -1,10 +1,20 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, timezone
+import json
+import os
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 
 from models.vehicle import Vehicle
-from services.image_service import normalize_images_field
+from services.image_service import normalize_images_field, format_srcset
+from services.vehicle_derived_fields import select_primary_thumbnail, select_primary_image, normalize_facet
+from services.inventory_cache import (
+    inventory_cache, inventory_cache_key, get_inventory_etag, get_inventory_version
+)
+from utils.http_cache import etag_matches
+from utils.pagination import encode_cursor, apply_keyset, InvalidCursorError
 
 router = APIRouter()
 
@@ -19,28 +29,74 @@ def get_vehicles_collection():
     return db["admin_vehicles"]
 
 
+# SRP pagination settings
+VEHICLES_PAGE_SIZE_DEFAULT = int(os.environ.get("VEHICLES_PAGE_SIZE_DEFAULT", "200"))
+VEHICLES_PAGE_SIZE_MAX = int(os.environ.get("VEHICLES_PAGE_SIZE_MAX", "200"))
+VEHICLE_COUNT_CACHE_SECONDS = int(os.environ.get("VEHICLE_COUNT_CACHE_SECONDS", "60"))
+
+# Browser/CDN caching for public inventory responses
+VEHICLE_LIST_CACHE_CONTROL = os.environ.get(
+    "VEHICLE_LIST_CACHE_CONTROL", "public, max-age=30, stale-while-revalidate=120"
+)
+VEHICLE_DETAIL_CACHE_CONTROL = os.environ.get(
+    "VEHICLE_DETAIL_CACHE_CONTROL", "public, max-age=60, stale-while-revalidate=300"
+)
+
+
+async def get_cached_count(coll, query: dict, version: str) -> int:
+    """Count matching vehicles, cached briefly per filter."""
+    key = inventory_cache_key(version, "count", json.dumps(query, sort_keys=True, default=str))
+    count = inventory_cache.get(key)
+    if count is None:
+        count = await coll.count_documents(query)
+        inventory_cache.set(key, count, ttl_seconds=VEHICLE_COUNT_CACHE_SECONDS)
+    return count
+
+
+def build_cached_response(payload, version: str, headers: Optional[Dict[str, str]] = None) -> dict:
+    """Render a payload once so cache hits skip serialization entirely."""
+    return {
+        "body": JSONResponse(content=jsonable_encoder(payload)).body,
+        "headers": {**(headers or {}), "ETag": get_inventory_etag(version)},
+    }
+
+
+def render_cached_response(entry: dict, cache_status: str, cache_control: str) -> Response:
+    return Response(
+        content=entry["body"],
+        media_type="application/json",
+        headers={**entry["headers"], "Cache-Control": cache_control, "X-Cache": cache_status},
+    )
+
+
+def not_modified_response(request: Request, version: str, cache_control: str) -> Optional[Response]:
+    """
+    304 if the client already has the current inventory version.
+    Checked before the cache or the vehicle queries are touched.
+    """
+    etag = get_inventory_etag(version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return None
+
+
 def serialize_to_public_vehicle_list(doc) -> dict:
     """
     Lightweight serializer for vehicle lists (SRP, Featured, Homepage).
     Returns thumbnail URLs only to improve page load speed.
-    """
-    images = normalize_images_field(doc)
     
-    # Get primary thumbnail (first image or first with is_primary=True)
-    primary_url = None
-    for img in images:
-        if isinstance(img, dict):
-            # Prefer thumbnail_url for list views (smaller payload)
-            thumb = img.get("thumbnail_url")
-            url = img.get("url", "")
-            if img.get("is_primary"):
-                primary_url = thumb or url
-                break
-            if not primary_url:
-                primary_url = thumb or url
-        else:
-            if not primary_url:
-                primary_url = img
+    Reads the precomputed primary_thumbnail_url/card fields; falls back to
+    scanning images[] for documents that have not been backfilled yet.
+    """
+    card = doc.get("card") or {}
+    if "primary_thumbnail_url" in doc:
+        primary_url = doc.get("primary_thumbnail_url")
+        srcset = card.get("srcset")
+    else:
+        images = normalize_images_field(doc)
+        primary_url = select_primary_thumbnail(images)
+        primary = select_primary_image(images)
+        srcset = format_srcset(primary.get("sources")) if isinstance(primary, dict) else None
     
     return {
         "stock_id": doc.get("stock_number") or str(doc.get("_id")),
@@ -57,6 +113,9 @@ def serialize_to_public_vehicle_list(doc) -> dict:
         # Only primary thumbnail for lists (faster loading)
         "primary_image_url": primary_url,
         "image_url": primary_url,
+        # Responsive candidates for <img srcset> ("url 320w, url 640w, ...")
+        "primary_image_srcset": srcset,
+        "image_count": card.get("image_count"),
         # Featured flags
         "is_featured_homepage": doc.get("is_featured_homepage", False),
         "featured_rank": doc.get("featured_rank"),
@@ -74,10 +133,13 @@ def serialize_to_public_vehicle_detail(doc) -> dict:
     primary_url = None
     other_urls = []
     all_urls = []
+    srcsets = {}
     
     for img in images:
         url = img.get("url", "") if isinstance(img, dict) else img
         all_urls.append(url)
+        if isinstance(img, dict):
+            srcsets[url] = format_srcset(img.get("sources"))
         
         if isinstance(img, dict) and img.get("is_primary"):
             primary_url = url
@@ -109,6 +171,9 @@ def serialize_to_public_vehicle_detail(doc) -> dict:
         "image_urls": other_urls,
         "photo_urls": photo_urls,
         "primary_image_url": primary_url,
+        # srcset strings aligned with photo_urls (None for legacy images)
+        "photo_srcsets": [srcsets.get(url) for url in photo_urls],
+        "primary_image_srcset": srcsets.get(primary_url),
         "images": images,
         # Document & CTA fields
         "carfax_url": doc.get("carfax_url"),
@@ -127,12 +192,22 @@ def serialize_to_public_vehicle(doc) -> dict:
 
 
 @router.get("/vehicles/featured")
-async def get_featured_vehicles(limit: int = Query(8, ge=1, le=20)):
+async def get_featured_vehicles(request: Request, limit: int = Query(8, ge=1, le=20)):
     """
     Get featured vehicles for homepage display.
     Returns lightweight data with thumbnails only for fast loading.
     """
     coll = get_vehicles_collection()
+    # Read before the data so a response is never tagged newer than its body
+    version = await get_inventory_version(coll)
+    not_modified = not_modified_response(request, version, VEHICLE_LIST_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    cache_key = inventory_cache_key(version, "featured", limit)
+    cached = inventory_cache.get(cache_key)
+    if cached:
+        return render_cached_response(cached, "HIT", VEHICLE_LIST_CACHE_CONTROL)
     
     query = {
         "is_active": True,
@@ -151,7 +226,9 @@ async def get_featured_vehicles(limit: int = Query(8, ge=1, le=20)):
         "price": 1,
         "mileage": 1,
         "condition": 1,
-        "images": 1,  # Need images for thumbnail extraction
+        # Precomputed list-view fields (never the images array)
+        "primary_thumbnail_url": 1,
+        "card": 1,
         "is_featured_homepage": 1,
         "featured_rank": 1,
     }
@@ -164,17 +241,23 @@ async def get_featured_vehicles(limit: int = Query(8, ge=1, le=20)):
     vehicles = await cursor.to_list(limit)
     
     # Use lightweight serializer for list view
-    return [serialize_to_public_vehicle_list(v) for v in vehicles]
+    entry = build_cached_response([serialize_to_public_vehicle_list(v) for v in vehicles], version)
+    inventory_cache.set(cache_key, entry)
+    return render_cached_response(entry, "MISS", VEHICLE_LIST_CACHE_CONTROL)
 
 
 @router.get("/vehicles")
 async def get_vehicles(
+    request: Request,
     make: Optional[str] = Query(None),
     model: Optional[str] = Query(None),
     min_price: Optional[int] = Query(None),
     max_price: Optional[int] = Query(None),
     body_style: Optional[str] = Query(None),
     condition: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Opaque page token from X-Next-Cursor"),
+    page_size: int = Query(VEHICLES_PAGE_SIZE_DEFAULT, ge=1, le=VEHICLES_PAGE_SIZE_MAX),
+    include_total: bool = Query(False, description="Add X-Total-Count (cached count)"),
 ):
     """
     List vehicles with simple filters for SRP.
@@ -185,20 +268,41 @@ async def get_vehicles(
     - /api/vehicles?body_style=SUV
     - /api/vehicles?condition=Used
     - /api/vehicles?condition=New
+
+    Pagination (keyset on created_at, _id):
+    - The body stays a plain list of vehicles
+    - X-Next-Cursor header holds the token for the next page (absent on the last page)
+    - /api/vehicles?cursor=<token>&page_size=50
+    - include_total=true adds X-Total-Count
+
+    Responses carry a weak ETag; If-None-Match with the current one gets a 304.
     """
     coll = get_vehicles_collection()
+    version = await get_inventory_version(coll)
+    not_modified = not_modified_response(request, version, VEHICLE_LIST_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    # Exact matches on normalized shadow fields (index-backed, no regex)
+    facets = {
+        "make": normalize_facet(make),
+        "model": normalize_facet(model),
+        "body_style": normalize_facet(body_style),
+        "condition": normalize_facet(condition),
+    }
+    
+    cache_key = inventory_cache_key(
+        version, "list", *facets.values(), min_price, max_price, cursor, page_size, include_total
+    )
+    cached = inventory_cache.get(cache_key)
+    if cached:
+        return render_cached_response(cached, "HIT", VEHICLE_LIST_CACHE_CONTROL)
     
     # Build query filter
     query = {"is_active": True}
-    
-    if make:
-        query["make"] = {"$regex": f"^{make}$", "$options": "i"}
-    if model:
-        query["model"] = {"$regex": f"^{model}$", "$options": "i"}
-    if body_style:
-        query["body_style"] = {"$regex": f"^{body_style}$", "$options": "i"}
-    if condition:
-        query["condition"] = {"$regex": f"^{condition}$", "$options": "i"}
+    for field, normalized in facets.items():
+        if normalized:
+            query[f"{field}_norm"] = normalized
     
     # Price filters
     if min_price is not None or max_price is not None:
@@ -222,24 +326,56 @@ async def get_vehicles(
         "mileage": 1,
         "body_style": 1,
         "condition": 1,
-        "images": 1,  # For thumbnail extraction
+        # Precomputed list-view fields (never the images array)
+        "primary_thumbnail_url": 1,
+        "card": 1,
         "is_featured_homepage": 1,
     }
     
-    cursor = coll.find(query, projection).sort("created_at", -1).limit(200)
-    vehicles = await cursor.to_list(200)
+    try:
+        page_query = apply_keyset(query, "created_at", cursor)
+    except InvalidCursorError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    # Fetch one extra document to know whether another page exists
+    projection["created_at"] = 1
+    db_cursor = coll.find(page_query, projection).sort([
+        ("created_at", -1),
+        ("_id", -1)
+    ]).limit(page_size + 1)
+    vehicles = await db_cursor.to_list(page_size + 1)
+    
+    headers = {}
+    if len(vehicles) > page_size:
+        vehicles = vehicles[:page_size]
+        last = vehicles[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last.get("created_at"), last["_id"])
+    
+    if include_total:
+        headers["X-Total-Count"] = str(await get_cached_count(coll, query, version))
     
     # Use lightweight serializer for faster list loading
-    return [serialize_to_public_vehicle_list(v) for v in vehicles]
+    entry = build_cached_response([serialize_to_public_vehicle_list(v) for v in vehicles], version, headers)
+    inventory_cache.set(cache_key, entry)
+    return render_cached_response(entry, "MISS", VEHICLE_LIST_CACHE_CONTROL)
 
 
 @router.get("/vehicles/{stock_id}")
-async def get_vehicle_by_stock_id(stock_id: str):
+async def get_vehicle_by_stock_id(stock_id: str, request: Request):
     """
     Return a single vehicle for the VDP (Vehicle Detail Page).
     Returns full image data for gallery view.
     """
     coll = get_vehicles_collection()
+    version = await get_inventory_version(coll)
+    not_modified = not_modified_response(request, version, VEHICLE_DETAIL_CACHE_CONTROL)
+    if not_modified:
+        return not_modified
+    
+    cache_key = inventory_cache_key(version, "detail", stock_id)
+    cached = inventory_cache.get(cache_key)
+    if cached:
+        return render_cached_response(cached, "HIT", VEHICLE_DETAIL_CACHE_CONTROL)
     
     # Try to find by stock_number first
     vehicle = await coll.find_one({"stock_number": stock_id, "is_active": True})
@@ -256,4 +392,6 @@ async def get_vehicle_by_stock_id(stock_id: str):
         raise HTTPException(status_code=404, detail="Vehicle not found")
     
     # Use full detail serializer for VDP (includes all images)
-    return serialize_to_public_vehicle_detail(vehicle)
+    entry = build_cached_response(serialize_to_public_vehicle_detail(vehicle), version)
+    inventory_cache.set(cache_key, entry)
+    return render_cached_response(entry, "MISS", VEHICLE_DETAIL_CACHE_CONTROL)
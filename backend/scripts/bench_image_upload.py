@@ -0,0 +1,121 @@
+"""
+Benchmark the upload image path: legacy triple decode vs single decode.
+
+Legacy:  validate_image_file (verify) + process_image + create_thumbnail,
+         each decoding the original bytes again.
+Single:  render_upload_variants - one decode (JPEG draft) feeding every variant.
+
+Sample generation and each mode run in their own subprocesses so peak RSS
+(ru_maxrss, which children inherit from the parent on Linux) is not polluted
+by the other mode or by building the sample image.
+
+Run with: python3 scripts/bench_image_upload.py [--width 4032 --height 3024 --runs 5]
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_sample_jpeg(width: int, height: int) -> bytes:
+    """Phone-sized JPEG with noise so the encoder has real work to do."""
+    from PIL import Image
+
+    img = Image.merge("RGB", [Image.effect_noise((width, height), 64)] * 3)
+    img = Image.blend(img, Image.linear_gradient("L").convert("RGB").resize((width, height)), 0.5)
+    output = io.BytesIO()
+    img.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def run_mode(mode: str, sample_path: str, runs: int) -> dict:
+    from services.image_service import (
+        validate_image_file,
+        process_image,
+        create_thumbnail,
+        render_upload_variants,
+    )
+
+    with open(sample_path, "rb") as f:
+        content = f.read()
+    baseline_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    cpu_times = []
+    output_bytes = 0
+    for _ in range(runs):
+        start = time.process_time()
+        if mode == "legacy":
+            validate_image_file("sample.jpg", content, "image/jpeg")
+            full, _ = process_image(content)
+            variants = {"full": full, "thumb": create_thumbnail(content)}
+        else:
+            variants = render_upload_variants("sample.jpg", content, "image/jpeg")
+        cpu_times.append(time.process_time() - start)
+        output_bytes = sum(len(v) for v in variants.values())
+
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "mode": mode,
+        "input_kb": len(content) // 1024,
+        "output_kb": output_bytes // 1024,
+        "cpu_ms_per_upload": round(1000 * sum(cpu_times) / len(cpu_times), 1),
+        "cpu_ms_min": round(1000 * min(cpu_times), 1),
+        "peak_rss_mb": round(peak_rss_kb / 1024, 1),
+        "peak_rss_over_baseline_mb": round((peak_rss_kb - baseline_rss_kb) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", choices=["legacy", "single"], help=argparse.SUPPRESS)
+    parser.add_argument("--sample", help=argparse.SUPPRESS)
+    parser.add_argument("--make-sample", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.make_sample:
+        with open(args.sample, "wb") as f:
+            f.write(make_sample_jpeg(args.width, args.height))
+        return
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.sample, args.runs)))
+        return
+
+    results = []
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as sample:
+        subprocess.run(
+            [sys.executable, __file__, "--make-sample", "--sample", sample.name,
+             "--width", str(args.width), "--height", str(args.height)],
+            check=True,
+        )
+        for mode in ("legacy", "single"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--sample", sample.name, "--runs", str(args.runs)],
+                check=True, capture_output=True, text=True,
+            )
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"Source: {args.width}x{args.height} JPEG ({results[0]['input_kb']} KB), {args.runs} runs\n")
+    print(f"{'mode':<8} {'cpu ms/upload':>14} {'min ms':>8} {'peak RSS MB':>12} {'RSS over base':>14} {'out KB':>7}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['cpu_ms_per_upload']:>14} {r['cpu_ms_min']:>8} "
+              f"{r['peak_rss_mb']:>12} {r['peak_rss_over_baseline_mb']:>14} {r['output_kb']:>7}")
+
+    legacy, single = results
+    print(f"\nCPU: {legacy['cpu_ms_per_upload'] / single['cpu_ms_per_upload']:.2f}x faster, "
+          f"peak RSS over baseline: {legacy['peak_rss_over_baseline_mb']} MB -> "
+          f"{single['peak_rss_over_baseline_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,7 +29,18 @@ logger = logging.getLogger(__name__)
 from routes.vehicles import router as vehicles_router, set_db as set_vehicles_db
 from routes.leads import router as leads_router, set_db as set_leads_db
 from routes.admin_vehicles import router as admin_router, set_db as set_admin_db
-from utils.alerts import get_notification_status
+from routes.images import router as images_router
+from routes.admin_jobs import router as admin_jobs_router
+from routes.admin_outbox import router as admin_outbox_router
+from services.image_store import init_image_store
+from services.image_pipeline import shutdown_image_pipeline
+from services.job_service import init_job_store, start_job_workers, stop_job_workers
+from services.outbox_service import init_outbox, start_outbox_workers, stop_outbox_workers
+from utils.http_client import close_http_client
+from services.indexes import ensure_indexes
+from services.vehicle_derived_fields import backfill_derived_fields
+from services.inventory_cache import invalidate_inventory_cache
+from utils.alerts import close_alert_clients, get_notification_status
 
 
 # Request logging middleware for observability
@@ -214,7 +225,10 @@ async def get_status_checks():
 app.include_router(api_router)
 app.include_router(vehicles_router, prefix="/api")
 app.include_router(leads_router, prefix="/api")
+app.include_router(images_router, prefix="/api")
 app.include_router(admin_router)  # Admin router has its own /api/admin prefix
+app.include_router(admin_jobs_router)
+app.include_router(admin_outbox_router)
 
 # Set database for admin routes
 set_admin_db(db)
@@ -225,6 +239,15 @@ set_leads_db(db)
 # Set database for vehicles routes
 set_vehicles_db(db)
 
+# Binary image store (GridFS by default, local filesystem as stand-in)
+init_image_store(db)
+
+# Background jobs (jobs collection + job_payloads GridFS bucket)
+init_job_store(db)
+
+# Notification outbox (Mailchimp + lead alerts, delivered in the background)
+init_outbox(db)
+
 # CORS Configuration
 # Parse CORS origins from environment, filter empty strings
 cors_origins_raw = os.environ.get('CORS_ORIGINS', '')
@@ -259,6 +282,7 @@ app.add_middleware(
     allow_origins=allowed_origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
 
 # Add request logging middleware
@@ -269,17 +293,44 @@ app.add_middleware(RequestLoggingMiddleware)
 async def startup_event():
     """Application startup - verify MongoDB connection"""
     logger.info("Application starting up...")
+    
+    # Background job workers (also resume jobs interrupted by a restart) and
+    # outbox delivery workers (also send messages queued before a restart).
+    # Started before the ping: their claim loops ride out Mongo errors
+    start_job_workers()
+    start_outbox_workers()
+    
     try:
         await client.admin.command('ping')
         logger.info("✅ MongoDB connection verified")
     except Exception as e:
         logger.warning(f"⚠️ MongoDB ping failed on startup: {e}")
         # Don't crash - let the health check handle it
+        return
+    
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        logger.warning(f"⚠️ Index setup failed on startup: {e}")
+    
+    # Backfill derived/normalized fields for docs written by older code
+    try:
+        updated = await backfill_derived_fields(db["admin_vehicles"])
+        if updated:
+            invalidate_inventory_cache("startup_backfill")
+            logger.info(f"✅ Backfilled derived fields for {updated} vehicles")
+    except Exception as e:
+        logger.warning(f"⚠️ Derived fields backfill failed on startup: {e}")
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     """Clean shutdown - close MongoDB connection"""
     logger.info("Application shutting down...")
+    await stop_job_workers()
+    await stop_outbox_workers()
+    await close_alert_clients()
+    shutdown_image_pipeline()
+    await close_http_client()
     client.close()
     logger.info("MongoDB connection closed")
@@ -3,20 +3,73 @@ CSV Import Service for Vehicle Inventory
 
 Handles parsing, validation, and upsert logic for CSV vehicle imports.
 Primary key: VIN (17-character unique identifier)
+
+Imports are streamed: the file is read incrementally (encoding sniffed
+from its first bytes), rows are validated one at a time and written in
+bulk every IMPORT_BATCH_SIZE rows, so memory stays flat for large
+multi-dealer feeds. Only the first MAX_REPORTED_ERRORS row errors and
+MAX_PREVIEW_ROWS preview rows are kept in the result; counts are exact.
+
+Rows are validated column-wise with pandas, a chunk of
+VALIDATION_CHUNK_ROWS at a time (validate_frame). validate_row is the
+per-row reference implementation; both return identical results and
+CSV_VALIDATION_ENGINE=python switches back to it. Reading, decoding,
+parsing and validating a chunk all block, so each chunk runs in a worker
+thread (asyncio.to_thread) and the event loop keeps serving requests and
+job runs during a large import.
+
+Photos: a row's image URLs replace the images of a vehicle that only has
+remote (dealer) URLs. Vehicles whose images already live in the image
+store (cleaned or uploaded, i.e. with blob_id/upload_id) keep them, so an
+import never orphans stored blobs or undoes image cleaning.
+
+Configuration (backend/.env):
+- MAX_CSV_SIZE_MB=100
+- CSV_VALIDATION_ENGINE=pandas
 """
+import asyncio
+import codecs
 import csv
+import hashlib
+import inspect
 import io
+import os
 import re
+import uuid
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, BinaryIO, Callable, Iterator, Union
 from datetime import datetime, timezone
 
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from services.vehicle_derived_fields import refresh_derived_fields_for_vins
+from services.image_store import has_stored_images
+from services.inventory_cache import invalidate_inventory_cache
+
 logger = logging.getLogger(__name__)
 
 # CSV Configuration
-MAX_CSV_SIZE_MB = 5
+MAX_CSV_SIZE_MB = int(os.environ.get("MAX_CSV_SIZE_MB", "100"))
 MAX_CSV_SIZE_BYTES = MAX_CSV_SIZE_MB * 1024 * 1024
 MAX_PREVIEW_ROWS = 20
+MAX_REPORTED_ERRORS = 200
+
+# Bytes inspected to pick the file encoding
+ENCODING_SNIFF_BYTES = 64 * 1024
+
+# Dry runs remember VINs in a fixed-size Bloom filter (~0.02% false
+# "update" previews at 1M rows)
+DRY_RUN_VIN_FILTER_BYTES = 4 * 1024 * 1024
+
+# Rows per flush (one bulk_write round trip) / VINs per existing-VIN lookup
+IMPORT_BATCH_SIZE = 500
+VIN_LOOKUP_CHUNK_SIZE = 1000
+# "pandas" (column-wise, per chunk) or "python" (validate_row per row)
+CSV_VALIDATION_ENGINE = os.environ.get("CSV_VALIDATION_ENGINE", "pandas").lower()
+VALIDATION_CHUNK_ROWS = 5000
 
 # Required fields for vehicle creation
 REQUIRED_FIELDS = ['vin', 'year', 'make', 'model', 'price']
@@ -30,6 +83,18 @@ SUPPORTED_COLUMNS = [
     'call_for_availability_enabled', 'is_active'
 ]
 
+TEXT_FIELDS = ['make', 'model', 'trim', 'stock_number', 'condition',
+               'exterior_color', 'interior_color', 'transmission',
+               'drivetrain', 'fuel_type', 'body_style', 'engine',
+               'carfax_url', 'window_sticker_url', 'primary_image_url']
+
+BOOLEAN_FIELDS = ['is_featured_homepage', 'call_for_availability_enabled', 'is_active']
+
+BOOLEAN_STRINGS = {
+    'true': True, '1': True, 'yes': True, 'y': True,
+    'false': False, '0': False, 'no': False, 'n': False,
+}
+
 # VIN validation regex (17 alphanumeric, no I, O, Q)
 VIN_REGEX = re.compile(r'^[A-HJ-NPR-Z0-9]{17}$', re.IGNORECASE)
 
@@ -58,11 +123,7 @@ def normalize_boolean(value: Any) -> Optional[bool]:
     if isinstance(value, bool):
         return value
     if isinstance(value, str):
-        value = value.strip().lower()
-        if value in ('true', '1', 'yes', 'y'):
-            return True
-        if value in ('false', '0', 'no', 'n'):
-            return False
+        return BOOLEAN_STRINGS.get(value.strip().lower())
     return None
 
 
@@ -79,11 +140,19 @@ def normalize_number(value: Any, field_type: str = 'int') -> Optional[Any]:
             if field_type == 'int':
                 return int(float(cleaned))
             return float(cleaned)
-        except ValueError:
+        except (ValueError, OverflowError):
             return None
     return None
 
 
+def normalize_condition(value: str) -> str:
+    """Map a stripped condition value to New/Used (Used by default)"""
+    condition = value.lower()
+    if condition in ('new', 'nuevo'):
+        return 'New'
+    return 'Used'
+
+
 def parse_image_urls(value: str) -> List[str]:
     """Parse image URLs from pipe-separated or JSON array format"""
     if not value or not value.strip():
@@ -159,29 +228,17 @@ def validate_row(row: Dict[str, Any], row_num: int) -> Tuple[bool, Dict[str, Any
             normalized['mileage'] = mileage
     
     # Normalize text fields
-    text_fields = ['make', 'model', 'trim', 'stock_number', 'condition', 
-                   'exterior_color', 'interior_color', 'transmission', 
-                   'drivetrain', 'fuel_type', 'body_style', 'engine',
-                   'carfax_url', 'window_sticker_url', 'primary_image_url']
-    
-    for field in text_fields:
+    for field in TEXT_FIELDS:
         value = row.get(field, '')
         if value and isinstance(value, str):
             normalized[field] = value.strip()
     
     # Normalize condition
     if 'condition' in normalized:
-        condition = normalized['condition'].lower()
-        if condition in ('new', 'nuevo'):
-            normalized['condition'] = 'New'
-        elif condition in ('used', 'usado', 'pre-owned'):
-            normalized['condition'] = 'Used'
-        else:
-            normalized['condition'] = 'Used'  # Default
+        normalized['condition'] = normalize_condition(normalized['condition'])
     
     # Normalize booleans
-    bool_fields = ['is_featured_homepage', 'call_for_availability_enabled', 'is_active']
-    for field in bool_fields:
+    for field in BOOLEAN_FIELDS:
         value = normalize_boolean(row.get(field))
         if value is not None:
             normalized[field] = value
@@ -192,7 +249,7 @@ def validate_row(row: Dict[str, Any], row_num: int) -> Tuple[bool, Dict[str, Any
         normalized['featured_rank'] = featured_rank
     
     # Parse image URLs
-    primary_image = row.get('primary_image_url', '').strip()
+    primary_image = (row.get('primary_image_url') or '').strip()
     additional_images = parse_image_urls(row.get('image_urls', ''))
     
     if primary_image or additional_images:
@@ -208,27 +265,206 @@ def validate_row(row: Dict[str, Any], row_num: int) -> Tuple[bool, Dict[str, Any
     return len(errors) == 0, normalized, errors
 
 
-def parse_csv_content(content: bytes) -> Tuple[List[Dict], List[str], List[str]]:
+def _frame_column(frame: pd.DataFrame, field: str) -> pd.Series:
+    """Column for field, all None when the CSV doesn't have it."""
+    if field in frame.columns:
+        return frame[field]
+    return pd.Series([None] * len(frame), index=frame.index, dtype=object)
+
+
+def _map_distinct(column: pd.Series, func: Callable[[str], Any], missing: Any = None) -> np.ndarray:
     """
-    Parse CSV content and return rows, headers, and any parsing errors.
+    Apply func once per distinct cell value and broadcast the results back.
+    
+    Feeds repeat most values (make, model, colors, flags, years), so the
+    scalar normalizers run on the distinct values rather than every row.
+    Missing cells (None) get `missing`. A dict rather than pd.factorize,
+    which treats an empty cell and a NUL character as the same value.
+    """
+    values = column.tolist()
+    mapped = {value: func(value) for value in dict.fromkeys(values) if value is not None}
+    mapped[None] = missing
+    return np.fromiter(map(mapped.__getitem__, values), dtype=object, count=len(values))
+
+
+def normalize_number_column(column: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Column-wise normalize_number(value, 'int'), once per distinct value.
     
     Returns:
-        (rows, headers, errors)
+        (the ints as objects, None where normalize_number returns None;
+        the same as float64 with NaN for None, for the range checks)
     """
-    errors = []
+    values = _map_distinct(column, lambda value: normalize_number(value, 'int'))
+    floats = _map_distinct(values, lambda number: float(number), np.nan).astype(float)
+    return values, floats
+
+
+def _strip_text(value: str) -> Optional[str]:
+    return value.strip() if value else None
+
+
+def _strip_condition(value: str) -> Optional[str]:
+    return normalize_condition(value.strip()) if value else None
+
+
+def _is_blank(value: str) -> bool:
+    return not value or not value.strip()
+
+
+def _parse_image_url_tuple(value: str) -> Tuple[str, ...]:
+    return tuple(parse_image_urls(value))
+
+
+def validate_frame(frame: pd.DataFrame, row_nums: List[int]) -> Iterator[Tuple[bool, Dict[str, Any], List[str]]]:
+    """
+    Validate and normalize a chunk of CSV rows column by column.
     
-    # Try different encodings
-    for encoding in ['utf-8', 'utf-8-sig', 'latin-1', 'cp1252']:
-        try:
-            text = content.decode(encoding)
-            break
-        except UnicodeDecodeError:
+    Same rules, messages and normalized data as validate_row. Each distinct
+    cell value is normalized once per column and every check is a boolean
+    mask over the column; rows (and error messages, for failing rows only)
+    are then built in one pass, as they are consumed.
+    
+    Args:
+        frame: One row per CSV row, normalized headers as columns (object
+            dtype, None for cells missing from short rows)
+        row_nums: CSV row number of each frame row
+    
+    Yields:
+        (is_valid, normalized_data, errors) in frame order
+    """
+    # VIN (required, unique identifier)
+    vin_checks = _map_distinct(_frame_column(frame, 'vin'), validate_vin, (False, "VIN is required")).tolist()
+    vin_ok = np.array([valid for valid, _ in vin_checks], dtype=bool)
+    vin_results = [result for _, result in vin_checks]
+    
+    # Other required fields
+    required_missing = [
+        (field, _map_distinct(_frame_column(frame, field), _is_blank, True).astype(bool))
+        for field in REQUIRED_FIELDS if field != 'vin'
+    ]
+    
+    # Numbers
+    raw_year = _frame_column(frame, 'year')
+    year, year_number = normalize_number_column(raw_year)
+    year_set = ~np.isnan(year_number) & (year_number != 0)
+    year_bad = year_set & ((year_number < 1900) | (year_number > datetime.now().year + 2))
+    price, price_number = normalize_number_column(_frame_column(frame, 'price'))
+    price_negative = price_number < 0
+    mileage, mileage_number = normalize_number_column(_frame_column(frame, 'mileage'))
+    mileage_negative = mileage_number < 0
+    featured_rank, _ = normalize_number_column(_frame_column(frame, 'featured_rank'))
+    
+    has_errors = ~vin_ok | year_bad | price_negative | mileage_negative
+    for _, missing in required_missing:
+        has_errors |= missing
+    
+    # Normalized columns (None: key left out), in validate_row's key order
+    columns = [
+        ('vin', np.where(vin_ok, np.array(vin_results, dtype=object), None)),
+        ('year', np.where(year_set & ~year_bad, year, None)),
+        ('price', np.where(price_negative, None, price)),
+        ('mileage', np.where(mileage_negative, None, mileage)),
+    ]
+    for field in TEXT_FIELDS:
+        normalize = _strip_condition if field == 'condition' else _strip_text
+        columns.append((field, _map_distinct(_frame_column(frame, field), normalize)))
+    for field in BOOLEAN_FIELDS:
+        columns.append((field, _map_distinct(_frame_column(frame, field), normalize_boolean)))
+    columns.append(('featured_rank', featured_rank))
+    columns = [(field, values.tolist()) for field, values in columns]
+    primary_images = _map_distinct(_frame_column(frame, 'primary_image_url'), str.strip, '').tolist()
+    additional_images = _map_distinct(_frame_column(frame, 'image_urls'), _parse_image_url_tuple, ()).tolist()
+    raw_years = raw_year.tolist()
+    
+    for i in range(len(frame)):
+        normalized = {field: values[i] for field, values in columns if values[i] is not None}
+        primary_image, urls = primary_images[i], additional_images[i]
+        if primary_image or urls:
+            images = [{'url': primary_image, 'is_primary': True}] if primary_image else []
+            images.extend({'url': img_url, 'is_primary': False} for img_url in urls if img_url != primary_image)
+            if images:
+                normalized['images'] = images
+        
+        if not has_errors[i]:
+            yield True, normalized, []
             continue
-    else:
-        raise CSVValidationError("Unable to decode CSV file. Please use UTF-8 encoding.")
+        
+        # Same messages, same order as validate_row
+        row_num = row_nums[i]
+        errors = []
+        if not vin_ok[i]:
+            errors.append(f"Row {row_num}: {vin_results[i]}")
+        for field, missing in required_missing:
+            if missing[i]:
+                errors.append(f"Row {row_num}: Missing required field '{field}'")
+        if year_bad[i]:
+            errors.append(f"Row {row_num}: Invalid year '{raw_years[i]}'")
+        if price_negative[i]:
+            errors.append(f"Row {row_num}: Price cannot be negative")
+        if mileage_negative[i]:
+            errors.append(f"Row {row_num}: Mileage cannot be negative")
+        yield False, normalized, errors
+
+
+def sniff_encoding(prefix: bytes) -> str:
+    """
+    Pick the CSV encoding from the first bytes of the file.
+    
+    UTF-8 (BOM stripped) when the prefix is valid UTF-8, latin-1 otherwise.
+    Bytes past the prefix that don't fit the chosen encoding are replaced
+    rather than failing the import.
+    """
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # Incremental decode tolerates a multi-byte character cut at the end
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def normalize_header(header: str) -> str:
+    return header.lower().strip().replace(' ', '_')
+
+
+class _CountingReader(io.RawIOBase):
+    """Binary reader that tracks bytes read and enforces MAX_CSV_SIZE_BYTES."""
+    
+    def __init__(self, fileobj: BinaryIO):
+        self._fileobj = fileobj
+        self.bytes_read = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        data = self._fileobj.read(len(buffer))
+        self.bytes_read += len(data)
+        if self.bytes_read > MAX_CSV_SIZE_BYTES:
+            raise CSVValidationError(f"CSV file too large. Maximum size is {MAX_CSV_SIZE_MB}MB")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_csv_stream(fileobj: BinaryIO) -> Tuple[csv.DictReader, List[str], _CountingReader]:
+    """
+    Open a seekable binary CSV file for streaming.
+    
+    Returns:
+        (reader, normalized headers, byte counter)
+    
+    Raises:
+        CSVValidationError: If headers are missing or incomplete
+    """
+    prefix = fileobj.read(ENCODING_SNIFF_BYTES)
+    fileobj.seek(0)
+    encoding = sniff_encoding(prefix)
     
-    # Parse CSV
-    reader = csv.DictReader(io.StringIO(text))
+    counter = _CountingReader(fileobj)
+    text = io.TextIOWrapper(io.BufferedReader(counter), encoding=encoding, errors='replace', newline='')
+    reader = csv.DictReader(text)
     
     # Get headers
     headers = reader.fieldnames or []
@@ -236,7 +472,7 @@ def parse_csv_content(content: bytes) -> Tuple[List[Dict], List[str], List[str]]
         raise CSVValidationError("CSV file has no headers")
     
     # Normalize headers (lowercase, strip whitespace)
-    header_map = {h.lower().strip().replace(' ', '_'): h for h in headers}
+    header_map = {normalize_header(h): h for h in headers}
     
     # Check for required columns
     missing_required = []
@@ -247,31 +483,181 @@ def parse_csv_content(content: bytes) -> Tuple[List[Dict], List[str], List[str]]
     if missing_required:
         raise CSVValidationError(f"Missing required columns: {', '.join(missing_required)}")
     
-    # Parse rows
-    rows = []
-    for i, row in enumerate(reader, start=2):  # Start at 2 (1 is header)
-        # Normalize keys
-        normalized_row = {}
-        for key, value in row.items():
-            normalized_key = key.lower().strip().replace(' ', '_')
-            normalized_row[normalized_key] = value
-        rows.append(normalized_row)
+    return reader, list(header_map.keys()), counter
+
+
+def iter_csv_rows(reader: csv.DictReader) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (row_num, row with normalized keys); row 1 is the header."""
+    for i, row in enumerate(reader, start=2):
+        yield i, {normalize_header(key): value for key, value in row.items() if key is not None}
+
+
+def iter_csv_frames(reader: csv.DictReader, chunk_rows: int = VALIDATION_CHUNK_ROWS) -> Iterator[Tuple[List[int], pd.DataFrame]]:
+    """
+    Yield (row_nums, frame) chunks of up to chunk_rows rows.
+    
+    Reads the DictReader's underlying csv.reader directly, with the same
+    rows, numbering and cell values iter_csv_rows would produce: blank
+    lines are skipped, short rows padded with None, extra cells dropped
+    and a repeated header keeps its last column.
+    """
+    fieldnames = reader.fieldnames
+    width = len(fieldnames)
+    positions = {normalize_header(header): i for i, header in enumerate(fieldnames)}
+    
+    row_num = 1
+    row_nums, rows = [], []
+    for values in reader.reader:
+        if not values:
+            continue
+        if len(values) < width:
+            values += [None] * (width - len(values))
+        row_num += 1
+        row_nums.append(row_num)
+        # Tuples of strings get untracked by the GC; a chunk of lists would not
+        rows.append(tuple(values))
+        if len(rows) >= chunk_rows:
+            frame = _rows_to_frame(rows, positions)
+            rows = []
+            yield row_nums, frame
+            row_nums = []
+    if rows:
+        yield row_nums, _rows_to_frame(rows, positions)
+
+
+def _rows_to_frame(rows: List[Tuple[Optional[str], ...]], positions: Dict[str, int]) -> pd.DataFrame:
+    cells = list(zip(*rows))
+    return pd.DataFrame(
+        {name: np.array(cells[position], dtype=object) for name, position in positions.items()},
+        dtype=object,
+    )
+
+
+ValidatedRow = Tuple[int, Any, bool, Dict[str, Any], List[str]]
+
+
+def iter_validated_chunks(
+    reader: csv.DictReader,
+    engine: str = CSV_VALIDATION_ENGINE,
+    chunk_rows: int = VALIDATION_CHUNK_ROWS,
+) -> Iterator[List[ValidatedRow]]:
+    """
+    Validate every row with the given engine ("pandas" or "python"),
+    up to chunk_rows rows per yielded list.
+    
+    Each next() does all the blocking work for its chunk (reading,
+    decoding, parsing, validating), so callers can run it in a thread.
+    
+    Yields:
+        [(row_num, raw vin cell, is_valid, normalized_data, errors)]
+    """
+    if engine == 'python':
+        chunk = []
+        for i, row in iter_csv_rows(reader):
+            is_valid, normalized, row_errors = validate_row(row, i)
+            chunk.append((i, row.get('vin', 'N/A'), is_valid, normalized, row_errors))
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        return
+    
+    for row_nums, frame in iter_csv_frames(reader, chunk_rows):
+        raw_vins = frame['vin'].tolist()
+        results = validate_frame(frame, row_nums)
+        yield [
+            (row_num, raw_vin, is_valid, normalized, row_errors)
+            for row_num, raw_vin, (is_valid, normalized, row_errors) in zip(row_nums, raw_vins, results)
+        ]
+
+
+def iter_validated_rows(
+    reader: csv.DictReader,
+    engine: str = CSV_VALIDATION_ENGINE,
+) -> Iterator[ValidatedRow]:
+    """
+    Validate every row with the given engine ("pandas" or "python").
+    
+    Yields:
+        (row_num, raw vin cell, is_valid, normalized_data, errors)
+    """
+    for chunk in iter_validated_chunks(reader, engine):
+        yield from chunk
+
+
+def parse_csv_content(content: bytes) -> Tuple[List[Dict], List[str], List[str]]:
+    """
+    Parse CSV content and return rows, headers, and any parsing errors.
+    
+    Materializes every row; imports stream through iter_csv_rows instead.
+    
+    Returns:
+        (rows, headers, errors)
+    """
+    reader, headers, _ = open_csv_stream(io.BytesIO(content))
+    rows = [row for _, row in iter_csv_rows(reader)]
+    return rows, headers, []
+
+
+class _VinFilter:
+    """Fixed-memory set of VINs seen so far (Bloom filter, 4 probes)."""
+    
+    def __init__(self, size_bytes: int = DRY_RUN_VIN_FILTER_BYTES):
+        self._bits = bytearray(size_bytes)
+        self._size = size_bytes * 8
     
-    return rows, list(header_map.keys()), errors
+    def _positions(self, vin: str) -> List[int]:
+        digest = hashlib.blake2b(vin.encode(), digest_size=16).digest()
+        return [int.from_bytes(digest[i:i + 4], 'little') % self._size for i in range(0, 16, 4)]
+    
+    def __contains__(self, vin: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(vin))
+    
+    def update(self, vins) -> None:
+        for vin in vins:
+            for pos in self._positions(vin):
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+
+
+def _record_skipped_row(result: Dict[str, Any], skipped_row: Dict[str, Any], errors: List[str]) -> None:
+    """Count a skipped row; keep its details only up to MAX_REPORTED_ERRORS."""
+    result['counts']['skipped'] += 1
+    if len(result['skipped_rows']) < MAX_REPORTED_ERRORS:
+        result['skipped_rows'].append(skipped_row)
+        result['errors'].extend(errors)
+    else:
+        result['errors_truncated'] += len(errors)
+
+
+async def _report_progress(progress: Optional[Callable], result: Dict[str, Any], counter: _CountingReader, total_bytes: Optional[int]) -> None:
+    if progress is None:
+        return
+    update = progress({
+        'bytes_read': counter.bytes_read,
+        'total_bytes': total_bytes,
+        'counts': dict(result['counts']),
+    })
+    if inspect.isawaitable(update):
+        await update
 
 
 async def process_csv_import(
-    content: bytes,
+    source: Union[bytes, BinaryIO],
     db,
-    dry_run: bool = False
+    dry_run: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], Any]] = None,
 ) -> Dict[str, Any]:
     """
     Process CSV import with validation and upsert logic.
     
     Args:
-        content: Raw CSV file content
+        source: Raw CSV bytes or a seekable binary file (e.g. the upload's
+            spooled temp file), read incrementally
         db: MongoDB database connection
         dry_run: If True, only validate and preview (no database changes)
+        progress: Optional callback (sync or async) called after every
+            flushed batch with bytes_read/total_bytes and the running counts
     
     Returns:
         Import result with counts and row-level details
@@ -290,122 +676,237 @@ async def process_csv_import(
         },
         'preview': [],
         'errors': [],
+        'errors_truncated': 0,
         'skipped_rows': [],
     }
     
-    # Check file size
-    if len(content) > MAX_CSV_SIZE_BYTES:
-        raise CSVValidationError(f"CSV file too large. Maximum size is {MAX_CSV_SIZE_MB}MB")
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
     
-    # Parse CSV
-    rows, headers, parse_errors = parse_csv_content(content)
-    result['errors'].extend(parse_errors)
-    result['counts']['total_rows'] = len(rows)
-    result['headers'] = headers
+    # Check file size (also enforced while reading, for unsized streams)
+    total_bytes = None
+    if source.seekable():
+        total_bytes = source.seek(0, io.SEEK_END)
+        source.seek(0)
+        if total_bytes > MAX_CSV_SIZE_BYTES:
+            raise CSVValidationError(f"CSV file too large. Maximum size is {MAX_CSV_SIZE_MB}MB")
     
-    if not rows:
-        raise CSVValidationError("CSV file contains no data rows")
+    # Sniffing the encoding and reading the header block on file reads
+    reader, headers, counter = await asyncio.to_thread(open_csv_stream, source)
+    result['headers'] = headers
     
-    # Get existing VINs from database
     collection = db["admin_vehicles"]
-    existing_vins = {}
-    async for doc in collection.find({}, {'vin': 1, '_id': 1}):
-        if doc.get('vin'):
-            existing_vins[doc['vin'].upper()] = str(doc['_id'])
-    
-    # Validate and categorize rows
-    valid_rows = []
+    # Dry runs write nothing, so repeated VINs across batches are tracked here
+    seen_vins = _VinFilter() if dry_run else None
+    now = datetime.now(timezone.utc)
+    batch = []
     
-    for i, row in enumerate(rows, start=2):
-        is_valid, normalized, row_errors = validate_row(row, i)
+    chunks = iter_validated_chunks(reader)
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
         
-        if not is_valid:
-            result['errors'].extend(row_errors)
-            result['skipped_rows'].append({
+        for i, raw_vin, is_valid, normalized, row_errors in chunk:
+            result['counts']['total_rows'] += 1
+            
+            if not is_valid:
+                _record_skipped_row(result, {
+                    'row': i,
+                    'vin': raw_vin,
+                    'reasons': row_errors,
+                }, row_errors)
+                continue
+            
+            batch.append({
                 'row': i,
-                'vin': row.get('vin', 'N/A'),
-                'reasons': row_errors,
+                'vin': normalized.get('vin', '').upper(),
+                'vehicle': f"{normalized.get('year', '')} {normalized.get('make', '')} {normalized.get('model', '')}",
+                'data': normalized,
             })
-            result['counts']['skipped'] += 1
-            continue
-        
-        # Check if VIN exists (for upsert logic)
-        vin = normalized.get('vin', '').upper()
-        existing_id = existing_vins.get(vin)
+            
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await _flush_import_batch(collection, batch, result, dry_run, seen_vins, now)
+                batch = []
+                await _report_progress(progress, result, counter, total_bytes)
+    
+    if not result['counts']['total_rows']:
+        raise CSVValidationError("CSV file contains no data rows")
+    
+    if batch:
+        await _flush_import_batch(collection, batch, result, dry_run, seen_vins, now)
+    await _report_progress(progress, result, counter, total_bytes)
+    
+    # If dry run, return preview only
+    if dry_run:
+        return result
+    
+    logger.info(
+        f"CSV Import: {result['counts']['created']} created, {result['counts']['updated']} updated, "
+        f"{result['counts']['skipped']} skipped"
+    )
+    invalidate_inventory_cache("csv_import")
+    
+    result['success'] = result['counts']['skipped'] == 0 or result['counts']['created'] + result['counts']['updated'] > 0
+    
+    return result
+
+
+async def _flush_import_batch(
+    collection,
+    batch: List[Dict],
+    result: Dict[str, Any],
+    dry_run: bool,
+    seen_vins: Optional[_VinFilter],
+    now: datetime,
+) -> None:
+    """Categorize a batch of valid rows and (unless dry run) upsert it."""
+    # Existing VINs - only those in this batch. Earlier batches are
+    # already written, so a VIN repeated in the file is seen as existing.
+    existing_vins = await fetch_existing_vins(collection, [row_info['vin'] for row_info in batch])
+    
+    batch_vins = set()
+    for row_info in batch:
+        vin = row_info['vin']
+        existing = existing_vins.get(vin)
+        existing_id = existing['id'] if existing else None
+        is_update = (
+            existing_id is not None
+            or vin in batch_vins
+            or (seen_vins is not None and vin in seen_vins)
+        )
+        batch_vins.add(vin)
         
-        row_info = {
-            'row': i,
-            'vin': vin,
-            'vehicle': f"{normalized.get('year', '')} {normalized.get('make', '')} {normalized.get('model', '')}",
-            'action': 'update' if existing_id else 'create',
-            'data': normalized,
-            'existing_id': existing_id,
-        }
+        row_info['action'] = 'update' if is_update else 'create'
+        row_info['existing_id'] = existing_id
+        row_info['keep_images'] = bool(existing and existing['stored_images'])
         
-        if existing_id:
+        if is_update:
             result['counts']['to_update'] += 1
         else:
             result['counts']['to_create'] += 1
         
         result['counts']['valid_rows'] += 1
-        valid_rows.append(row_info)
         
         # Add to preview (first N rows)
         if len(result['preview']) < MAX_PREVIEW_ROWS:
             result['preview'].append({
                 'row': row_info['row'],
-                'vin': row_info['vin'],
+                'vin': vin,
                 'vehicle': row_info['vehicle'],
                 'action': row_info['action'],
-                'price': normalized.get('price'),
+                'price': row_info['data'].get('price'),
             })
     
-    # If dry run, return preview only
+    if seen_vins is not None:
+        seen_vins.update(batch_vins)
     if dry_run:
-        return result
+        return
     
-    # Perform actual import
-    now = datetime.now(timezone.utc)
+    for row_info, outcome, error in await bulk_upsert_rows(collection, batch, now):
+        if error:
+            vin = row_info['vin']
+            logger.error(f"CSV Import error for VIN={vin}: {error}")
+            _record_skipped_row(result, {
+                'row': row_info['row'],
+                'vin': vin,
+                'reasons': [f"Database error: {error}"],
+            }, [f"Database error for VIN {vin}: {error}"])
+        else:
+            result['counts'][outcome] += 1
     
-    for row_info in valid_rows:
-        data = row_info['data']
-        vin = row_info['vin']
-        
+    # Keep list-view fields (thumbnail/card) in sync with the imported data
+    await refresh_derived_fields_for_vins(collection, list(batch_vins))
+
+
+async def fetch_existing_vins(collection, vins: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Map VIN -> {'id': vehicle _id, 'stored_images': bool} for the given VINs
+    ($in in chunks). stored_images marks vehicles whose images live in the
+    image store.
+    """
+    vins = [v for v in dict.fromkeys(vins) if v]
+    existing_vins = {}
+    projection = {'vin': 1, 'images.blob_id': 1, 'images.upload_id': 1}
+    for i in range(0, len(vins), VIN_LOOKUP_CHUNK_SIZE):
+        async for doc in collection.find({'vin': {'$in': vins[i:i + VIN_LOOKUP_CHUNK_SIZE]}}, projection):
+            existing_vins[doc['vin'].upper()] = {
+                'id': str(doc['_id']),
+                'stored_images': has_stored_images(doc.get('images')),
+            }
+    return existing_vins
+
+
+def build_vehicle_upsert(data: Dict[str, Any], vin: str, now: datetime, keep_images: bool = False) -> UpdateOne:
+    """
+    Upsert keyed on VIN.
+    
+    Existing vehicles get a partial update (blank CSV cells don't clear
+    fields); new vehicles are inserted with the same defaults a manual
+    create gets (created_at, is_active, generated stock number).
+    keep_images leaves images[] alone (vehicles with stored images).
+    """
+    if keep_images:
+        data = {k: v for k, v in data.items() if k != 'images'}
+    set_fields = {k: v for k, v in data.items() if v is not None}
+    set_fields['updated_at'] = now
+    on_insert = {k: None for k, v in data.items() if v is None}
+    on_insert['created_at'] = now
+    
+    if 'is_active' not in set_fields:
+        on_insert['is_active'] = True
+    
+    # Generate stock number if not provided
+    if not set_fields.get('stock_number'):
+        set_fields.pop('stock_number', None)
+        on_insert['stock_number'] = f"CMA{uuid.uuid4().hex[:6].upper()}"
+    
+    return UpdateOne(
+        {'vin': vin},
+        {'$set': set_fields, '$setOnInsert': on_insert},
+        upsert=True,
+    )
+
+
+async def bulk_upsert_rows(collection, batch: List[Dict], now: datetime) -> List[Tuple[Dict, Optional[str], Optional[str]]]:
+    """
+    Upsert a batch of validated rows with ordered bulk writes.
+    
+    Ordered so a VIN repeated in the file is applied in row order. An
+    ordered bulk stops at the first failing write; that row is reported
+    and the rest of the batch is re-submitted.
+    
+    Returns:
+        [(row_info, 'created' | 'updated' | None, error message | None)]
+        in batch order
+    """
+    ops = [
+        build_vehicle_upsert(row_info['data'], row_info['vin'], now, row_info.get('keep_images', False))
+        for row_info in batch
+    ]
+    outcomes = []
+    offset = 0
+    
+    while offset < len(batch):
         try:
-            if row_info['action'] == 'update':
-                # Update existing vehicle (partial update)
-                update_data = {k: v for k, v in data.items() if v is not None}
-                update_data['updated_at'] = now
-                
-                await collection.update_one(
-                    {'vin': vin},
-                    {'$set': update_data}
-                )
-                result['counts']['updated'] += 1
-                logger.info(f"CSV Import: Updated vehicle VIN={vin}")
-                
-            else:
-                # Create new vehicle
-                data['created_at'] = now
-                data['updated_at'] = now
-                data['is_active'] = data.get('is_active', True)
-                
-                # Generate stock number if not provided
-                if not data.get('stock_number'):
-                    data['stock_number'] = f"CMA{uuid.uuid4().hex[:6].upper()}"
-                
-                await collection.insert_one(data)
-                result['counts']['created'] += 1
-                logger.info(f"CSV Import: Created vehicle VIN={vin}")
-                
-        except Exception as e:
-            logger.error(f"CSV Import error for VIN={vin}: {e}")
-            result['errors'].append(f"Database error for VIN {vin}: {str(e)}")
-            result['counts']['skipped'] += 1
-    
-    result['success'] = len(result['errors']) == 0 or result['counts']['created'] + result['counts']['updated'] > 0
+            bulk_result = await collection.bulk_write(ops[offset:], ordered=True)
+            upserted = set(bulk_result.upserted_ids)
+            failed_at, error = None, None
+        except BulkWriteError as e:
+            upserted = {entry['index'] for entry in e.details.get('upserted', [])}
+            write_error = e.details['writeErrors'][0]
+            failed_at, error = write_error['index'], write_error.get('errmsg', 'write failed')
+        
+        applied = batch[offset:] if failed_at is None else batch[offset:offset + failed_at]
+        for index, row_info in enumerate(applied):
+            outcomes.append((row_info, 'created' if index in upserted else 'updated', None))
+        
+        if failed_at is None:
+            break
+        outcomes.append((batch[offset + failed_at], None, error))
+        offset += failed_at + 1
     
-    return result
+    return outcomes
 
 
 def generate_csv_template() -> str:
@@ -445,7 +946,3 @@ def generate_csv_template() -> str:
     writer.writerow(sample_row)
     
     return output.getvalue()
-
-
-# Need to import uuid for stock number generation
-import uuid
@@ -0,0 +1,209 @@
+"""
+On-demand Image Derivative Cache
+
+Width/format/quality derivatives (GET /api/images/{upload_id}?w=&fmt=&q=)
+are rendered from the stored source variant on first request instead of at
+upload time, so sizes nobody asks for cost nothing and new ladder widths
+need no batch re-run.
+
+Rendered derivatives are kept in a size-bounded directory with LRU
+eviction (recency survives restarts via file mtimes). All file I/O runs in
+worker threads, never on the event loop. Concurrent misses for the same
+derivative are single-flighted: one render runs in the image process pool
+and every waiter gets its result. The render is shielded, so a cancelled
+request (client gone) neither aborts it nor fails the other waiters.
+
+The directory is shared by all uvicorn workers: a file rendered by one is
+a hit for the others, and each worker re-indexes the directory every
+DERIVATIVE_CACHE_RESCAN_SECONDS so files written or evicted elsewhere
+count towards DERIVATIVE_CACHE_MAX_MB. Between rescans the bound can be
+overshot by what other workers rendered in the meantime.
+
+Configuration (backend/.env):
+- DERIVATIVE_CACHE_PATH=/app/data/derivatives
+- DERIVATIVE_CACHE_MAX_MB=512
+- DERIVATIVE_CACHE_RESCAN_SECONDS=60
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_CACHE_PATH = os.environ.get(
+    "DERIVATIVE_CACHE_PATH",
+    str(Path(__file__).parent.parent / "data" / "derivatives")
+)
+DERIVATIVE_CACHE_MAX_MB = int(os.environ.get("DERIVATIVE_CACHE_MAX_MB", "512"))
+DERIVATIVE_CACHE_RESCAN_SECONDS = float(os.environ.get("DERIVATIVE_CACHE_RESCAN_SECONDS", "60"))
+
+
+class DerivativeCache:
+    """Size-bounded LRU of rendered derivatives on disk, with single-flight renders."""
+
+    def __init__(
+        self,
+        root: str = DERIVATIVE_CACHE_PATH,
+        max_bytes: int = DERIVATIVE_CACHE_MAX_MB * 1024 * 1024,
+        rescan_seconds: float = DERIVATIVE_CACHE_RESCAN_SECONDS,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.rescan_seconds = rescan_seconds
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._scanned_at: Optional[float] = None
+        self._scan_lock = asyncio.Lock()
+        self._pending: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    # Blocking helpers, run through asyncio.to_thread
+
+    def _scan(self) -> "OrderedDict[str, int]":
+        """Index the files on disk, least recently used first."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.root.rglob("*"):
+            if path.name.endswith(".tmp"):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # evicted by another worker meanwhile
+            if path.is_file():
+                files.append((stat.st_mtime, str(path.relative_to(self.root)), stat.st_size))
+        return OrderedDict((key, size) for _, key, size in sorted(files))
+
+    def _read(self, key: str) -> Optional[bytes]:
+        path = self.root / key
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # recency for LRU order after a restart
+        except OSError:
+            return None
+        return data
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Per-process temp name: two workers may render the same key
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def _unlink(self, keys: List[str]) -> None:
+        for key in keys:
+            try:
+                (self.root / key).unlink()
+            except OSError:
+                pass
+
+    async def _refresh(self) -> None:
+        """Index the directory on first use and again every rescan_seconds."""
+        if self._scanned_at is not None and time.monotonic() - self._scanned_at < self.rescan_seconds:
+            return
+        async with self._scan_lock:
+            if self._scanned_at is not None and time.monotonic() - self._scanned_at < self.rescan_seconds:
+                return
+            first_scan = self._scanned_at is None
+            self._entries = await asyncio.to_thread(self._scan)
+            self._size = sum(self._entries.values())
+            self._scanned_at = time.monotonic()
+            await self._evict()
+            if first_scan and self._entries:
+                logger.info(f"Derivative cache: {len(self._entries)} files, {self._size // 1024} KB")
+
+    async def _evict(self) -> None:
+        victims = []
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            victims.append(key)
+        if victims:
+            await asyncio.to_thread(self._unlink, victims)
+
+    def _index(self, key: str, size: Optional[int]) -> None:
+        """Record key as most recently used (size None drops it)."""
+        self._size -= self._entries.pop(key, 0)
+        if size is not None:
+            self._entries[key] = size
+            self._size += size
+
+    async def get(self, key: str) -> Optional[bytes]:
+        await self._refresh()
+        # Not only indexed keys: another worker may have rendered it
+        data = await asyncio.to_thread(self._read, key)
+        self._index(key, None if data is None else len(data))
+        return data
+
+    async def size_of(self, key: str) -> Optional[int]:
+        """Size of a cached derivative from the index, without touching the file."""
+        await self._refresh()
+        return self._entries.get(key)
+
+    async def put(self, key: str, data: bytes) -> None:
+        await self._refresh()
+        await asyncio.to_thread(self._write, key, data)
+        self._index(key, len(data))
+        await self._evict()
+
+    async def _render_and_put(self, render: Callable[[], Awaitable[bytes]], key: str) -> bytes:
+        data = await render()
+        await self.put(key, data)
+        return data
+
+    def _render_done(self, key: str, task: asyncio.Task) -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        if not task.cancelled():
+            task.exception()  # waiters re-raise it; don't warn if there are none
+
+    async def get_or_render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, str]:
+        """
+        Return cached bytes, or render them once for all concurrent callers.
+
+        Returns:
+            (bytes, cache status: "HIT" | "MISS" | "COALESCED")
+        """
+        data = await self.get(key)
+        if data is not None:
+            self.hits += 1
+            return data, "HIT"
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending), "COALESCED"
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._render_and_put(render, key))
+        self._pending[key] = task
+        task.add_done_callback(lambda done: self._render_done(key, done))
+        return await asyncio.shield(task), "MISS"
+
+    async def stats(self) -> dict:
+        await self._refresh()
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "path": str(self.root),
+            "files": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "in_flight": len(self._pending),
+        }
+
+
+derivative_cache = DerivativeCache()
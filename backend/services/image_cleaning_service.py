@@ -4,24 +4,61 @@ Image Cleaning Service
 Removes dealership branding/watermarks from vehicle photos.
 Creates multiple derivatives: thumb, display, full, clean.
 
+Derivatives are described by VARIANT_SPECS. Each distinct spec (crop,
+fit, size, quality) is rendered and encoded once; variants with the same
+spec (clean/full) are aliases that share a single stored blob. Which
+variants are kept is configurable via CLEAN_VARIANTS (clean, display and
+thumb are always produced; orig is only kept when the source itself is
+about to be replaced, so the image can be reprocessed later), e.g.
+CLEAN_VARIANTS=full,orig.
+
+Results are content-addressed (see services/image_store.py): the same
+source (same bytes, or same URL with an unchanged ETag) cleaned with the
+same settings reuses the stored variants instead of downloading and
+re-processing, which makes repeated syncs/imports of dealer URLs cheap.
+
 Supports:
 - Bottom strip cropping (most common for dealer watermarks)
 - Top strip cropping
 - Corner watermark cropping
 - Custom crop regions
 
-Storage: Processed images are Base64 encoded and stored in MongoDB.
-For production scale, switch to S3/R2 storage.
+Storage: Processed derivatives are written to the image store
+(services/image_store.py) and referenced by /api/images/... URLs.
+
+Throughput: downloads share one pooled HTTP client (utils/http_client.py)
+with per-host limits and retries, Pillow work runs in the image process
+pool, and images/vehicles are processed concurrently:
+- CLEAN_IMAGE_CONCURRENCY=6    (images in flight per vehicle)
+- CLEAN_VEHICLE_CONCURRENCY=4  (vehicles in flight per batch run)
 """
 import base64
 import logging
+import uuid
+from datetime import datetime, timezone
 from io import BytesIO
-from typing import Dict, List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
 from PIL import Image
 import os
-import httpx
 import asyncio
 
+from services.image_store import (
+    get_image_store,
+    delete_image_blobs,
+    make_blob_id,
+    sha256_hex,
+    store_variants_deduped,
+)
+from services.image_service import (
+    decode_data_url,
+    render_width_ladder,
+    responsive_sources,
+    LADDER_SETTINGS,
+)
+from services.image_pipeline import run_in_image_pool
+from utils.http_client import fetch_bytes, fetch_validator
+from services.vehicle_derived_fields import compute_derived_fields
+
 logger = logging.getLogger(__name__)
 
 # Configuration
@@ -30,6 +67,8 @@ CROP_TOP_PIXELS = int(os.environ.get("CROP_TOP_PIXELS", "0"))
 IMAGE_QUALITY_FULL = int(os.environ.get("IMAGE_QUALITY_FULL", "92"))
 IMAGE_QUALITY_DISPLAY = int(os.environ.get("IMAGE_QUALITY_DISPLAY", "88"))
 IMAGE_QUALITY_THUMB = int(os.environ.get("IMAGE_QUALITY_THUMB", "80"))
+CLEAN_IMAGE_CONCURRENCY = int(os.environ.get("CLEAN_IMAGE_CONCURRENCY", "6"))
+CLEAN_VEHICLE_CONCURRENCY = int(os.environ.get("CLEAN_VEHICLE_CONCURRENCY", "4"))
 
 # Output dimensions
 DISPLAY_MAX_WIDTH = 1200
@@ -40,6 +79,32 @@ FULL_MAX_WIDTH = 1920
 FULL_MAX_HEIGHT = 1440
 
 
+class VariantSpec(NamedTuple):
+    """How one derivative is rendered."""
+    cropped: bool  # branding crop applied
+    fit: str       # "contain" (fit inside box) or "cover" (exact box, center crop)
+    width: int
+    height: int
+    quality: int
+
+
+VARIANT_SPECS: Dict[str, VariantSpec] = {
+    "orig": VariantSpec(False, "contain", FULL_MAX_WIDTH, FULL_MAX_HEIGHT, IMAGE_QUALITY_FULL),
+    "clean": VariantSpec(True, "contain", FULL_MAX_WIDTH, FULL_MAX_HEIGHT, IMAGE_QUALITY_FULL),
+    "full": VariantSpec(True, "contain", FULL_MAX_WIDTH, FULL_MAX_HEIGHT, IMAGE_QUALITY_FULL),
+    "display": VariantSpec(True, "contain", DISPLAY_MAX_WIDTH, DISPLAY_MAX_HEIGHT, IMAGE_QUALITY_DISPLAY),
+    "thumb": VariantSpec(True, "cover", THUMB_WIDTH, THUMB_HEIGHT, IMAGE_QUALITY_THUMB),
+}
+
+# clean marks an image as processed; display/thumb back url/thumbnail_url
+REQUIRED_CLEAN_VARIANTS = ["clean", "display", "thumb"]
+CLEAN_VARIANTS = REQUIRED_CLEAN_VARIANTS + [
+    name.strip()
+    for name in os.environ.get("CLEAN_VARIANTS", "full").split(",")
+    if name.strip() in VARIANT_SPECS and name.strip() not in REQUIRED_CLEAN_VARIANTS
+]
+
+
 class ImageCleaningError(Exception):
     """Raised when image cleaning fails"""
     pass
@@ -182,29 +247,101 @@ def correct_exif_orientation(img: Image.Image) -> Image.Image:
         return img
 
 
-def image_to_data_url(img: Image.Image, quality: int = 85) -> str:
-    """Convert PIL Image to Base64 data URL."""
+def image_to_webp_bytes(img: Image.Image, quality: int = 85) -> bytes:
+    """Encode PIL Image as WebP bytes."""
     buffer = BytesIO()
     img.save(buffer, format='WEBP', quality=quality, method=6, optimize=True)
-    buffer.seek(0)
-    b64 = base64.b64encode(buffer.read()).decode('utf-8')
+    return buffer.getvalue()
+
+
+def image_to_data_url(img: Image.Image, quality: int = 85) -> str:
+    """Convert PIL Image to Base64 data URL (legacy inline storage)."""
+    b64 = base64.b64encode(image_to_webp_bytes(img, quality)).decode('utf-8')
     return f"data:image/webp;base64,{b64}"
 
 
 async def download_image(url: str, timeout: int = 30) -> bytes:
-    """Download image from URL."""
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, timeout=timeout, follow_redirects=True)
-        response.raise_for_status()
-        return response.content
+    """Download image from URL (shared keep-alive client, retried)."""
+    return await fetch_bytes(url, timeout=timeout)
+
+
+async def load_source_image(source_url: str) -> bytes:
+    """
+    Load the source bytes for an image entry.
+    
+    Handles remote URLs, legacy data URLs and blobs already in the image store.
+    """
+    if source_url.startswith("data:"):
+        content, _ = decode_data_url(source_url)
+        return content
+    
+    if "/api/images/" in source_url:
+        upload_id, variant = source_url.split("/api/images/", 1)[1].split("?", 1)[0].split("/")[:2]
+        return await get_image_store().read(upload_id, variant)
+    
+    return await download_image(source_url)
+
+
+def render_variants(
+    img: Image.Image,
+    names: List[str],
+    crop_bottom: int = CROP_BOTTOM_PIXELS,
+    crop_top: int = CROP_TOP_PIXELS,
+    ladder: bool = False,
+) -> Dict[str, bytes]:
+    """
+    Render the named variants, computing each distinct spec only once.
+    
+    Resized frames are shared between specs that only differ in quality,
+    and aliases (same spec) get the very same bytes object.
+    
+    Args:
+        img: Oriented RGB source image
+        names: Variant names from VARIANT_SPECS
+        crop_bottom: Pixels to crop from bottom
+        crop_top: Pixels to crop from top
+        ladder: Also render the responsive width ladder from the clean frame
+    
+    Returns:
+        Dict of variant name -> encoded bytes
+    """
+    cleaned = None
+    frames: Dict[tuple, Image.Image] = {}
+    encoded: Dict[VariantSpec, bytes] = {}
+    result = {}
+    
+    for name in names:
+        spec = VARIANT_SPECS[name]
+        if spec not in encoded:
+            frame_key = (spec.cropped, spec.fit, spec.width, spec.height)
+            if frame_key not in frames:
+                source = img
+                if spec.cropped:
+                    if cleaned is None:
+                        cleaned = crop_branding(img, crop_bottom=crop_bottom, crop_top=crop_top)
+                    source = cleaned
+                if spec.fit == "cover":
+                    frames[frame_key] = create_thumbnail(source, spec.width, spec.height)
+                else:
+                    frames[frame_key] = smart_resize(source, spec.width, spec.height)
+            encoded[spec] = image_to_webp_bytes(frames[frame_key], spec.quality)
+        result[name] = encoded[spec]
+    
+    if ladder and "clean" in result:
+        clean_spec = VARIANT_SPECS["clean"]
+        clean_frame = frames[(clean_spec.cropped, clean_spec.fit, clean_spec.width, clean_spec.height)]
+        result.update(render_width_ladder(clean_frame, "clean", result["clean"]))
+    
+    return result
 
 
 def process_image_for_clean_storage(
     content: bytes,
     crop_bottom: int = CROP_BOTTOM_PIXELS,
     crop_top: int = CROP_TOP_PIXELS,
-    generate_derivatives: bool = True
-) -> Dict[str, str]:
+    generate_derivatives: bool = True,
+    variants: Optional[List[str]] = None,
+) -> Dict[str, bytes]:
     """
     Process an image: correct orientation, crop branding, generate derivatives.
     
@@ -213,17 +350,22 @@ def process_image_for_clean_storage(
         crop_bottom: Pixels to crop from bottom
         crop_top: Pixels to crop from top
         generate_derivatives: Whether to generate thumb/display/full versions
+            (ignored when variants is given)
+        variants: Variant names to render (default: CLEAN_VARIANTS)
     
     Returns:
-        Dict with data URLs for each derivative:
+        Dict with WebP bytes for each requested derivative, e.g.
         {
-            "orig": "data:...",      # Original (orientation corrected only)
-            "clean": "data:...",     # Cropped version
-            "full": "data:...",      # High-res clean
-            "display": "data:...",   # Medium-res for main view
-            "thumb": "data:..."      # Thumbnail
+            "orig": b"...",      # Original (orientation corrected only)
+            "clean": b"...",     # Cropped version
+            "full": b"...",      # High-res clean (alias of clean)
+            "display": b"...",   # Medium-res for main view
+            "thumb": b"..."      # Thumbnail
         }
     """
+    if variants is None:
+        variants = CLEAN_VARIANTS if generate_derivatives else ["orig", "clean"]
+    
     try:
         # Load image
         img = Image.open(BytesIO(content))
@@ -234,37 +376,8 @@ def process_image_for_clean_storage(
         # Step 2: Convert to RGB
         img = convert_to_rgb(img)
         
-        # Store original (orientation corrected)
-        orig_url = image_to_data_url(smart_resize(img, FULL_MAX_WIDTH, FULL_MAX_HEIGHT), IMAGE_QUALITY_FULL)
-        
-        # Step 3: Crop branding
-        cleaned = crop_branding(img, crop_bottom=crop_bottom, crop_top=crop_top)
-        
-        result = {
-            "orig": orig_url,
-            "clean": image_to_data_url(smart_resize(cleaned, FULL_MAX_WIDTH, FULL_MAX_HEIGHT), IMAGE_QUALITY_FULL),
-        }
-        
-        if generate_derivatives:
-            # Full resolution (clean)
-            result["full"] = image_to_data_url(
-                smart_resize(cleaned, FULL_MAX_WIDTH, FULL_MAX_HEIGHT), 
-                IMAGE_QUALITY_FULL
-            )
-            
-            # Display resolution
-            result["display"] = image_to_data_url(
-                smart_resize(cleaned, DISPLAY_MAX_WIDTH, DISPLAY_MAX_HEIGHT), 
-                IMAGE_QUALITY_DISPLAY
-            )
-            
-            # Thumbnail
-            result["thumb"] = image_to_data_url(
-                create_thumbnail(cleaned, THUMB_WIDTH, THUMB_HEIGHT),
-                IMAGE_QUALITY_THUMB
-            )
-        
-        return result
+        # Step 3: Crop branding and render each distinct derivative once
+        return render_variants(img, variants, crop_bottom, crop_top, ladder=generate_derivatives)
         
     except Exception as e:
         logger.error(f"Image processing error: {e}")
@@ -297,62 +410,99 @@ async def clean_vehicle_images(
     if not images:
         return {"vehicle_id": vehicle_id, "status": "no_images", "processed": 0}
     
-    processed = 0
-    skipped = 0
-    errors = []
-    updated_images = []
+    slots = asyncio.Semaphore(CLEAN_IMAGE_CONCURRENCY)
     
-    for img in images:
+    async def clean_one(img: dict) -> Tuple[str, dict, Optional[str]]:
+        """Returns (outcome, image, error) with outcome processed|skipped|error."""
+        # Check if already processed
+        if not force_reprocess and img.get("clean"):
+            return "skipped", img, None
+        
+        # Get source URL (source_url keeps the pre-cleaning original)
+        source_url = img.get("source_url") or img.get("url") or img.get("orig")
+        if not source_url:
+            return "skipped", img, None
+        
+        # Skip inline/stored images unless forced (already processed)
+        already_local = source_url.startswith("data:") or "/api/images/" in source_url
+        if already_local and not force_reprocess:
+            return "skipped", img, None
+        
         try:
-            # Check if already processed
-            if not force_reprocess and img.get("clean"):
-                updated_images.append(img)
-                skipped += 1
-                continue
-            
-            # Get source URL
-            source_url = img.get("url") or img.get("orig")
-            if not source_url:
-                updated_images.append(img)
-                skipped += 1
-                continue
-            
-            # Skip if already a data URL (already processed)
-            if source_url.startswith("data:") and not force_reprocess:
-                updated_images.append(img)
-                skipped += 1
-                continue
+            # A local source is deleted after cleaning, so keep the uncropped
+            # original as a variant; remote sources stay reprocessable as-is
+            variants = list(CLEAN_VARIANTS)
+            if already_local and "orig" not in variants:
+                variants.append("orig")
+            settings = f"v1:{crop_bottom}:{crop_top}:{LADDER_SETTINGS}:" + ",".join(
+                f"{name}={tuple(VARIANT_SPECS[name])}" for name in variants
+            )
             
-            # Download and process
-            logger.info(f"Processing image for vehicle {vehicle_id}: {source_url[:50]}...")
-            content = await download_image(source_url)
-            derivatives = process_image_for_clean_storage(content, crop_bottom, crop_top)
+            async with slots:
+                # Content address: remote files by URL + ETag (no download
+                # needed when already processed), everything else by bytes
+                content = None
+                validator = None if already_local else await fetch_validator(source_url)
+                if validator:
+                    digest = sha256_hex(f"{source_url}\n{validator}".encode("utf-8"))
+                else:
+                    content = await load_source_image(source_url)
+                    digest = sha256_hex(content)
+                
+                async def render():
+                    # Download (if not done yet) and process in the image pool
+                    logger.info(f"Processing image for vehicle {vehicle_id}: {source_url[:50]}...")
+                    source = content if content is not None else await load_source_image(source_url)
+                    return await run_in_image_pool(
+                        process_image_for_clean_storage, source, crop_bottom, crop_top, True, variants,
+                        queue_timeout=None,
+                    )
+                
+                blob_id = make_blob_id("clean", settings, digest)
+                blob, _ = await store_variants_deduped(blob_id, render)
+                urls = blob["urls"]
             
-            # Update image object
+            # Update image object (drop variant URLs from a previous run that
+            # weren't regenerated - their blobs are released below)
             updated_img = {
-                **img,
-                "orig": derivatives.get("orig", source_url),
-                "clean": derivatives["clean"],
-                "full": derivatives["full"],
-                "display": derivatives["display"],
-                "thumb": derivatives["thumb"],
-                "url": derivatives["display"],  # Update URL to use clean display
-                "thumbnail_url": derivatives["thumb"],
+                **{key: value for key, value in img.items() if key not in VARIANT_SPECS},
+                **{name: url for name, url in urls.items() if name in VARIANT_SPECS},
+                "sources": responsive_sources(urls),
+                "upload_id": img.get("upload_id") or str(uuid.uuid4()),
+                "blob_id": blob_id,
+                # Stored/inline sources are replaced below, so keep the uncropped original
+                "source_url": source_url if not already_local else urls["orig"],
+                "orig": urls.get("orig", source_url),
+                "url": urls["display"],  # Update URL to use clean display
+                "thumbnail_url": urls["thumb"],
             }
-            updated_images.append(updated_img)
-            processed += 1
+            return "processed", updated_img, None
             
         except Exception as e:
             logger.error(f"Error processing image: {e}")
-            errors.append(str(e)[:100])
-            updated_images.append(img)  # Keep original
+            return "error", img, str(e)[:100]  # Keep original
+    
+    # Images are processed concurrently; gather keeps the original order
+    results = await asyncio.gather(*(clean_one(img) for img in images))
+    
+    updated_images = [image for _, image, _ in results]
+    replaced_images = [original for original, (outcome, _, _) in zip(images, results) if outcome == "processed"]
+    processed = len(replaced_images)
+    skipped = sum(1 for outcome, _, _ in results if outcome == "skipped")
+    errors = [error for outcome, _, error in results if outcome == "error"]
     
     # Update vehicle document in database
     if processed > 0:
         await db["admin_vehicles"].update_one(
             {"_id": vehicle_doc["_id"]},
-            {"$set": {"images": updated_images}}
+            {"$set": {
+                "images": updated_images,
+                **compute_derived_fields({**vehicle_doc, "images": updated_images}),
+                "updated_at": datetime.now(timezone.utc),
+            }}
         )
+        # Old blobs (or blob references) are no longer used by this vehicle
+        await delete_image_blobs(replaced_images)
     
     return {
         "vehicle_id": vehicle_id,
@@ -368,7 +518,8 @@ async def run_batch_image_cleaning(
     crop_bottom: int = CROP_BOTTOM_PIXELS,
     crop_top: int = CROP_TOP_PIXELS,
     force_reprocess: bool = False,
-    limit: int = 100
+    limit: int = 100,
+    progress: Optional[Callable[[Dict], Awaitable[None]]] = None,
 ) -> Dict:
     """
     Run batch image cleaning on all vehicles.
@@ -379,6 +530,7 @@ async def run_batch_image_cleaning(
         crop_top: Pixels to crop from top
         force_reprocess: Reprocess all images
         limit: Max vehicles to process
+        progress: Optional async callback, called as each vehicle finishes
     
     Returns:
         Batch processing result
@@ -400,15 +552,28 @@ async def run_batch_image_cleaning(
     cursor = collection.find(query).limit(limit)
     vehicles = await cursor.to_list(length=limit)
     
+    slots = asyncio.Semaphore(CLEAN_VEHICLE_CONCURRENCY)
+    done = {"vehicles_done": 0, "vehicles_total": len(vehicles), "images_processed": 0}
+    
+    async def clean_one_vehicle(vehicle: dict) -> Dict:
+        async with slots:
+            result = await clean_vehicle_images(
+                vehicle, db, crop_bottom, crop_top, force_reprocess
+            )
+        done["vehicles_done"] += 1
+        done["images_processed"] += result["processed"]
+        if progress:
+            await progress(dict(done))
+        return result
+    
+    results = await asyncio.gather(*(clean_one_vehicle(vehicle) for vehicle in vehicles))
+    
     total_processed = 0
     total_skipped = 0
     total_errors = []
     vehicle_results = []
     
-    for vehicle in vehicles:
-        result = await clean_vehicle_images(
-            vehicle, db, crop_bottom, crop_top, force_reprocess
-        )
+    for result in results:
         total_processed += result["processed"]
         total_skipped += result["skipped"]
         total_errors.extend(result.get("errors", []))
@@ -0,0 +1,127 @@
+"""
+Image Processing Pipeline
+
+Pillow work (EXIF rotate, LANCZOS resize, WebP method=6) is CPU-bound and
+holds the GIL for hundreds of milliseconds per photo. Running it inline in
+an async route stalls every other request on the worker, so it runs in a
+bounded ProcessPoolExecutor instead and uploads use all cores.
+
+Back-pressure: at most IMAGE_QUEUE_LIMIT jobs may be running or queued at
+once. Callers beyond that wait up to IMAGE_QUEUE_TIMEOUT_SECONDS for a slot
+and then get ImagePipelineBusyError (routes map it to 503 + Retry-After).
+
+Configuration (backend/.env):
+- IMAGE_WORKERS=4             (0 = run in the default thread pool instead)
+- IMAGE_QUEUE_LIMIT=16        (running + queued jobs per app worker)
+- IMAGE_QUEUE_TIMEOUT_SECONDS=10
+
+Functions submitted to the pool must be top-level (picklable) and take and
+return plain bytes/dicts.
+"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_QUEUE_LIMIT = int(os.environ.get("IMAGE_QUEUE_LIMIT", str(max(1, IMAGE_WORKERS) * 4)))
+IMAGE_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("IMAGE_QUEUE_TIMEOUT_SECONDS", "10"))
+
+# Retry-After hint sent with 503 responses when the queue is full
+IMAGE_RETRY_AFTER_SECONDS = 5
+
+_executor: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+_in_flight = 0
+_rejected = 0
+_completed = 0
+
+
+class ImagePipelineBusyError(Exception):
+    """Raised when the image pipeline queue is full"""
+    pass
+
+
+def get_image_executor() -> Optional[ProcessPoolExecutor]:
+    """Lazily start the process pool (None = default thread pool)."""
+    global _executor
+    if IMAGE_WORKERS <= 0:
+        return None
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        logger.info(f"Image pipeline started with {IMAGE_WORKERS} worker processes")
+    return _executor
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(IMAGE_QUEUE_LIMIT)
+    return _slots
+
+
+async def run_in_image_pool(
+    func: Callable,
+    *args: Any,
+    queue_timeout: Optional[float] = IMAGE_QUEUE_TIMEOUT_SECONDS,
+) -> Any:
+    """
+    Run a CPU-bound image function in the pool.
+
+    Args:
+        func: Top-level (picklable) function
+        *args: Plain arguments for func
+        queue_timeout: Seconds to wait for a slot; None waits indefinitely
+            (background batch jobs, which should queue rather than fail)
+
+    Raises:
+        ImagePipelineBusyError: If no slot frees up within the queue timeout
+    """
+    global _executor, _in_flight, _rejected, _completed
+    slots = _get_slots()
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=queue_timeout)
+    except asyncio.TimeoutError:
+        _rejected += 1
+        raise ImagePipelineBusyError(
+            f"Image processing queue is full ({IMAGE_QUEUE_LIMIT} jobs). Please retry shortly."
+        )
+
+    _in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(get_image_executor(), func, *args)
+        _completed += 1
+        return result
+    except BrokenProcessPool:
+        # A worker died (OOM on a huge image, etc.) - start a fresh pool next time
+        logger.error("Image worker pool broke, restarting it")
+        _executor = None
+        raise
+    finally:
+        _in_flight -= 1
+        slots.release()
+
+
+def shutdown_image_pipeline() -> None:
+    """Stop worker processes (app shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        logger.info("Image pipeline stopped")
+
+
+def get_image_pipeline_stats() -> dict:
+    return {
+        "workers": IMAGE_WORKERS,
+        "queue_limit": IMAGE_QUEUE_LIMIT,
+        "queue_timeout_seconds": IMAGE_QUEUE_TIMEOUT_SECONDS,
+        "in_flight": _in_flight,
+        "completed": _completed,
+        "rejected": _rejected,
+    }
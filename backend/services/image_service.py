@@ -1,25 +1,52 @@
 """
 Vehicle Image Storage Service
 
-This module handles image uploads with persistence to MongoDB.
-Images are stored as Base64-encoded data URLs directly in the database,
-ensuring they persist across deploys/restarts.
+This module handles image uploads with persistence to the image store
+(see services/image_store.py). Processed bytes are stored once as binary
+blobs and vehicle documents only hold small /api/images/... references.
 
 Features:
 - EXIF orientation auto-correction (fixes sideways photos from phones)
 - High-quality resizing with proper aspect ratio preservation
 - WebP conversion for optimal file size without quality loss
+- Pillow work runs in the image process pool (services/image_pipeline.py)
+- Each upload is decoded once (with JPEG shrink-on-load) and every variant
+  is derived from that single in-memory image
+- Re-uploads of identical bytes reuse the stored variants (content-addressed
+  dedup in services/image_store.py) and are not decoded at all
+- Responsive width ladder (w320, w640, ...) for srcset. By default rungs are
+  rendered lazily on first request by /api/images/{upload_id}?w=... (see
+  services/derivative_cache.py); IMAGE_EAGER_LADDER=true renders them at
+  upload time instead, optionally with AVIF siblings
 
-For high-volume scenarios, this can be swapped to S3/R2 storage.
+Configuration (backend/.env):
+- IMAGE_WIDTHS=320,640,960,1280,1920
+- IMAGE_LADDER_QUALITY=82
+- IMAGE_EAGER_LADDER=false
+- IMAGE_AVIF_ENABLED=false  (AVIF encodes are several times slower than WebP)
+- IMAGE_AVIF_QUALITY=55
+
+Legacy documents may still contain Base64 data URLs; those keep working
+and can be moved to the store with POST /api/admin/migrate-images-to-store.
 """
+import asyncio
 import base64
+import re
 import uuid
 import logging
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from io import BytesIO
-from PIL import Image, ExifTags
+from PIL import Image, ExifTags, features
 import os
 
+from services.image_store import (
+    build_derivative_url,
+    make_blob_id,
+    sha256_hex,
+    store_variants_deduped,
+)
+from services.image_pipeline import run_in_image_pool
+
 logger = logging.getLogger(__name__)
 
 # Maximum image dimensions (resize larger images while preserving aspect ratio)
@@ -31,6 +58,38 @@ IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "92"))
 THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", "85"))
 ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
 ALLOWED_MIME_TYPES = {'image/jpeg', 'image/png', 'image/webp', 'image/gif'}
+EXIF_ORIENTATION_TAG = 0x0112
+
+# Responsive ladder
+IMAGE_WIDTHS = sorted({
+    int(width) for width in os.environ.get("IMAGE_WIDTHS", "320,640,960,1280,1920").split(",")
+    if width.strip().isdigit() and int(width) > 0
+})
+IMAGE_LADDER_QUALITY = int(os.environ.get("IMAGE_LADDER_QUALITY", "82"))
+IMAGE_EAGER_LADDER = os.environ.get("IMAGE_EAGER_LADDER", "false").lower() == "true"
+IMAGE_AVIF_ENABLED = os.environ.get("IMAGE_AVIF_ENABLED", "false").lower() == "true"
+IMAGE_AVIF_QUALITY = int(os.environ.get("IMAGE_AVIF_QUALITY", "55"))
+LADDER_VARIANT_REGEX = re.compile(r'^w(\d+)$')
+
+if IMAGE_AVIF_ENABLED and not features.check("avif"):
+    logger.warning("IMAGE_AVIF_ENABLED is set but this Pillow build has no AVIF support, serving WebP only")
+    IMAGE_AVIF_ENABLED = False
+
+# Part of the dedup keys: changing any ladder setting re-processes images
+LADDER_SETTINGS = (
+    f"{IMAGE_WIDTHS}:q{IMAGE_LADDER_QUALITY}:eager={IMAGE_EAGER_LADDER}:"
+    f"avif={IMAGE_AVIF_ENABLED}:q{IMAGE_AVIF_QUALITY}"
+)
+
+# Lazy derivative formats and quality bounds (?fmt=, ?q=)
+DERIVATIVE_FORMATS = {"webp": "image/webp", "avif": "image/avif"}
+DERIVATIVE_QUALITY_RANGE = (30, 95)
+
+# Part of the dedup key: changing any output setting re-processes uploads
+UPLOAD_RENDER_SETTINGS = (
+    f"v1:{MAX_WIDTH}x{MAX_HEIGHT}:q{IMAGE_QUALITY}:"
+    f"{THUMBNAIL_SIZE[0]}x{THUMBNAIL_SIZE[1]}:q{THUMBNAIL_QUALITY}:{LADDER_SETTINGS}"
+)
 
 
 class ImageValidationError(Exception):
@@ -167,9 +226,9 @@ def convert_to_rgb(img: Image.Image) -> Image.Image:
     return img.convert('RGB')
 
 
-def validate_image_file(filename: str, content: bytes, content_type: Optional[str] = None) -> None:
+def validate_upload_metadata(filename: str, size_bytes: int, content_type: Optional[str] = None) -> None:
     """
-    Validate an uploaded image file.
+    Validate extension, size and content type without decoding the image.
     
     Raises:
         ImageValidationError: If validation fails
@@ -182,7 +241,7 @@ def validate_image_file(filename: str, content: bytes, content_type: Optional[st
         )
     
     # Check file size
-    size_mb = len(content) / (1024 * 1024)
+    size_mb = size_bytes / (1024 * 1024)
     if size_mb > MAX_FILE_SIZE_MB:
         raise ImageValidationError(
             f"File too large ({size_mb:.1f}MB). Maximum: {MAX_FILE_SIZE_MB}MB"
@@ -193,6 +252,16 @@ def validate_image_file(filename: str, content: bytes, content_type: Optional[st
         raise ImageValidationError(
             f"Invalid content type '{content_type}'. Allowed: {', '.join(ALLOWED_MIME_TYPES)}"
         )
+
+
+def validate_image_file(filename: str, content: bytes, content_type: Optional[str] = None) -> None:
+    """
+    Validate an uploaded image file.
+    
+    Raises:
+        ImageValidationError: If validation fails
+    """
+    validate_upload_metadata(filename, len(content), content_type)
     
     # Try to open as image to verify it's valid
     try:
@@ -310,22 +379,31 @@ class VehicleImage:
         thumbnail_url: Optional[str] = None,
         original_filename: Optional[str] = None,
         upload_id: Optional[str] = None,
+        blob_id: Optional[str] = None,
+        sources: Optional[List[dict]] = None,
     ):
         self.url = url
         self.is_primary = is_primary
         self.thumbnail_url = thumbnail_url
         self.original_filename = original_filename
         self.upload_id = upload_id or str(uuid.uuid4())
+        self.blob_id = blob_id
+        self.sources = sources
     
     def to_dict(self) -> dict:
         """Convert to dictionary for MongoDB storage."""
-        return {
+        data = {
             "url": self.url,
             "is_primary": self.is_primary,
             "thumbnail_url": self.thumbnail_url,
             "original_filename": self.original_filename,
             "upload_id": self.upload_id,
         }
+        if self.blob_id:
+            data["blob_id"] = self.blob_id
+        if self.sources:
+            data["sources"] = self.sources
+        return data
     
     @classmethod
     def from_dict(cls, data: dict) -> 'VehicleImage':
@@ -336,9 +414,219 @@ class VehicleImage:
             thumbnail_url=data.get("thumbnail_url"),
             original_filename=data.get("original_filename"),
             upload_id=data.get("upload_id"),
+            blob_id=data.get("blob_id"),
+            sources=data.get("sources"),
         )
 
 
+def _exif_orientation(img: Image.Image) -> int:
+    try:
+        return int(img.getexif().get(EXIF_ORIENTATION_TAG, 1))
+    except Exception:
+        return 1
+
+
+def decode_upload(content: bytes, max_width: int = MAX_WIDTH, max_height: int = MAX_HEIGHT) -> Image.Image:
+    """
+    Decode an upload exactly once: open, shrink-on-load, orient, convert.
+    
+    For JPEGs, Image.draft() lets libjpeg decode at 1/2, 1/4 or 1/8 scale
+    when the target is much smaller than the source, which skips most of
+    the IDCT work and the full-size pixel buffer. draft() never goes below
+    the requested size, so the final LANCZOS resize quality is unchanged.
+    
+    Decoding doubles as validation (replaces the separate verify() pass).
+    
+    Returns:
+        RGB PIL Image, correctly oriented, not yet resized
+        
+    Raises:
+        ImageValidationError: If the bytes are not a decodable image
+    """
+    try:
+        img = Image.open(BytesIO(content))
+        
+        if img.format == "JPEG":
+            # Box is in displayed orientation; EXIF 5-8 means the stored
+            # pixels are rotated 90 degrees, so compare against swapped axes
+            width, height = img.size
+            if _exif_orientation(img) in (5, 6, 7, 8):
+                shown_width, shown_height = height, width
+            else:
+                shown_width, shown_height = width, height
+            ratio = min(max_width / shown_width, max_height / shown_height)
+            if ratio < 0.5:
+                img.draft("RGB", (max(1, int(width * ratio)), max(1, int(height * ratio))))
+        
+        img.load()
+    except ImageValidationError:
+        raise
+    except Exception as e:
+        raise ImageValidationError(f"Invalid or corrupted image file: {str(e)}")
+    
+    img = correct_image_orientation(img)
+    return convert_to_rgb(img)
+
+
+def encode_webp(img: Image.Image, quality: int) -> bytes:
+    output = BytesIO()
+    img.save(output, format='WEBP', quality=quality, method=6, optimize=True)
+    return output.getvalue()
+
+
+def encode_avif(img: Image.Image, quality: int = IMAGE_AVIF_QUALITY) -> bytes:
+    output = BytesIO()
+    img.save(output, format='AVIF', quality=quality)
+    return output.getvalue()
+
+
+def render_width_ladder(img: Image.Image, top_name: str, top_bytes: bytes) -> Dict[str, bytes]:
+    """
+    Responsive variants for srcset.
+    
+    A rung at img's own width that aliases top_bytes (stored once, served
+    under top_name's URL) so the largest candidate costs no extra encode.
+    With IMAGE_EAGER_LADDER, also one WebP "w{width}" per configured width
+    narrower than img and, with AVIF enabled, "<name>.avif" siblings;
+    otherwise the narrower rungs are rendered lazily on request.
+    
+    Args:
+        img: Largest rendered frame (e.g. the resized full image)
+        top_name: Variant name already holding img's encoded bytes
+        top_bytes: Those bytes
+    
+    Returns:
+        Dict of variant name -> encoded bytes
+    """
+    variants = {}
+    for width in IMAGE_WIDTHS:
+        if width >= img.width or not IMAGE_EAGER_LADDER:
+            break
+        height = max(1, round(img.height * width / img.width))
+        frame = img.resize((width, height), Image.Resampling.LANCZOS)
+        variants[f"w{width}"] = encode_webp(frame, IMAGE_LADDER_QUALITY)
+        if IMAGE_AVIF_ENABLED:
+            variants[f"w{width}.avif"] = encode_avif(frame)
+    
+    variants[f"w{img.width}"] = top_bytes
+    if IMAGE_AVIF_ENABLED and IMAGE_EAGER_LADDER:
+        variants[f"{top_name}.avif"] = encode_avif(img)
+    return variants
+
+
+def responsive_sources(urls: Dict[str, str]) -> List[dict]:
+    """
+    srcset candidates from stored variant URLs.
+    
+    Stored rungs are used as-is; configured widths below the largest rung
+    that were not rendered eagerly point at the lazy derivative endpoint.
+    
+    Returns:
+        [{"width": 320, "url": "/api/images/...?w=320"}, ...] sorted by width
+    """
+    rungs = {}
+    for name, url in urls.items():
+        match = LADDER_VARIANT_REGEX.match(name)
+        if match:
+            rungs.setdefault(int(match.group(1)), url)
+    if not rungs:
+        return []
+    
+    top_width = max(rungs)
+    upload_id = rungs[top_width].split("/api/images/", 1)[-1].split("/", 1)[0]
+    for width in IMAGE_WIDTHS:
+        if width < top_width and width not in rungs:
+            rungs[width] = build_derivative_url(upload_id, width)
+    
+    return [{"width": width, "url": rungs[width]} for width in sorted(rungs)]
+
+
+def snap_width(requested: Optional[int]) -> int:
+    """Smallest ladder width >= requested (the largest one if none), so
+    arbitrary ?w= values can't fill the derivative cache."""
+    if not requested:
+        return IMAGE_WIDTHS[-1]
+    for width in IMAGE_WIDTHS:
+        if width >= requested:
+            return width
+    return IMAGE_WIDTHS[-1]
+
+
+def snap_quality(requested: Optional[int], fmt: str) -> int:
+    """Clamp ?q= to DERIVATIVE_QUALITY_RANGE in steps of 5."""
+    if not requested:
+        return IMAGE_AVIF_QUALITY if fmt == "avif" else IMAGE_LADDER_QUALITY
+    low, high = DERIVATIVE_QUALITY_RANGE
+    return min(high, max(low, int(round(requested / 5.0)) * 5))
+
+
+def render_derivative(content: bytes, width: int, fmt: str, quality: int) -> bytes:
+    """
+    Render one lazy derivative from stored source bytes.
+    
+    Runs inside the image process pool. Never upscales: sources narrower
+    than width are only re-encoded.
+    """
+    img = convert_to_rgb(Image.open(BytesIO(content)))
+    if img.width > width:
+        height = max(1, round(img.height * width / img.width))
+        img = img.resize((width, height), Image.Resampling.LANCZOS)
+    if fmt == "avif":
+        return encode_avif(img, quality)
+    return encode_webp(img, quality)
+
+
+def format_srcset(sources: Optional[List[dict]]) -> Optional[str]:
+    """Render sources as an HTML srcset attribute value."""
+    if not sources:
+        return None
+    return ", ".join(f"{source['url']} {source['width']}w" for source in sources)
+
+
+def render_upload_variants(
+    filename: str,
+    content: bytes,
+    content_type: Optional[str] = None,
+    create_thumb: bool = True,
+) -> Dict[str, bytes]:
+    """
+    Validate an upload and render its stored variants from one decode.
+    
+    Runs inside the image process pool, so it must stay a top-level
+    function that takes and returns plain values.
+    
+    Returns:
+        Dict of variant name -> encoded bytes ("full", the width ladder and
+        optionally "thumb")
+    """
+    validate_upload_metadata(filename, len(content), content_type)
+    
+    img = decode_upload(content)
+    full = smart_resize(img, MAX_WIDTH, MAX_HEIGHT)
+    variants = {"full": encode_webp(full, IMAGE_QUALITY)}
+    variants.update(render_width_ladder(full, "full", variants["full"]))
+    
+    if create_thumb:
+        # Downscale from the already-resized full image, not the original
+        thumb = full.copy()
+        thumb.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        variants["thumb"] = encode_webp(thumb, THUMBNAIL_QUALITY)
+    
+    return variants
+
+
+def render_upload_file(
+    filename: str,
+    path: str,
+    content_type: Optional[str] = None,
+    create_thumb: bool = True,
+) -> Dict[str, bytes]:
+    """render_upload_variants for a spooled upload, read inside the worker."""
+    with open(path, "rb") as f:
+        content = f.read()
+    return render_upload_variants(filename, content, content_type, create_thumb)
+
+
 async def process_and_store_image(
     content: bytes,
     filename: str,
@@ -358,27 +646,78 @@ async def process_and_store_image(
         
     Returns:
         VehicleImage object ready for storage
+        
+    Raises:
+        ImageValidationError: If the file is not an acceptable image
+        ImagePipelineBusyError: If the image pool queue is full
     """
-    # Validate
-    validate_image_file(filename, content, content_type)
+    validate_upload_metadata(filename, len(content), content_type)
     
-    # Process (resize, convert to WebP)
-    processed_content, mime_type = process_image(content)
+    # Identical bytes already processed with the same settings are reused as-is
+    digest = await asyncio.to_thread(sha256_hex, content)
     
-    # Create data URL
-    url = encode_image_to_data_url(processed_content, mime_type)
+    async def render():
+        # Validate, resize and convert to WebP off the event loop
+        return await run_in_image_pool(
+            render_upload_variants, filename, content, content_type, create_thumb
+        )
     
-    # Create thumbnail if requested
-    thumbnail_url = None
-    if create_thumb:
-        thumb_content = create_thumbnail(content)
-        thumbnail_url = encode_image_to_data_url(thumb_content, mime_type)
+    return await _store_upload(render, filename, digest, is_primary, create_thumb)
+
+
+async def process_and_store_image_file(
+    path: str,
+    filename: str,
+    size_bytes: int,
+    digest: str,
+    content_type: Optional[str] = None,
+    is_primary: bool = False,
+    create_thumb: bool = True,
+) -> VehicleImage:
+    """
+    process_and_store_image for an upload spooled to disk.
+    
+    The pool worker reads the file itself, so the original bytes are never
+    held (or pickled) by the app process.
+    
+    Args:
+        path: Spooled upload file
+        filename: Original filename
+        size_bytes: File size
+        digest: sha256 hex of the file (computed while spooling)
+        content_type: MIME type
+        is_primary: Whether this is the primary image
+        create_thumb: Whether to create a thumbnail
     
+    Raises:
+        ImageValidationError: If the file is not an acceptable image
+        ImagePipelineBusyError: If the image pool queue is full
+    """
+    validate_upload_metadata(filename, size_bytes, content_type)
+    
+    async def render():
+        return await run_in_image_pool(
+            render_upload_file, filename, path, content_type, create_thumb
+        )
+    
+    return await _store_upload(render, filename, digest, is_primary, create_thumb)
+
+
+async def _store_upload(render, filename: str, digest: str, is_primary: bool, create_thumb: bool) -> VehicleImage:
+    blob_id = make_blob_id("upload", f"{UPLOAD_RENDER_SETTINGS}:thumb={create_thumb}", digest)
+    blob, reused = await store_variants_deduped(blob_id, render, "image/webp")
+    if reused:
+        logger.info(f"Reused stored variants for {filename} ({blob_id[-12:]})")
+    
+    # Each entry gets its own upload_id; stored bytes are shared via blob_id
+    urls = blob["urls"]
     return VehicleImage(
-        url=url,
+        url=urls["full"],
         is_primary=is_primary,
-        thumbnail_url=thumbnail_url,
+        thumbnail_url=urls.get("thumb"),
         original_filename=filename,
+        blob_id=blob_id,
+        sources=responsive_sources(urls),
     )
 
 
@@ -0,0 +1,534 @@
+"""
+Vehicle Image Blob Store
+
+Stores processed vehicle images as raw bytes outside the vehicle documents.
+Vehicle documents only keep small references (URLs under /api/images),
+so inventory queries no longer pull megabytes of Base64 over the wire.
+
+Backends:
+- GridFS (default): images live in the same MongoDB as the inventory,
+  so they persist across deploys/restarts without extra infrastructure.
+- Local filesystem: stand-in for development or single-node installs.
+
+Each blob is addressed by "{upload_id}/{variant}" (e.g. "abc123/full").
+Blobs are immutable once written; re-processing writes a new upload_id.
+
+Content-addressed dedup: processed uploads are indexed in the image_blobs
+collection under a blob_id derived from the source content (SHA-256 of the
+bytes, or URL + ETag for remote images) and the processing settings.
+Re-uploading the same photo, or cleaning the same dealer URL again, reuses
+the stored variants without decoding anything. Image entries then carry a
+blob_id and the index keeps a refcount; deleting the last referencing
+entry frees the blobs.
+
+Configuration (backend/.env):
+- IMAGE_STORE_BACKEND=gridfs|local
+- IMAGE_STORE_PATH=/app/data/images  (local backend only)
+- IMAGE_PUBLIC_BASE_URL=             (optional absolute prefix for image URLs)
+- IMAGE_DEDUP_ENABLED=true
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+IMAGE_STORE_BACKEND = os.environ.get("IMAGE_STORE_BACKEND", "gridfs").lower()
+IMAGE_STORE_PATH = os.environ.get(
+    "IMAGE_STORE_PATH",
+    str(Path(__file__).parent.parent / "data" / "images")
+)
+IMAGE_STORE_BUCKET = os.environ.get("IMAGE_STORE_BUCKET", "vehicle_images")
+IMAGE_PUBLIC_BASE_URL = os.environ.get("IMAGE_PUBLIC_BASE_URL", "").rstrip("/")
+IMAGE_DEDUP_ENABLED = os.environ.get("IMAGE_DEDUP_ENABLED", "true").lower() == "true"
+BLOB_INDEX_COLLECTION = "image_blobs"
+
+# Keys are "{upload_id}/{variant}" - keep them filesystem and URL safe
+_KEY_PART_REGEX = re.compile(r'^[A-Za-z0-9_.-]{1,128}$')
+
+
+class ImageStoreError(Exception):
+    """Raised when the image store cannot read or write a blob"""
+    pass
+
+
+class StoredBlob:
+    """Metadata for a stored image blob."""
+
+    def __init__(
+        self,
+        key: str,
+        length: int,
+        content_type: str,
+        etag: str,
+        uploaded_at: Optional[datetime] = None,
+    ):
+        self.key = key
+        self.length = length
+        self.content_type = content_type
+        self.etag = etag
+        self.uploaded_at = uploaded_at or datetime.now(timezone.utc)
+
+
+def make_blob_key(upload_id: str, variant: str) -> str:
+    """Build and validate a blob key from an upload_id and variant name."""
+    if not _KEY_PART_REGEX.match(upload_id or "") or not _KEY_PART_REGEX.match(variant or ""):
+        raise ImageStoreError(f"Invalid image key: {upload_id}/{variant}")
+    if upload_id.startswith(".") or variant.startswith("."):
+        raise ImageStoreError(f"Invalid image key: {upload_id}/{variant}")
+    return f"{upload_id}/{variant}"
+
+
+def build_image_url(upload_id: str, variant: str) -> str:
+    """Public URL under which a stored variant is served."""
+    return f"{IMAGE_PUBLIC_BASE_URL}/api/images/{upload_id}/{variant}"
+
+
+def build_derivative_url(upload_id: str, width: int) -> str:
+    """Public URL of a lazily rendered width derivative (format negotiated)."""
+    return f"{IMAGE_PUBLIC_BASE_URL}/api/images/{upload_id}?w={width}"
+
+
+def compute_etag(content: bytes) -> str:
+    """Strong ETag for immutable blob content."""
+    return hashlib.sha256(content).hexdigest()[:32]
+
+
+class ImageStore:
+    """Interface implemented by all image store backends."""
+
+    name = "base"
+
+    async def put(self, upload_id: str, variant: str, content: bytes, content_type: str) -> StoredBlob:
+        raise NotImplementedError
+
+    async def stat(self, upload_id: str, variant: str) -> Optional[StoredBlob]:
+        raise NotImplementedError
+
+    async def read(self, upload_id: str, variant: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        raise NotImplementedError
+
+    async def delete_upload(self, upload_id: str) -> int:
+        """Delete every variant stored for an upload_id. Returns blobs removed."""
+        raise NotImplementedError
+
+
+class GridFSImageStore(ImageStore):
+    """Stores blobs in a MongoDB GridFS bucket."""
+
+    name = "gridfs"
+
+    def __init__(self, db, bucket_name: str = IMAGE_STORE_BUCKET):
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+        self.db = db
+        self.bucket_name = bucket_name
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f"{bucket_name}.files"]
+
+    def _to_blob(self, doc: dict) -> StoredBlob:
+        metadata = doc.get("metadata") or {}
+        return StoredBlob(
+            key=doc["filename"],
+            length=doc.get("length", 0),
+            content_type=metadata.get("content_type", "application/octet-stream"),
+            etag=metadata.get("etag", str(doc["_id"])),
+            uploaded_at=doc.get("uploadDate"),
+        )
+
+    async def put(self, upload_id: str, variant: str, content: bytes, content_type: str) -> StoredBlob:
+        key = make_blob_key(upload_id, variant)
+        etag = compute_etag(content)
+
+        # Blobs are immutable - replace any previous version of this key
+        async for old in self.files.find({"filename": key}, {"_id": 1}):
+            await self.bucket.delete(old["_id"])
+
+        await self.bucket.upload_from_stream(
+            key,
+            content,
+            metadata={
+                "upload_id": upload_id,
+                "variant": variant,
+                "content_type": content_type,
+                "etag": etag,
+            },
+        )
+        return StoredBlob(key=key, length=len(content), content_type=content_type, etag=etag)
+
+    async def stat(self, upload_id: str, variant: str) -> Optional[StoredBlob]:
+        key = make_blob_key(upload_id, variant)
+        doc = await self.files.find_one({"filename": key}, sort=[("uploadDate", -1)])
+        return self._to_blob(doc) if doc else None
+
+    async def read(self, upload_id: str, variant: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        key = make_blob_key(upload_id, variant)
+        try:
+            grid_out = await self.bucket.open_download_stream_by_name(key)
+        except Exception as e:
+            raise ImageStoreError(f"Image not found: {key}") from e
+        if start:
+            grid_out.seek(start)
+        return await grid_out.read(-1 if length is None else length)
+
+    async def delete_upload(self, upload_id: str) -> int:
+        removed = 0
+        async for doc in self.files.find({"metadata.upload_id": upload_id}, {"_id": 1}):
+            await self.bucket.delete(doc["_id"])
+            removed += 1
+        return removed
+
+
+class LocalImageStore(ImageStore):
+    """
+    Stores blobs on the local filesystem.
+
+    Layout: {root}/{upload_id}/{variant} with a {variant}.json sidecar
+    holding content type and ETag.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str = IMAGE_STORE_PATH):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, upload_id: str, variant: str):
+        make_blob_key(upload_id, variant)
+        base = self.root / upload_id
+        return base / variant, base / f"{variant}.json"
+
+    def _put_sync(self, upload_id: str, variant: str, content: bytes, content_type: str) -> StoredBlob:
+        data_path, meta_path = self._paths(upload_id, variant)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        etag = compute_etag(content)
+
+        # Write to a temp file first so readers never see partial blobs
+        tmp_path = data_path.with_name(f"{variant}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, data_path)
+        meta_path.write_text(json.dumps({"content_type": content_type, "etag": etag}))
+
+        return StoredBlob(
+            key=make_blob_key(upload_id, variant),
+            length=len(content),
+            content_type=content_type,
+            etag=etag,
+        )
+
+    def _stat_sync(self, upload_id: str, variant: str) -> Optional[StoredBlob]:
+        data_path, meta_path = self._paths(upload_id, variant)
+        if not data_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            meta = {}
+        stat = data_path.stat()
+        return StoredBlob(
+            key=make_blob_key(upload_id, variant),
+            length=stat.st_size,
+            content_type=meta.get("content_type", "application/octet-stream"),
+            etag=meta.get("etag") or f"{int(stat.st_mtime)}-{stat.st_size}",
+            uploaded_at=datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        )
+
+    def _read_sync(self, upload_id: str, variant: str, start: int, length: Optional[int]) -> bytes:
+        data_path, _ = self._paths(upload_id, variant)
+        try:
+            with data_path.open("rb") as f:
+                f.seek(start)
+                return f.read() if length is None else f.read(length)
+        except OSError as e:
+            raise ImageStoreError(f"Image not found: {upload_id}/{variant}") from e
+
+    def _delete_upload_sync(self, upload_id: str) -> int:
+        make_blob_key(upload_id, "x")
+        base = self.root / upload_id
+        if not base.exists():
+            return 0
+        removed = len([p for p in base.iterdir() if not p.name.endswith(".json")])
+        shutil.rmtree(base, ignore_errors=True)
+        return removed
+
+    # File I/O runs in worker threads so a slow disk never blocks the event loop
+
+    async def put(self, upload_id: str, variant: str, content: bytes, content_type: str) -> StoredBlob:
+        return await asyncio.to_thread(self._put_sync, upload_id, variant, content, content_type)
+
+    async def stat(self, upload_id: str, variant: str) -> Optional[StoredBlob]:
+        return await asyncio.to_thread(self._stat_sync, upload_id, variant)
+
+    async def read(self, upload_id: str, variant: str, start: int = 0, length: Optional[int] = None) -> bytes:
+        return await asyncio.to_thread(self._read_sync, upload_id, variant, start, length)
+
+    async def delete_upload(self, upload_id: str) -> int:
+        return await asyncio.to_thread(self._delete_upload_sync, upload_id)
+
+
+# Active store and dedup index - will be set in server.py
+_image_store: Optional[ImageStore] = None
+_blob_index = None
+
+# blob_id -> event set when an in-process render of it finishes (single-flight)
+_pending_renders: Dict[str, asyncio.Event] = {}
+
+
+def init_image_store(db, backend: str = IMAGE_STORE_BACKEND) -> ImageStore:
+    """Create the configured image store. Called once on app startup."""
+    global _image_store, _blob_index
+    _blob_index = db[BLOB_INDEX_COLLECTION] if db is not None and IMAGE_DEDUP_ENABLED else None
+    if backend == "local":
+        _image_store = LocalImageStore()
+    elif backend == "gridfs":
+        _image_store = GridFSImageStore(db)
+    else:
+        raise ImageStoreError(f"Unknown IMAGE_STORE_BACKEND '{backend}'. Use 'gridfs' or 'local'.")
+    logger.info(f"Image store initialized: {_image_store.name}")
+    return _image_store
+
+
+def get_image_store() -> ImageStore:
+    if _image_store is None:
+        raise ImageStoreError("Image store not initialized")
+    return _image_store
+
+
+async def store_variants(upload_id: str, variants: Dict[str, bytes], content_type: str = "image/webp") -> Dict[str, str]:
+    """
+    Store several variants for one upload.
+
+    Variants with identical bytes (aliases such as clean/full) are stored
+    once and share the first variant's URL. "*.avif" variants are stored
+    as image/avif regardless of content_type.
+
+    Returns:
+        Dict mapping variant name -> public URL
+    """
+    store = get_image_store()
+    urls = {}
+    stored: Dict[bytes, str] = {}
+    for variant, content in variants.items():
+        if content not in stored:
+            variant_type = "image/avif" if variant.endswith(".avif") else content_type
+            await store.put(upload_id, variant, content, variant_type)
+            stored[content] = build_image_url(upload_id, variant)
+        urls[variant] = stored[content]
+    return urls
+
+
+def make_blob_id(kind: str, settings: str, source_digest: str) -> str:
+    """
+    Content address for a processed image.
+
+    Args:
+        kind: Processing pipeline ("upload", "clean")
+        settings: Anything that changes the output (sizes, qualities, crop)
+        source_digest: SHA-256 hex of the source bytes (or of URL + ETag)
+    """
+    settings_digest = hashlib.sha256(settings.encode("utf-8")).hexdigest()[:12]
+    return f"{kind}-{settings_digest}-{source_digest}"
+
+
+def sha256_hex(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+async def acquire_blob(blob_id: str) -> Optional[dict]:
+    """Take a reference on an indexed blob. Returns its index doc, or None on miss."""
+    if _blob_index is None:
+        return None
+    return await _blob_index.find_one_and_update(
+        {"_id": blob_id},
+        {"$inc": {"refcount": 1}, "$set": {"last_used_at": datetime.now(timezone.utc)}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def register_blob(blob_id: str, upload_id: str, urls: Dict[str, str]) -> dict:
+    """
+    Index freshly stored variants with one reference.
+
+    If a concurrent request indexed the same content first, take a reference
+    on that one and drop our duplicate blobs.
+    """
+    now = datetime.now(timezone.utc)
+    doc = {
+        "_id": blob_id,
+        "upload_id": upload_id,
+        "urls": urls,
+        "refcount": 1,
+        "created_at": now,
+        "last_used_at": now,
+    }
+    if _blob_index is None:
+        return doc
+    try:
+        await _blob_index.insert_one(doc)
+        return doc
+    except DuplicateKeyError:
+        existing = await acquire_blob(blob_id)
+        if not existing:
+            # Released in between - ours becomes the indexed copy
+            return await register_blob(blob_id, upload_id, urls)
+        await get_image_store().delete_upload(upload_id)
+        return existing
+
+
+async def store_variants_deduped(
+    blob_id: str,
+    render: Callable[[], Awaitable[Dict[str, bytes]]],
+    content_type: str = "image/webp",
+) -> Tuple[dict, bool]:
+    """
+    Return indexed variants for blob_id, rendering and storing them on a miss.
+
+    Concurrent misses for the same blob_id in this process wait for the first
+    render instead of repeating it (e.g. one dealer photo on many vehicles).
+
+    Args:
+        blob_id: Content address (see make_blob_id)
+        render: Coroutine factory producing variant name -> bytes
+        content_type: MIME type of the rendered variants
+
+    Returns:
+        (index doc with "upload_id" and "urls", reused)
+    """
+    existing = await acquire_blob(blob_id)
+    if existing:
+        return existing, True
+
+    pending = _pending_renders.get(blob_id)
+    if pending is not None and _blob_index is not None:
+        await pending.wait()
+        existing = await acquire_blob(blob_id)
+        if existing:
+            return existing, True
+
+    done = _pending_renders.setdefault(blob_id, asyncio.Event())
+    try:
+        variants = await render()
+        upload_id = str(uuid.uuid4())
+        urls = await store_variants(upload_id, variants, content_type)
+        return await register_blob(blob_id, upload_id, urls), False
+    finally:
+        if _pending_renders.get(blob_id) is done:
+            del _pending_renders[blob_id]
+        done.set()
+
+
+async def release_blob(blob_id: str) -> int:
+    """Drop one reference; frees the stored variants when none are left."""
+    if _blob_index is None:
+        return 0
+    doc = await _blob_index.find_one_and_update(
+        {"_id": blob_id},
+        {"$inc": {"refcount": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not doc or doc.get("refcount", 0) > 0:
+        return 0
+    # Only the caller that removes the index entry deletes the blobs
+    result = await _blob_index.delete_one({"_id": blob_id, "refcount": {"$lte": 0}})
+    if not result.deleted_count:
+        return 0
+    return await get_image_store().delete_upload(doc["upload_id"])
+
+
+def extract_upload_ids(images: List[dict]) -> List[str]:
+    """
+    Return the upload_ids of images whose blobs live in the image store
+    and belong to that image alone (deduped images are released by blob_id).
+    """
+    upload_ids = []
+    for img in images or []:
+        if not isinstance(img, dict) or img.get("blob_id"):
+            continue
+        url = img.get("url") or ""
+        if img.get("upload_id") and "/api/images/" in url:
+            upload_ids.append(img["upload_id"])
+    return upload_ids
+
+
+def is_stored_image(img) -> bool:
+    """
+    True for image entries whose bytes live in the image store (uploaded,
+    cleaned or migrated). Remote dealer URLs can carry an upload_id too
+    (migrate_legacy_photo_urls assigns one), so that alone doesn't count.
+    """
+    if not isinstance(img, dict):
+        return False
+    return bool(img.get("blob_id")) or bool(img.get("upload_id") and "/api/images/" in (img.get("url") or ""))
+
+
+def has_stored_images(images: List[dict]) -> bool:
+    return any(is_stored_image(img) for img in images or [])
+
+
+async def release_replaced_images(old_images: List[dict], new_images: List[dict]) -> int:
+    """
+    Free the stored blobs of entries a rewrite of images[] dropped.
+
+    Call after $set-ing new_images over old_images. Blob references are
+    counted, so a photo kept once out of two copies still drops one reference.
+    """
+    kept_blobs = Counter(img["blob_id"] for img in new_images or [] if isinstance(img, dict) and img.get("blob_id"))
+    kept_uploads = {img.get("upload_id") for img in new_images or [] if isinstance(img, dict)}
+    dropped = []
+    for img in old_images or []:
+        if not is_stored_image(img):
+            continue
+        blob_id = img.get("blob_id")
+        if blob_id and kept_blobs[blob_id] > 0:
+            kept_blobs[blob_id] -= 1
+        elif not blob_id and img.get("upload_id") in kept_uploads:
+            continue
+        else:
+            dropped.append(img)
+    return await delete_image_blobs(dropped)
+
+
+async def delete_image_blobs(images: List[dict]) -> int:
+    """Best-effort removal of stored blobs for removed images."""
+    if _image_store is None:
+        return 0
+    removed = 0
+    for img in images or []:
+        if isinstance(img, dict) and img.get("blob_id"):
+            try:
+                removed += await release_blob(img["blob_id"])
+            except Exception as e:
+                logger.warning(f"Failed to release image blob {img['blob_id']}: {e}")
+    for upload_id in extract_upload_ids(images):
+        try:
+            removed += await _image_store.delete_upload(upload_id)
+        except Exception as e:
+            logger.warning(f"Failed to delete image blobs for {upload_id}: {e}")
+    return removed
+
+
+async def get_blob_index_stats() -> dict:
+    """Indexed blobs, total references and how many uploads dedup saved."""
+    if _blob_index is None:
+        return {"enabled": False}
+    pipeline = [{"$group": {"_id": None, "blobs": {"$sum": 1}, "references": {"$sum": "$refcount"}}}]
+    rows = await _blob_index.aggregate(pipeline).to_list(1)
+    blobs = rows[0]["blobs"] if rows else 0
+    references = rows[0]["references"] if rows else 0
+    return {
+        "enabled": True,
+        "blobs": blobs,
+        "references": references,
+        "deduplicated_references": max(0, references - blobs),
+    }
@@ -0,0 +1,180 @@
+"""
+MongoDB Index Management
+
+Declarative registry of the indexes backing the hot query paths.
+The registry is applied idempotently on app startup (see startup_event
+in server.py) and compared against the live indexes by
+GET /api/admin/indexes to spot missing (slow scans) or extra indexes.
+
+Hot paths covered:
+- admin_vehicles: SRP facets + sort, VDP lookup (stock_number + is_active),
+  CSV import/sync upserts (vin), homepage featured list, inventory
+  version (updated_at)
+- leads: admin list and export filters (status, lead_type, assigned_to)
+  sorted by created_at
+- jobs: worker claim order, admin job list, one active job per type,
+  TTL expiry of finished jobs
+- outbox: per-channel worker claim order, digest grouping, TTL expiry of
+  delivered messages
+"""
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Unique indexes only cover real string values so legacy docs with
+# missing/null identifiers don't block index creation
+_STRING_VIN = {"vin": {"$type": "string"}}
+_STRING_STOCK_NUMBER = {"stock_number": {"$type": "string"}}
+
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "admin_vehicles": [
+        # Identity: CSV import and sync upsert by VIN; VDP by stock number
+        IndexModel([("vin", ASCENDING)], name="vin_unique",
+                   unique=True, partialFilterExpression=_STRING_VIN),
+        IndexModel([("stock_number", ASCENDING)], name="stock_number_unique",
+                   unique=True, partialFilterExpression=_STRING_STOCK_NUMBER),
+        IndexModel([("stock_number", ASCENDING), ("is_active", ASCENDING)],
+                   name="stock_number_active"),
+        # SRP facet filters are exact matches on *_norm fields
+        IndexModel([("is_active", ASCENDING), ("make_norm", ASCENDING),
+                    ("model_norm", ASCENDING), ("price", ASCENDING)],
+                   name="active_make_model_price"),
+        IndexModel([("is_active", ASCENDING), ("body_style_norm", ASCENDING), ("price", ASCENDING)],
+                   name="active_body_style_price"),
+        IndexModel([("is_active", ASCENDING), ("condition_norm", ASCENDING), ("price", ASCENDING)],
+                   name="active_condition_price"),
+        # Default SRP order / keyset pagination
+        IndexModel([("is_active", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="active_created_at"),
+        # Inventory version (newest write) behind the public ETags
+        IndexModel([("updated_at", DESCENDING)], name="updated_at"),
+        # Homepage featured vehicles
+        IndexModel([("is_active", ASCENDING), ("is_featured_homepage", ASCENDING),
+                    ("featured_rank", ASCENDING), ("created_at", DESCENDING)],
+                   name="active_featured_rank"),
+    ],
+    "leads": [
+        # _id breaks created_at ties so the export's keyset order is index-backed
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="status_created_at_id"),
+        IndexModel([("lead_type", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="lead_type_created_at_id"),
+        IndexModel([("assigned_to", ASCENDING), ("created_at", DESCENDING)], name="assigned_to_created_at"),
+    ],
+    "jobs": [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        IndexModel([("type", ASCENDING), ("created_at", DESCENDING)], name="type_created_at"),
+        # At most one queued/running job per type (see submit_job)
+        IndexModel([("type", ASCENDING)], name="type_active_unique",
+                   unique=True, partialFilterExpression={"active": True}),
+        # Finished jobs carry expire_at (now + JOB_RETENTION_DAYS)
+        IndexModel([("expire_at", ASCENDING)], name="expire_at_ttl", expireAfterSeconds=0),
+    ],
+    "outbox": [
+        IndexModel([("channel", ASCENDING), ("status", ASCENDING), ("next_attempt_at", ASCENDING)],
+                   name="channel_status_next_attempt"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+        # Gathering a digest: everything waiting under the same key
+        IndexModel([("digest_key", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING)],
+                   name="digest_key_status_created_at"),
+        # Sent/skipped messages carry expire_at (now + OUTBOX_RETENTION_DAYS)
+        IndexModel([("expire_at", ASCENDING)], name="expire_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Result of the last ensure_indexes() run: collection -> index name -> "ok" | error
+_last_ensure_results: Dict[str, Dict[str, str]] = {}
+
+
+async def ensure_indexes_for(collection, indexes: List[IndexModel]) -> Dict[str, str]:
+    """
+    Create indexes one by one so a single conflict doesn't block the rest.
+
+    Returns:
+        Dict mapping index name -> "ok" or the error message
+    """
+    results = {}
+    for index in indexes:
+        name = index.document["name"]
+        try:
+            await collection.create_indexes([index])
+            results[name] = "ok"
+        except PyMongoError as e:
+            logger.warning(f"Index {collection.name}.{name} could not be created: {e}")
+            results[name] = str(e)[:200]
+    return results
+
+
+async def ensure_indexes(db) -> Dict[str, Dict[str, str]]:
+    """Apply the whole registry. Safe to run on every startup."""
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        results = await ensure_indexes_for(db[collection_name], indexes)
+        _last_ensure_results[collection_name] = results
+        failed = [name for name, status in results.items() if status != "ok"]
+        if failed:
+            logger.warning(f"{collection_name}: failed to ensure indexes {failed}")
+        else:
+            logger.info(f"{collection_name}: {len(results)} indexes ensured")
+    return dict(_last_ensure_results)
+
+
+def _index_keys(spec) -> List[list]:
+    """Normalize index keys to [[field, direction], ...] for comparison."""
+    if isinstance(spec, dict):
+        spec = spec.items()
+    return [[field, int(direction) if isinstance(direction, (int, float)) else direction]
+            for field, direction in spec]
+
+
+async def get_index_report(db) -> Dict:
+    """
+    Compare the registry against live indexes.
+
+    Returns:
+        {collection: {"missing": [...], "mismatched": [...], "extra": [...]}}
+    """
+    report = {}
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        try:
+            live = await db[collection_name].index_information()
+        except PyMongoError:
+            live = {}
+        live.pop("_id_", None)
+
+        missing = []
+        mismatched = []
+        for index in indexes:
+            doc = index.document
+            name = doc["name"]
+            expected_keys = _index_keys(doc["key"])
+            if name not in live:
+                missing.append({
+                    "name": name,
+                    "keys": expected_keys,
+                    "last_error": _last_ensure_results.get(collection_name, {}).get(name),
+                })
+            elif _index_keys(live[name]["key"]) != expected_keys or \
+                    bool(live[name].get("unique")) != bool(doc.get("unique")):
+                mismatched.append({
+                    "name": name,
+                    "expected": expected_keys,
+                    "actual": _index_keys(live[name]["key"]),
+                })
+
+        registered = {index.document["name"] for index in indexes}
+        extra = [
+            {"name": name, "keys": _index_keys(info["key"])}
+            for name, info in live.items() if name not in registered
+        ]
+
+        report[collection_name] = {
+            "missing": missing,
+            "mismatched": mismatched,
+            "extra": extra,
+        }
+    return report
@@ -0,0 +1,108 @@
+"""
+Public Inventory Response Cache
+
+Inventory only changes when an admin edits, uploads, imports, syncs or
+cleans images, so /api/vehicles, /api/vehicles/featured and
+/api/vehicles/{stock_id} responses are cached in-process.
+
+The cache and the weak ETags on public vehicle responses are keyed on an
+inventory version read from the data itself (get_inventory_version): the
+newest admin_vehicles.updated_at plus the number of active vehicles. Every
+write path sets updated_at, so writes from other uvicorn workers, the sync
+job or scripts/sync_vehicles_to_admin.py move the version too. All workers
+agree on it, so clients get 304s whichever worker answers.
+
+The version is re-read at most every INVENTORY_VERSION_CHECK_SECONDS
+(two index-only queries); that is how long another process's write can go
+unnoticed. Writes made in this process call invalidate_inventory_cache(),
+which drops the cache and forces a re-read on the next request.
+
+Configuration (backend/.env):
+- INVENTORY_CACHE_TTL_SECONDS=30
+- INVENTORY_CACHE_MAX_ENTRIES=512
+- INVENTORY_VERSION_CHECK_SECONDS=1
+"""
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Hashable, Optional, Tuple
+
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_CACHE_TTL_SECONDS = float(os.environ.get("INVENTORY_CACHE_TTL_SECONDS", "30"))
+INVENTORY_CACHE_MAX_ENTRIES = int(os.environ.get("INVENTORY_CACHE_MAX_ENTRIES", "512"))
+INVENTORY_VERSION_CHECK_SECONDS = float(os.environ.get("INVENTORY_VERSION_CHECK_SECONDS", "1"))
+
+inventory_cache = TTLCache(
+    name="inventory",
+    max_entries=INVENTORY_CACHE_MAX_ENTRIES,
+    ttl_seconds=INVENTORY_CACHE_TTL_SECONDS,
+)
+
+_generation = 0
+_invalidations = 0
+
+# (version, generation it was read at, monotonic time it was read)
+_version: Optional[Tuple[str, int, float]] = None
+
+
+def get_inventory_generation() -> int:
+    return _generation
+
+
+async def get_inventory_version(collection) -> str:
+    """
+    Version of the public inventory data, shared by all processes.
+
+    Re-read from Mongo at most every INVENTORY_VERSION_CHECK_SECONDS,
+    and right after a write made in this process.
+    """
+    global _version
+    now = time.monotonic()
+    if _version is not None and _version[1] == _generation and now - _version[2] < INVENTORY_VERSION_CHECK_SECONDS:
+        return _version[0]
+
+    generation = _generation
+    newest = await collection.find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)])
+    active = await collection.count_documents({"is_active": True})
+    updated_at = (newest or {}).get("updated_at")
+    stamp = int(updated_at.timestamp() * 1000) if isinstance(updated_at, datetime) else 0
+    version = f"{stamp:x}-{active}"
+    if _version is not None and _version[0] != version:
+        # Another process wrote; entries of the old version are dead weight
+        inventory_cache.clear()
+    _version = (version, generation, now)
+    return version
+
+
+def get_inventory_etag(version: str) -> str:
+    """Weak ETag for any public inventory response at this version."""
+    return f'W/"inv-{version}"'
+
+
+def inventory_cache_key(version: str, *parts: Hashable) -> Tuple:
+    """Cache key scoped to an inventory version (see get_inventory_version)."""
+    return (version,) + parts
+
+
+def invalidate_inventory_cache(reason: str = "") -> int:
+    """Drop cached responses and the cached version after an inventory write."""
+    global _generation, _invalidations
+    _generation += 1
+    _invalidations += 1
+    inventory_cache.clear()
+    logger.debug(f"Inventory cache invalidated (generation {_generation}) {reason}")
+    return _generation
+
+
+def get_inventory_cache_stats() -> dict:
+    return {
+        **inventory_cache.stats(),
+        "generation": _generation,
+        "invalidations": _invalidations,
+        "version": _version[0] if _version else None,
+        "etag": get_inventory_etag(_version[0]) if _version else None,
+    }
@@ -0,0 +1,408 @@
+"""
+Background Job Service
+
+Long-running admin operations (CSV import, inventory sync, image cleaning)
+can run as jobs instead of inside the HTTP request: the endpoint stores a
+job and returns its id right away, an in-process worker runs it, and
+GET /api/admin/jobs/{id} reports progress, errors and the final result.
+
+Jobs live in the `jobs` collection, so they survive restarts. A worker
+holds a lease on the job it runs and renews it while running; a job whose
+lease expired (its process died) is claimed again by the next free worker,
+up to JOB_MAX_ATTEMPTS times. On a clean shutdown running jobs are handed
+back to the queue immediately. Handlers must therefore be safe to re-run
+(the upsert-by-VIN paths are).
+
+Only one job per type may be queued or running; dry runs (params
+dry_run=true) write nothing and don't count, so a preview never blocks a
+real run. Active jobs that count carry active: true, and a unique partial
+index on type over them (services/indexes.py) enforces this even for
+concurrent submits.
+
+Uploaded inputs (CSV files) are kept in the `job_payloads` GridFS bucket
+until the job finishes. Finished jobs are removed after JOB_RETENTION_DAYS
+(TTL index on expire_at, see services/indexes.py).
+
+Configuration (backend/.env):
+- JOB_WORKERS=1
+- JOB_LEASE_SECONDS=60
+- JOB_MAX_ATTEMPTS=3
+- JOB_POLL_SECONDS=5
+- JOB_RETENTION_DAYS=7
+"""
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "5"))
+JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", "7"))
+
+JOBS_COLLECTION = "jobs"
+JOB_PAYLOAD_BUCKET = "job_payloads"
+
+# Progress is persisted at most this often (the final state always is)
+PROGRESS_WRITE_INTERVAL_SECONDS = 1.0
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+ACTIVE_JOB_STATUSES = [JOB_STATUS_QUEUED, JOB_STATUS_RUNNING]
+
+_handlers: Dict[str, Callable[["JobContext"], Awaitable[Dict[str, Any]]]] = {}
+_db = None
+_workers: List[asyncio.Task] = []
+_wakeup: Optional[asyncio.Event] = None
+
+
+class JobError(Exception):
+    """Raised when a job can't be submitted"""
+    pass
+
+
+class JobConflictError(JobError):
+    """Raised when a job of the same type is already queued or running"""
+
+    def __init__(self, job_id: str, job_type: str):
+        super().__init__(f"A {job_type} job is already queued or running")
+        self.job_id = job_id
+
+
+def init_job_store(db) -> None:
+    """Set the database holding jobs and payloads (app import time)."""
+    global _db
+    _db = db
+
+
+def register_job_handler(job_type: str, handler: Callable[["JobContext"], Awaitable[Dict[str, Any]]]) -> None:
+    """Register the coroutine that runs jobs of job_type; it returns the final report."""
+    _handlers[job_type] = handler
+
+
+def _jobs():
+    return _db[JOBS_COLLECTION]
+
+
+def _payload_bucket():
+    from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+    return AsyncIOMotorGridFSBucket(_db, bucket_name=JOB_PAYLOAD_BUCKET)
+
+
+def _lease_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)
+
+
+async def store_job_payload(job_id: str, filename: str, source: BinaryIO) -> Any:
+    """Stream an uploaded input into GridFS. Returns the payload file id."""
+    return await _payload_bucket().upload_from_stream(filename, source, metadata={"job_id": job_id})
+
+
+async def download_job_payload(payload_id: Any) -> BinaryIO:
+    """Copy a stored payload to a temp file (chunk by chunk), rewound."""
+    spool = tempfile.TemporaryFile()
+    stream = await _payload_bucket().open_download_stream(payload_id)
+    while True:
+        chunk = await stream.readchunk()
+        if not chunk:
+            break
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+async def delete_job_payload(payload_id: Any) -> None:
+    try:
+        await _payload_bucket().delete(payload_id)
+    except Exception as e:
+        logger.warning(f"Could not delete job payload {payload_id}: {e}")
+
+
+class JobContext:
+    """What a handler sees of its job: params, progress reporting, payload."""
+
+    def __init__(self, job: dict):
+        self.job_id = job["_id"]
+        self.job_type = job["type"]
+        self.params = job.get("params") or {}
+        self.attempt = job.get("attempts", 1)
+        self._payload_id = job.get("payload_id")
+        self._lease_token = job["lease_token"]
+        self._last_write = 0.0
+
+    async def progress(self, progress: Dict[str, Any], force: bool = False) -> None:
+        """Persist progress (throttled) and renew the lease."""
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_WRITE_INTERVAL_SECONDS:
+            return
+        self._last_write = now
+        await _jobs().update_one(
+            {"_id": self.job_id, "lease_token": self._lease_token},
+            {"$set": {
+                "progress": progress,
+                "updated_at": datetime.now(timezone.utc),
+                "lease_expires_at": _lease_expiry(),
+            }}
+        )
+
+    async def open_payload(self) -> BinaryIO:
+        """The job's uploaded input as a seekable temp file (caller closes it)."""
+        if self._payload_id is None:
+            raise JobError("Job has no payload")
+        return await download_job_payload(self._payload_id)
+
+
+async def submit_job(
+    job_type: str,
+    params: Optional[Dict[str, Any]] = None,
+    payload: Optional[BinaryIO] = None,
+    payload_filename: Optional[str] = None,
+) -> dict:
+    """
+    Queue a job.
+
+    Only one job per type may be queued or running at a time, not
+    counting dry runs (params["dry_run"] true).
+
+    Args:
+        job_type: Registered handler name
+        params: Plain (BSON-serializable) handler arguments
+        payload: Optional binary input, streamed into GridFS
+        payload_filename: Name stored with the payload
+
+    Returns:
+        The stored job document
+
+    Raises:
+        JobConflictError: If a job of this type is already active
+        JobError: If no handler is registered for job_type
+    """
+    if job_type not in _handlers:
+        raise JobError(f"Unknown job type '{job_type}'")
+
+    exclusive = not (params or {}).get("dry_run")
+    if exclusive:
+        active = await _jobs().find_one(
+            {"type": job_type, "status": {"$in": ACTIVE_JOB_STATUSES}, "params.dry_run": {"$ne": True}},
+            {"_id": 1}
+        )
+        if active:
+            raise JobConflictError(active["_id"], job_type)
+
+    job_id = uuid.uuid4().hex
+    payload_id = None
+    if payload is not None:
+        payload_id = await store_job_payload(job_id, payload_filename or job_id, payload)
+
+    now = datetime.now(timezone.utc)
+    job = {
+        "_id": job_id,
+        "type": job_type,
+        "status": JOB_STATUS_QUEUED,
+        "params": params or {},
+        "payload_id": payload_id,
+        "progress": {},
+        "result": None,
+        "error": None,
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "finished_at": None,
+    }
+    if exclusive:
+        # Cleared when the job finishes; backs the one-active-job-per-type index
+        job["active"] = True
+    try:
+        await _jobs().insert_one(job)
+    except DuplicateKeyError:
+        # A concurrent submit of the same type won the race
+        if payload_id is not None:
+            await delete_job_payload(payload_id)
+        active = await _jobs().find_one({"type": job_type, "active": True}, {"_id": 1})
+        raise JobConflictError(active["_id"] if active else None, job_type)
+    logger.info(f"Job {job_id} ({job_type}) queued")
+
+    if _wakeup is not None:
+        _wakeup.set()
+    return job
+
+
+def serialize_job(job: dict) -> dict:
+    """Job document as returned by the admin API."""
+    return {
+        "id": job["_id"],
+        "type": job["type"],
+        "status": job["status"],
+        "params": job.get("params") or {},
+        "progress": job.get("progress") or {},
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "attempts": job.get("attempts", 0),
+        "created_at": job.get("created_at"),
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "updated_at": job.get("updated_at"),
+    }
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    return await _jobs().find_one({"_id": job_id})
+
+
+async def list_jobs(job_type: Optional[str] = None, status: Optional[str] = None, limit: int = 20) -> List[dict]:
+    query = {}
+    if job_type:
+        query["type"] = job_type
+    if status:
+        query["status"] = status
+    return await _jobs().find(query).sort("created_at", -1).limit(limit).to_list(limit)
+
+
+async def _claim_next_job() -> Optional[dict]:
+    """Take the oldest queued job, or a running one whose worker went away."""
+    now = datetime.now(timezone.utc)
+    return await _jobs().find_one_and_update(
+        {"$or": [
+            {"status": JOB_STATUS_QUEUED},
+            {"status": JOB_STATUS_RUNNING, "lease_expires_at": {"$lt": now}},
+        ]},
+        {
+            "$set": {
+                "status": JOB_STATUS_RUNNING,
+                "lease_token": uuid.uuid4().hex,
+                "lease_expires_at": _lease_expiry(),
+                "started_at": now,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _finish_job(job: dict, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+    now = datetime.now(timezone.utc)
+    await _jobs().update_one(
+        {"_id": job["_id"], "lease_token": job["lease_token"]},
+        {
+            "$set": {
+                "status": status,
+                "result": result,
+                "error": error,
+                "finished_at": now,
+                "updated_at": now,
+                "expire_at": now + timedelta(days=JOB_RETENTION_DAYS),
+            },
+            "$unset": {"lease_token": "", "lease_expires_at": "", "active": ""},
+        }
+    )
+    if job.get("payload_id") is not None:
+        await delete_job_payload(job["payload_id"])
+
+
+async def _renew_lease(job: dict) -> None:
+    """Keep the lease alive while the handler runs (it may not report progress)."""
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            await _jobs().update_one(
+                {"_id": job["_id"], "lease_token": job["lease_token"]},
+                {"$set": {"lease_expires_at": _lease_expiry()}}
+            )
+        except PyMongoError as e:
+            logger.warning(f"Job {job['_id']}: lease renewal failed: {e}")
+
+
+async def _run_job(job: dict) -> None:
+    job_id, job_type = job["_id"], job["type"]
+
+    if job["attempts"] > JOB_MAX_ATTEMPTS:
+        logger.error(f"Job {job_id} ({job_type}) abandoned after {JOB_MAX_ATTEMPTS} attempts")
+        await _finish_job(job, JOB_STATUS_FAILED, error=f"Worker lost {JOB_MAX_ATTEMPTS} times; giving up")
+        return
+
+    handler = _handlers.get(job_type)
+    if handler is None:
+        await _finish_job(job, JOB_STATUS_FAILED, error=f"No handler for job type '{job_type}'")
+        return
+
+    if job["attempts"] > 1:
+        logger.info(f"Job {job_id} ({job_type}) resumed, attempt {job['attempts']}")
+    else:
+        logger.info(f"Job {job_id} ({job_type}) started")
+
+    lease = asyncio.create_task(_renew_lease(job))
+    try:
+        result = await handler(JobContext(job))
+        await _finish_job(job, JOB_STATUS_SUCCEEDED, result=result)
+        logger.info(f"Job {job_id} ({job_type}) succeeded")
+    except asyncio.CancelledError:
+        # Shutting down: hand the job back so the next start picks it up
+        # at once instead of waiting for the lease to expire
+        await _jobs().update_one(
+            {"_id": job_id, "lease_token": job["lease_token"]},
+            {"$set": {"status": JOB_STATUS_QUEUED}, "$inc": {"attempts": -1},
+             "$unset": {"lease_token": "", "lease_expires_at": ""}}
+        )
+        raise
+    except Exception as e:
+        logger.error(f"Job {job_id} ({job_type}) failed: {e}")
+        await _finish_job(job, JOB_STATUS_FAILED, error=str(e))
+    finally:
+        lease.cancel()
+
+
+async def _worker_loop(worker_number: int) -> None:
+    while True:
+        _wakeup.clear()
+        try:
+            job = await _claim_next_job()
+        except Exception as e:
+            logger.warning(f"Job worker {worker_number}: claim failed: {e}")
+            job = None
+
+        if job is None:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        try:
+            await _run_job(job)
+        except Exception as e:
+            # e.g. Mongo down while recording the outcome: the lease runs
+            # out and the job is retried; this worker keeps going
+            logger.exception(f"Job worker {worker_number}: job {job['_id']} ({job['type']}) crashed: {e}")
+            await asyncio.sleep(JOB_POLL_SECONDS)
+
+
+def start_job_workers() -> None:
+    """Start the in-process workers (app startup). Interrupted jobs resume."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    for worker_number in range(JOB_WORKERS):
+        _workers.append(asyncio.create_task(_worker_loop(worker_number)))
+    logger.info(f"Job workers started: {JOB_WORKERS}")
+
+
+async def stop_job_workers() -> None:
+    """Stop the workers (app shutdown); running jobs go back to the queue."""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
@@ -0,0 +1,162 @@
+"""
+Lead Notifications
+
+Queues the side effects of lead activity in the outbox (see
+services/outbox_service.py) so lead endpoints only pay for a Mongo insert:
+
+- mailchimp: subscribe the customer to the audience (new form leads)
+- email / sms / slack: staff alerts built by utils/alerts.py
+
+Only channels with provider credentials are queued; the rest keep being
+reported as "deferred" like before. Deliveries use the async senders
+(shared httpx client, persistent SMTP connection), so outbox workers never
+block the event loop.
+
+Staff alerts are coalesced per channel and recipient over
+ALERT_DIGEST_WINDOW_SECONDS (status changes always; new leads unless their
+type is in ALERT_PRIORITY_LEAD_TYPES), so bulk status edits or a campaign
+burst produce one digest instead of hundreds of emails/SMS.
+
+Configuration (backend/.env):
+- MAILCHIMP_API_KEY, MAILCHIMP_SERVER_PREFIX, MAILCHIMP_LIST_ID
+- Alert settings: see utils/alerts.py
+"""
+import logging
+import os
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.outbox_service import enqueue_outbox_messages, register_outbox_channel
+from utils.alerts import (
+    ALERT_CHANNELS, ALERT_DIGEST_WINDOW_SECONDS, ALERT_PRIORITY_LEAD_TYPES, alert_digest_key,
+    build_alert_digest, channel_configured, new_lead_alerts, send_alert, status_change_alerts
+)
+from utils.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# Mailchimp configuration
+MAILCHIMP_API_KEY = os.getenv("MAILCHIMP_API_KEY")
+MAILCHIMP_SERVER_PREFIX = os.getenv("MAILCHIMP_SERVER_PREFIX")
+MAILCHIMP_LIST_ID = os.getenv("MAILCHIMP_LIST_ID")
+
+MAILCHIMP_CHANNEL = "mailchimp"
+
+
+def mailchimp_configured() -> bool:
+    return all([MAILCHIMP_API_KEY, MAILCHIMP_SERVER_PREFIX, MAILCHIMP_LIST_ID])
+
+
+async def send_to_mailchimp(member: Dict[str, Any]) -> dict:
+    """
+    Add a member to the Mailchimp audience.
+
+    Args:
+        member: Mailchimp list member body (email_address, merge_fields, tags, ...)
+
+    Returns:
+        {"sent": bool, "status": "sent"|"deferred"|"error", "message": str};
+        client errors other than throttling are not retryable
+    """
+    if not mailchimp_configured():
+        return {"sent": False, "status": "deferred", "message": "Mailchimp not configured"}
+
+    url = f"https://{MAILCHIMP_SERVER_PREFIX}.api.mailchimp.com/3.0/lists/{MAILCHIMP_LIST_ID}/members"
+    try:
+        response = await get_http_client().post(
+            url,
+            auth=("anystring", MAILCHIMP_API_KEY),
+            json=member,
+            timeout=10
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Mailchimp error: {str(e)}")
+        return {"sent": False, "status": "error", "message": str(e) or type(e).__name__}
+
+    if response.status_code in (200, 201):
+        logger.info("✅ Lead sent to Mailchimp successfully")
+        return {"sent": True, "status": "sent", "message": "Member added"}
+
+    logger.warning(f"⚠️ Mailchimp API error: {response.status_code}")
+    return {
+        "sent": False,
+        "status": "error",
+        "message": f"Mailchimp API error {response.status_code}: {response.text[:200]}",
+        # e.g. "Member Exists" / invalid email: retrying won't help
+        "retryable": response.status_code == 429 or response.status_code >= 500,
+    }
+
+
+def _alert_sender(channel: str):
+    async def deliver(payload: Dict[str, Any]) -> dict:
+        return await send_alert(channel, payload)
+    return deliver
+
+
+register_outbox_channel(MAILCHIMP_CHANNEL, send_to_mailchimp)
+for _channel in ALERT_CHANNELS:
+    register_outbox_channel(_channel, _alert_sender(_channel), digest=partial(build_alert_digest, _channel))
+
+
+def _alert_messages(alerts: Dict[str, dict]) -> List[Tuple[str, dict]]:
+    """Alerts worth queueing: unconfigured channels would only be deferred."""
+    messages = []
+    for channel, message in alerts.items():
+        if channel_configured(channel):
+            messages.append((channel, message))
+        else:
+            logger.info(f"🔔 [{channel.upper()} DEFERRED] Provider not configured")
+    return messages
+
+
+def _digest_options(messages: List[Tuple[str, dict]], priority: bool) -> dict:
+    """enqueue_outbox_messages() arguments coalescing the alerts, unless they are urgent."""
+    if priority:
+        return {}
+    return {
+        "digest_keys": {channel: alert_digest_key(channel) for channel, _ in messages if channel in ALERT_CHANNELS},
+        "digest_window_seconds": ALERT_DIGEST_WINDOW_SECONDS,
+    }
+
+
+def _email_status(alerts: Dict[str, dict]) -> str:
+    """email_status reported to the form: disabled, deferred or queued."""
+    if "email" not in alerts:
+        return "disabled"
+    return "queued" if channel_configured("email") else "deferred"
+
+
+async def queue_new_lead_notifications(lead: dict, mailchimp_member: Optional[Dict[str, Any]] = None) -> dict:
+    """
+    Queue the Mailchimp subscribe and new lead alerts for a saved lead.
+
+    Args:
+        lead: Lead document (with _id)
+        mailchimp_member: Mailchimp member body, for leads that subscribe
+
+    Returns:
+        {"queued": [channels], "email_status": "queued"|"deferred"|"disabled"}
+    """
+    alerts = new_lead_alerts(lead)
+    messages = _alert_messages(alerts)
+    digest = _digest_options(messages, priority=lead.get("lead_type") in ALERT_PRIORITY_LEAD_TYPES)
+    if mailchimp_member and mailchimp_configured():
+        messages.insert(0, (MAILCHIMP_CHANNEL, mailchimp_member))
+
+    await enqueue_outbox_messages(messages, lead_id=str(lead["_id"]), event="new_lead", **digest)
+    return {"queued": [channel for channel, _ in messages], "email_status": _email_status(alerts)}
+
+
+async def queue_status_change_notifications(lead: dict, old_status: str, new_status: str) -> dict:
+    """
+    Queue the status change alerts for a lead.
+
+    Returns:
+        {"queued": [channels], "email_status": "queued"|"deferred"|"disabled"}
+    """
+    alerts = status_change_alerts(lead, old_status, new_status)
+    messages = _alert_messages(alerts)
+    digest = _digest_options(messages, priority=False)
+
+    await enqueue_outbox_messages(messages, lead_id=str(lead["_id"]), event="status_change", **digest)
+    return {"queued": [channel for channel, _ in messages], "email_status": _email_status(alerts)}
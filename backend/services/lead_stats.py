@@ -0,0 +1,136 @@
+"""
+Lead Dashboard Statistics
+
+GET /api/leads/stats/summary used to make four passes over the leads
+collection (two count_documents and two $group aggregations). All numbers
+now come from one $facet aggregation, i.e. a single collection scan:
+
+- total and new lead counts
+- breakdowns by status, lead type and source
+- leads per day (last LEADS_STATS_DAYS days) and per ISO week (last
+  LEADS_STATS_WEEKS weeks), bucketed in UTC, with empty buckets as 0
+
+The result is cached in-process for LEADS_STATS_CACHE_SECONDS and dropped
+whenever a lead is created, updated (status, assignment) or deleted
+through routes/leads.py (invalidate_lead_stats()). Each invalidation bumps
+a generation, and a summary whose aggregation started before the latest
+invalidation isn't cached, so a write landing mid-aggregation can't leave
+stale numbers in the cache for the whole TTL. Other worker processes
+catch up within the TTL.
+
+Configuration (backend/.env):
+- LEADS_STATS_CACHE_SECONDS=30
+- LEADS_STATS_DAYS=30
+- LEADS_STATS_WEEKS=12
+"""
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List
+
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+LEADS_STATS_CACHE_SECONDS = float(os.environ.get("LEADS_STATS_CACHE_SECONDS", "30"))
+LEADS_STATS_DAYS = int(os.environ.get("LEADS_STATS_DAYS", "30"))
+LEADS_STATS_WEEKS = int(os.environ.get("LEADS_STATS_WEEKS", "12"))
+
+lead_stats_cache = TTLCache(name="lead_stats", max_entries=1, ttl_seconds=LEADS_STATS_CACHE_SECONDS)
+
+_STATS_KEY = "summary"
+
+# Bumped by every invalidation
+_generation = 0
+
+
+def invalidate_lead_stats() -> None:
+    """Drop the cached summary after any lead write that changes the numbers."""
+    global _generation
+    _generation += 1
+    lead_stats_cache.clear()
+
+
+def _count_by(field: str) -> List[dict]:
+    return [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+
+
+def _count_per(date_format: str, since: datetime) -> List[dict]:
+    return [
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": date_format, "date": "$created_at"}},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+def _iso_week(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def build_lead_stats_pipeline(today: date) -> List[dict]:
+    """The single $facet pass behind the dashboard summary."""
+    first_day = today - timedelta(days=LEADS_STATS_DAYS - 1)
+    # Monday of the oldest week shown
+    first_week = today - timedelta(days=today.weekday(), weeks=LEADS_STATS_WEEKS - 1)
+    return [
+        {"$facet": {
+            "totals": [{"$group": {
+                "_id": None,
+                "total": {"$sum": 1},
+                "new": {"$sum": {"$cond": [{"$eq": ["$status", "new"]}, 1, 0]}},
+            }}],
+            "by_status": _count_by("status"),
+            "by_type": _count_by("lead_type"),
+            "by_source": _count_by("source"),
+            "per_day": _count_per("%Y-%m-%d", datetime.combine(first_day, time.min, tzinfo=timezone.utc)),
+            "per_week": _count_per("%G-W%V", datetime.combine(first_week, time.min, tzinfo=timezone.utc)),
+        }},
+    ]
+
+
+def _as_dict(rows: List[dict]) -> Dict[str, int]:
+    return {row["_id"] or "unknown": row["count"] for row in rows}
+
+
+def _buckets(rows: List[dict], labels: List[str], key: str) -> List[dict]:
+    """Counts for every label in order, 0 where no lead fell in the bucket."""
+    counts = {row["_id"]: row["count"] for row in rows}
+    return [{key: label, "count": counts.get(label, 0)} for label in labels]
+
+
+async def get_lead_stats(collection) -> dict:
+    """
+    Dashboard summary for the leads collection (cached).
+
+    Returns:
+        {"total", "new", "by_type", "by_status", "by_source", "per_day", "per_week"}
+    """
+    cached = lead_stats_cache.get(_STATS_KEY)
+    if cached is not None:
+        return cached
+
+    generation = _generation
+    today = datetime.now(timezone.utc).date()
+    facets = {}
+    async for doc in collection.aggregate(build_lead_stats_pipeline(today)):
+        facets = doc
+
+    totals = (facets.get("totals") or [{}])[0]
+    days = [(today - timedelta(days=offset)).isoformat() for offset in range(LEADS_STATS_DAYS - 1, -1, -1)]
+    weeks = [_iso_week(today - timedelta(weeks=offset)) for offset in range(LEADS_STATS_WEEKS - 1, -1, -1)]
+
+    stats = {
+        "total": totals.get("total", 0),
+        "new": totals.get("new", 0),
+        "by_type": _as_dict(facets.get("by_type", [])),
+        "by_status": _as_dict(facets.get("by_status", [])),
+        "by_source": _as_dict(facets.get("by_source", [])),
+        "per_day": _buckets(facets.get("per_day", []), days, "date"),
+        "per_week": _buckets(facets.get("per_week", []), weeks, "week"),
+    }
+    if generation == _generation:
+        lead_stats_cache.set(_STATS_KEY, stats)
+    return stats
@@ -0,0 +1,536 @@
+"""
+Notification Outbox
+
+Outbound deliveries (Mailchimp subscribes, lead alert emails, SMS, Slack)
+are not made inside the HTTP request: the endpoint inserts one outbox
+message per channel and returns, and in-process workers deliver them.
+
+Messages live in the `outbox` collection, so nothing is lost when a
+provider is down or the app restarts. Each channel has its own pool of
+workers (its concurrency), so a slow SMTP server never holds up Slack.
+A worker leases the message it delivers; a message whose lease expired
+(its process died) is picked up again. Failed deliveries are retried with
+exponential backoff; after OUTBOX_MAX_ATTEMPTS the message is dead-lettered
+(status "dead") and stays until an admin requeues it
+(POST /api/admin/outbox/requeue).
+
+A channel sender is a coroutine taking the message payload and returning
+{"sent": bool, "status": "sent"|"deferred"|"error", "message": str}, the
+shape the utils/alerts.py senders already use. "deferred" (provider not
+configured) ends the message as "skipped"; "error" retries unless the
+result carries "retryable": False.
+
+Bursts can be coalesced: messages queued with a digest key (channel +
+recipient) wait out a window, and the worker that picks up the first one
+also takes every other pending message with the same key and sends them
+as one digest, built by the channel's digest function. In-process
+counters compare events queued/delivered with messages actually sent.
+
+Delivered and skipped messages are removed after OUTBOX_RETENTION_DAYS
+(TTL index on expire_at, see services/indexes.py).
+
+Configuration (backend/.env):
+- OUTBOX_WORKERS_PER_CHANNEL=2   (OUTBOX_WORKERS_<CHANNEL> overrides one channel)
+- OUTBOX_LEASE_SECONDS=120
+- OUTBOX_MAX_ATTEMPTS=6
+- OUTBOX_BACKOFF_SECONDS=30
+- OUTBOX_MAX_BACKOFF_SECONDS=3600
+- OUTBOX_POLL_SECONDS=5
+- OUTBOX_RETENTION_DAYS=7
+- OUTBOX_DIGEST_MAX_MESSAGES=50   (events per digest)
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKERS_PER_CHANNEL = int(os.environ.get("OUTBOX_WORKERS_PER_CHANNEL", "2"))
+OUTBOX_LEASE_SECONDS = float(os.environ.get("OUTBOX_LEASE_SECONDS", "120"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_SECONDS = float(os.environ.get("OUTBOX_BACKOFF_SECONDS", "30"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.environ.get("OUTBOX_MAX_BACKOFF_SECONDS", "3600"))
+OUTBOX_POLL_SECONDS = float(os.environ.get("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_RETENTION_DAYS = int(os.environ.get("OUTBOX_RETENTION_DAYS", "7"))
+OUTBOX_DIGEST_MAX_MESSAGES = int(os.environ.get("OUTBOX_DIGEST_MAX_MESSAGES", "50"))
+
+OUTBOX_COLLECTION = "outbox"
+
+OUTBOX_STATUS_PENDING = "pending"
+OUTBOX_STATUS_SENDING = "sending"
+OUTBOX_STATUS_SENT = "sent"
+OUTBOX_STATUS_SKIPPED = "skipped"
+OUTBOX_STATUS_DEAD = "dead"
+OUTBOX_STATUSES = [
+    OUTBOX_STATUS_PENDING, OUTBOX_STATUS_SENDING, OUTBOX_STATUS_SENT,
+    OUTBOX_STATUS_SKIPPED, OUTBOX_STATUS_DEAD,
+]
+
+OutboxSender = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+OutboxDigest = Callable[[List[Dict[str, Any]]], Dict[str, Any]]
+
+# channel -> (sender, worker count)
+_channels: Dict[str, Tuple[OutboxSender, int]] = {}
+# channel -> function merging several payloads into one
+_digests: Dict[str, OutboxDigest] = {}
+# channel -> events queued / delivered vs. messages (and digests) sent
+_counters: Dict[str, Dict[str, int]] = {}
+_db = None
+_workers: List[asyncio.Task] = []
+_wakeups: Dict[str, asyncio.Event] = {}
+
+
+class OutboxError(Exception):
+    """Raised when a message can't be queued"""
+    pass
+
+
+def init_outbox(db) -> None:
+    """Set the database holding the outbox (app import time)."""
+    global _db
+    _db = db
+
+
+def register_outbox_channel(
+    channel: str,
+    sender: OutboxSender,
+    workers: Optional[int] = None,
+    digest: Optional[OutboxDigest] = None,
+) -> None:
+    """
+    Register the coroutine delivering messages of a channel.
+
+    Args:
+        channel: Channel name stored on each message (e.g. "email")
+        sender: Coroutine taking the payload, returning a delivery result
+        workers: Concurrent deliveries for this channel; defaults to
+            OUTBOX_WORKERS_<CHANNEL>, then OUTBOX_WORKERS_PER_CHANNEL
+        digest: Merges the payloads of coalesced messages into one;
+            channels without it are never coalesced
+    """
+    if workers is None:
+        workers = int(os.environ.get(f"OUTBOX_WORKERS_{channel.upper()}", OUTBOX_WORKERS_PER_CHANNEL))
+    _channels[channel] = (sender, max(1, workers))
+    if digest is not None:
+        _digests[channel] = digest
+    _counters.setdefault(channel, {"events_queued": 0, "events_delivered": 0, "messages_sent": 0, "digests_sent": 0})
+
+
+def _outbox():
+    return _db[OUTBOX_COLLECTION]
+
+
+def _lease_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+
+
+def _retry_delay(attempts: int) -> float:
+    """Exponential backoff: OUTBOX_BACKOFF_SECONDS, doubled per failed attempt, capped."""
+    return min(OUTBOX_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0)), OUTBOX_MAX_BACKOFF_SECONDS)
+
+
+async def enqueue_outbox_messages(
+    messages: List[Tuple[str, Dict[str, Any]]],
+    lead_id: Optional[str] = None,
+    event: Optional[str] = None,
+    digest_keys: Optional[Dict[str, str]] = None,
+    digest_window_seconds: float = 0.0,
+) -> List[str]:
+    """
+    Queue messages for delivery (one insert for all of them).
+
+    Args:
+        messages: (channel, payload) pairs; payloads must be BSON-serializable
+        lead_id: Lead the messages are about, for the admin views
+        event: What triggered them (e.g. "new_lead", "status_change")
+        digest_keys: channel -> digest key (e.g. "email:sales@dealer.com");
+            messages of these channels are coalesced with others of the
+            same key, if the channel has a digest function
+        digest_window_seconds: How long coalesced messages wait for company
+
+    Returns:
+        The ids of the queued messages
+
+    Raises:
+        OutboxError: If a channel has no registered sender
+    """
+    if not messages:
+        return []
+    unknown = sorted({channel for channel, _ in messages if channel not in _channels})
+    if unknown:
+        raise OutboxError(f"Unknown outbox channel(s): {', '.join(unknown)}")
+
+    now = datetime.now(timezone.utc)
+    digest_keys = digest_keys or {}
+    docs = []
+    for channel, payload in messages:
+        digest_key = digest_keys.get(channel) if channel in _digests and digest_window_seconds > 0 else None
+        docs.append({
+            "_id": uuid.uuid4().hex,
+            "channel": channel,
+            "payload": payload,
+            "lead_id": lead_id,
+            "event": event,
+            "digest_key": digest_key,
+            "status": OUTBOX_STATUS_PENDING,
+            "attempts": 0,
+            "next_attempt_at": now + timedelta(seconds=digest_window_seconds) if digest_key else now,
+            "last_error": None,
+            "created_at": now,
+            "updated_at": now,
+            "sent_at": None,
+        })
+    await _outbox().insert_many(docs)
+    for doc in docs:
+        _counters[doc["channel"]]["events_queued"] += 1
+
+    for channel in {doc["channel"] for doc in docs}:
+        if channel in _wakeups:
+            _wakeups[channel].set()
+    return [doc["_id"] for doc in docs]
+
+
+def serialize_outbox_message(message: dict) -> dict:
+    """Outbox message as returned by the admin API (payload omitted)."""
+    return {
+        "id": message["_id"],
+        "channel": message["channel"],
+        "status": message["status"],
+        "lead_id": message.get("lead_id"),
+        "event": message.get("event"),
+        "digest_key": message.get("digest_key"),
+        "digest_size": message.get("digest_size"),
+        "attempts": message.get("attempts", 0),
+        "last_error": message.get("last_error"),
+        "next_attempt_at": message.get("next_attempt_at"),
+        "created_at": message.get("created_at"),
+        "updated_at": message.get("updated_at"),
+        "sent_at": message.get("sent_at"),
+    }
+
+
+async def list_outbox_messages(
+    status: Optional[str] = None,
+    channel: Optional[str] = None,
+    limit: int = 50,
+) -> List[dict]:
+    query = {}
+    if status:
+        query["status"] = status
+    if channel:
+        query["channel"] = channel
+    return await _outbox().find(query, {"payload": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+
+
+async def get_outbox_stats() -> Dict[str, Any]:
+    """
+    Message counts per channel and status, the age of the oldest pending
+    message per channel (how far behind delivery is), and this process'
+    counters of events vs. messages actually sent.
+    """
+    channels: Dict[str, Dict[str, Any]] = {
+        channel: {"workers": workers, **{status: 0 for status in OUTBOX_STATUSES}, "oldest_pending_at": None}
+        for channel, (_, workers) in _channels.items()
+    }
+    pipeline = [
+        {"$group": {
+            "_id": {"channel": "$channel", "status": "$status"},
+            "count": {"$sum": 1},
+            "oldest": {"$min": "$created_at"},
+        }},
+    ]
+    async for row in _outbox().aggregate(pipeline):
+        channel, status = row["_id"]["channel"], row["_id"]["status"]
+        stats = channels.setdefault(
+            channel, {"workers": 0, **{s: 0 for s in OUTBOX_STATUSES}, "oldest_pending_at": None}
+        )
+        stats[status] = row["count"]
+        if status == OUTBOX_STATUS_PENDING:
+            stats["oldest_pending_at"] = row["oldest"]
+
+    totals = {status: sum(stats[status] for stats in channels.values()) for status in OUTBOX_STATUSES}
+    return {
+        "channels": channels,
+        "totals": totals,
+        "counters": get_outbox_counters(),
+        "max_attempts": OUTBOX_MAX_ATTEMPTS,
+    }
+
+
+def get_outbox_counters() -> Dict[str, Dict[str, int]]:
+    """Events queued and delivered vs. messages sent, per channel (since startup)."""
+    counters = {channel: dict(values) for channel, values in _counters.items()}
+    counters["total"] = {
+        name: sum(values[name] for values in _counters.values())
+        for name in ("events_queued", "events_delivered", "messages_sent", "digests_sent")
+    }
+    return counters
+
+
+async def requeue_outbox_messages(message_id: Optional[str] = None, channel: Optional[str] = None) -> int:
+    """
+    Put dead-lettered messages back in the queue with a fresh attempt budget.
+
+    Args:
+        message_id: Requeue only this message
+        channel: Requeue only this channel's dead messages
+
+    Returns:
+        Number of messages requeued
+    """
+    query: Dict[str, Any] = {"status": OUTBOX_STATUS_DEAD}
+    if message_id:
+        query["_id"] = message_id
+    if channel:
+        query["channel"] = channel
+
+    now = datetime.now(timezone.utc)
+    result = await _outbox().update_many(
+        query,
+        {"$set": {
+            "status": OUTBOX_STATUS_PENDING,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "updated_at": now,
+        }}
+    )
+    if result.modified_count:
+        logger.info(f"Outbox: requeued {result.modified_count} dead message(s)")
+        for event in _wakeups.values():
+            event.set()
+    return result.modified_count
+
+
+def _claimable(now: datetime) -> dict:
+    """Messages a worker may take: due pending ones, or sending ones whose worker went away."""
+    return {"$or": [
+        {"status": OUTBOX_STATUS_PENDING, "next_attempt_at": {"$lte": now}},
+        {"status": OUTBOX_STATUS_SENDING, "lease_expires_at": {"$lt": now}},
+    ]}
+
+
+async def _claim_next_message(channel: str) -> Optional[dict]:
+    """Take the next due message of a channel, or one whose worker went away."""
+    now = datetime.now(timezone.utc)
+    return await _outbox().find_one_and_update(
+        {"channel": channel, **_claimable(now)},
+        {
+            "$set": {
+                "status": OUTBOX_STATUS_SENDING,
+                "lease_token": uuid.uuid4().hex,
+                "lease_expires_at": _lease_expiry(),
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def _claim_digest(message: dict) -> List[dict]:
+    """
+    Add the other messages waiting under the same digest key to the claim
+    (even those whose window hasn't ended yet). Returns the whole group,
+    oldest first.
+    """
+    now = datetime.now(timezone.utc)
+    waiting = {
+        "digest_key": message["digest_key"],
+        "_id": {"$ne": message["_id"]},
+        "$or": [
+            {"status": OUTBOX_STATUS_PENDING},
+            {"status": OUTBOX_STATUS_SENDING, "lease_expires_at": {"$lt": now}},
+        ],
+    }
+    cursor = _outbox().find(waiting, {"_id": 1}).sort("created_at", 1).limit(OUTBOX_DIGEST_MAX_MESSAGES - 1)
+    ids = [doc["_id"] async for doc in cursor]
+    if not ids:
+        return [message]
+
+    # Re-checks the status so a message another worker just took is left alone
+    await _outbox().update_many(
+        {**waiting, "_id": {"$in": ids}},
+        {
+            "$set": {
+                "status": OUTBOX_STATUS_SENDING,
+                "lease_token": message["lease_token"],
+                "lease_expires_at": message["lease_expires_at"],
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        }
+    )
+    others = await _outbox().find(
+        {"lease_token": message["lease_token"], "_id": {"$ne": message["_id"]}}
+    ).sort("created_at", 1).to_list(None)
+    return [message] + others
+
+
+async def _finish_messages(
+    lease_token: str,
+    status: str,
+    error: Optional[str] = None,
+    digest_size: Optional[int] = None,
+    only: Optional[dict] = None,
+) -> None:
+    """Settle every message held under a lease (one message, or a digest group)."""
+    now = datetime.now(timezone.utc)
+    update: Dict[str, Any] = {"status": status, "last_error": error, "updated_at": now}
+    if status == OUTBOX_STATUS_SENT:
+        update["sent_at"] = now
+        update["digest_size"] = digest_size
+    if status in (OUTBOX_STATUS_SENT, OUTBOX_STATUS_SKIPPED):
+        update["expire_at"] = now + timedelta(days=OUTBOX_RETENTION_DAYS)
+    await _outbox().update_many(
+        {"lease_token": lease_token, **(only or {})},
+        {"$set": update, "$unset": {"lease_token": "", "lease_expires_at": ""}}
+    )
+
+
+async def _retry_later(messages: List[dict], error: str) -> None:
+    first = messages[0]
+    delay = _retry_delay(first["attempts"])
+    now = datetime.now(timezone.utc)
+    # Digest members that already used up their attempts stop here
+    await _finish_messages(
+        first["lease_token"], OUTBOX_STATUS_DEAD, error=error,
+        only={"attempts": {"$gte": OUTBOX_MAX_ATTEMPTS}},
+    )
+    await _outbox().update_many(
+        {"lease_token": first["lease_token"]},
+        {
+            "$set": {
+                "status": OUTBOX_STATUS_PENDING,
+                "next_attempt_at": now + timedelta(seconds=delay),
+                "last_error": error,
+                "updated_at": now,
+            },
+            "$unset": {"lease_token": "", "lease_expires_at": ""},
+        }
+    )
+    logger.warning(
+        f"Outbox {first['channel']} message {first['_id']}"
+        f"{f' (+{len(messages) - 1} in digest)' if len(messages) > 1 else ''} failed "
+        f"(attempt {first['attempts']}), retrying in {delay:.0f}s: {error}"
+    )
+
+
+async def _deliver(message: dict, sender: OutboxSender) -> None:
+    message_id, channel = message["_id"], message["channel"]
+    lease_token = message["lease_token"]
+
+    if message["attempts"] > OUTBOX_MAX_ATTEMPTS:
+        logger.error(f"Outbox {channel} message {message_id} dead-lettered: worker lost")
+        await _finish_messages(lease_token, OUTBOX_STATUS_DEAD, error=message.get("last_error") or "Worker lost")
+        return
+
+    messages = [message]
+    payload = message.get("payload") or {}
+    result = None
+    if message.get("digest_key") and channel in _digests:
+        messages = await _claim_digest(message)
+        if len(messages) > 1:
+            try:
+                payload = _digests[channel]([m.get("payload") or {} for m in messages])
+            except Exception as e:
+                # A bug in the digest function fails the same way on every retry
+                logger.exception(f"Outbox {channel}: building digest for {len(messages)} events failed")
+                result = {"sent": False, "status": "error", "message": f"Digest failed: {e}", "retryable": False}
+
+    if result is None:
+        try:
+            result = await sender(payload)
+        except asyncio.CancelledError:
+            # Shutting down: hand the messages back so the next start sends them
+            await _outbox().update_many(
+                {"lease_token": lease_token},
+                {"$set": {"status": OUTBOX_STATUS_PENDING}, "$inc": {"attempts": -1},
+                 "$unset": {"lease_token": "", "lease_expires_at": ""}}
+            )
+            raise
+        except Exception as e:
+            result = {"sent": False, "status": "error", "message": str(e)}
+        if not isinstance(result, dict):
+            result = {"sent": False, "status": "error", "message": f"Sender returned {result!r}"}
+
+    status = result.get("status")
+    if result.get("sent") or status == "sent":
+        await _finish_messages(lease_token, OUTBOX_STATUS_SENT, digest_size=len(messages))
+        counters = _counters[channel]
+        counters["messages_sent"] += 1
+        counters["events_delivered"] += len(messages)
+        if len(messages) > 1:
+            counters["digests_sent"] += 1
+            logger.info(f"Outbox {channel}: sent 1 digest for {len(messages)} events")
+        return
+    if status == "deferred":
+        await _finish_messages(lease_token, OUTBOX_STATUS_SKIPPED, error=result.get("message"))
+        return
+
+    error = str(result.get("message") or "Delivery failed")[:500]
+    if result.get("retryable", True) and message["attempts"] < OUTBOX_MAX_ATTEMPTS:
+        await _retry_later(messages, error)
+    else:
+        logger.error(f"Outbox {channel} message {message_id} dead-lettered after {message['attempts']} attempt(s): {error}")
+        await _finish_messages(lease_token, OUTBOX_STATUS_DEAD, error=error)
+
+
+async def _worker_loop(channel: str, worker_number: int) -> None:
+    sender, _ = _channels[channel]
+    wakeup = _wakeups[channel]
+    while True:
+        wakeup.clear()
+        try:
+            message = await _claim_next_message(channel)
+        except Exception as e:
+            logger.warning(f"Outbox {channel} worker {worker_number}: claim failed: {e}")
+            message = None
+
+        if message is None:
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        try:
+            await _deliver(message, sender)
+        except PyMongoError as e:
+            # The lease expires and the message is picked up again
+            logger.warning(f"Outbox {channel} message {message['_id']}: status update failed: {e}")
+        except Exception as e:
+            # Don't lose the worker; back off the messages still held under
+            # this lease (dead-lettered once out of attempts)
+            logger.exception(f"Outbox {channel} worker {worker_number}: delivering {message['_id']} crashed")
+            try:
+                await _retry_later([message], f"Worker error: {e}"[:500])
+            except Exception as retry_error:
+                logger.warning(f"Outbox {channel} message {message['_id']}: could not reschedule: {retry_error}")
+
+
+def start_outbox_workers() -> None:
+    """Start the delivery workers of every registered channel (app startup)."""
+    for channel, (_, workers) in _channels.items():
+        _wakeups[channel] = asyncio.Event()
+        for worker_number in range(workers):
+            _workers.append(asyncio.create_task(_worker_loop(channel, worker_number)))
+    logger.info(
+        "Outbox workers started: "
+        + ", ".join(f"{channel}={workers}" for channel, (_, workers) in _channels.items())
+    )
+
+
+async def stop_outbox_workers() -> None:
+    """Stop the workers (app shutdown); messages being sent go back to the queue."""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _wakeups.clear()
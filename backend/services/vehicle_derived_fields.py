@@ -0,0 +1,161 @@
+"""
+Derived (denormalized) Vehicle Fields
+
+List views (SRP, Featured, Homepage) only need one thumbnail per vehicle.
+Instead of projecting the whole images[] array and picking the thumbnail
+at read time, every write path stores small precomputed fields:
+
+- primary_thumbnail_url: thumbnail of the primary image (or first image)
+- card: small subdocument with everything a list card needs, including
+  the primary image's srcset (responsive width ladder)
+- make_norm, model_norm, body_style_norm, condition_norm: lowercase,
+  whitespace-collapsed facet values so SRP filters are exact (indexable)
+  matches instead of case-insensitive regexes
+- derived_version: bumped whenever the derivation changes, so the
+  backfill only touches stale documents
+
+Write paths call compute_derived_fields() on the merged document and
+$set the result. Bulk paths (CSV import, sync) call
+refresh_derived_fields() for the touched VINs afterwards.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from services.image_service import normalize_images_field, format_srcset
+
+logger = logging.getLogger(__name__)
+
+# Bump when compute_derived_fields changes so backfills pick up old docs
+DERIVED_FIELDS_VERSION = 3
+
+# Facet fields with a "<field>_norm" shadow field
+FACET_FIELDS = ["make", "model", "body_style", "condition"]
+
+# Fields read by compute_derived_fields (projection for refreshes)
+DERIVED_SOURCE_FIELDS = [
+    "images", "photo_urls", "imageUrls",
+    "year", "make", "model", "trim", "body_style", "condition",
+]
+
+REFRESH_BATCH_SIZE = 200
+
+
+def select_primary_image(images: List) -> Optional[dict]:
+    """The image flagged is_primary, else the first image (None if no images)."""
+    for img in images:
+        if isinstance(img, dict) and img.get("is_primary"):
+            return img
+    return images[0] if images else None
+
+
+def select_primary_thumbnail(images: List[dict]) -> Optional[str]:
+    """
+    Pick the thumbnail URL for list views.
+
+    Prefers the image flagged is_primary, else the first image, and within
+    an image prefers thumbnail_url (smaller payload) over url.
+    """
+    img = select_primary_image(images)
+    if isinstance(img, dict):
+        return img.get("thumbnail_url") or img.get("url", "")
+    return img
+
+
+def normalize_facet(value) -> Optional[str]:
+    """Normalize a facet value for exact matching ("  Chevrolet " -> "chevrolet")."""
+    if value is None:
+        return None
+    normalized = " ".join(str(value).split()).lower()
+    return normalized or None
+
+
+def build_card(doc: dict, thumbnail_url: Optional[str], image_count: int, srcset: Optional[str] = None) -> dict:
+    """Small list-card subdocument (title + thumbnail + srcset)."""
+    title_parts = [str(doc.get("year") or ""), doc.get("make") or "", doc.get("model") or "", doc.get("trim") or ""]
+    return {
+        "title": " ".join(p.strip() for p in title_parts if p and p.strip()),
+        "thumbnail_url": thumbnail_url,
+        "srcset": srcset,
+        "image_count": image_count,
+    }
+
+
+def compute_derived_fields(doc: dict) -> Dict:
+    """
+    Compute denormalized list-view fields from a (merged) vehicle document.
+
+    Returns:
+        Dict ready to be merged into a $set update
+    """
+    images = normalize_images_field(doc)
+    thumbnail_url = select_primary_thumbnail(images)
+    primary = select_primary_image(images)
+    srcset = format_srcset(primary.get("sources")) if isinstance(primary, dict) else None
+
+    derived = {
+        "primary_thumbnail_url": thumbnail_url,
+        "card": build_card(doc, thumbnail_url, len(images), srcset),
+        "derived_version": DERIVED_FIELDS_VERSION,
+    }
+    for field in FACET_FIELDS:
+        derived[f"{field}_norm"] = normalize_facet(doc.get(field))
+
+    return derived
+
+
+# Fields compute_derived_fields writes (projection for change detection)
+DERIVED_FIELDS = list(compute_derived_fields({}))
+
+
+async def refresh_derived_fields(collection, query: dict) -> int:
+    """
+    Recompute derived fields for all documents matching query.
+
+    Used by bulk write paths and the backfill migration. Only fields whose
+    value changed are written, and updated_at (which moves the inventory
+    ETag, see services/inventory_cache.py) only when a visible derived
+    value changed - a version-only backfill leaves it alone.
+
+    Returns:
+        Number of documents updated
+    """
+    projection = {field: 1 for field in DERIVED_SOURCE_FIELDS + DERIVED_FIELDS}
+    updated = 0
+    ops = []
+
+    async for doc in collection.find(query, projection):
+        fields = {k: v for k, v in compute_derived_fields(doc).items() if doc.get(k) != v}
+        if not fields:
+            continue
+        if set(fields) != {"derived_version"}:
+            fields["updated_at"] = datetime.now(timezone.utc)
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(ops) >= REFRESH_BATCH_SIZE:
+            result = await collection.bulk_write(ops, ordered=False)
+            updated += result.modified_count
+            ops = []
+
+    if ops:
+        result = await collection.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+
+    return updated
+
+
+async def backfill_derived_fields(collection) -> int:
+    """Recompute derived fields for documents from an older derivation version."""
+    return await refresh_derived_fields(
+        collection, {"derived_version": {"$ne": DERIVED_FIELDS_VERSION}}
+    )
+
+
+async def refresh_derived_fields_for_vins(collection, vins: List[str], chunk_size: int = 500) -> int:
+    """Refresh derived fields for the given VINs ($in in chunks)."""
+    vins = [v for v in dict.fromkeys(vins) if v]
+    updated = 0
+    for i in range(0, len(vins), chunk_size):
+        updated += await refresh_derived_fields(collection, {"vin": {"$in": vins[i:i + chunk_size]}})
+    return updated
@@ -0,0 +1,375 @@
+"""
+Vehicle Sync Service
+
+Copies vehicles from a source collection (e.g. the public `vehicles` feed)
+into admin_vehicles, keyed by VIN. Used by POST /api/admin/vehicles/sync
+and its background job.
+
+Sync is incremental:
+- The source is streamed with a cursor and handled SYNC_BATCH_SIZE
+  documents at a time.
+- Each vehicle is normalized and fingerprinted (sha256 of the normalized
+  fields) and compared with the fingerprint of the same fields on its
+  admin_vehicles document, fetched for the whole batch with one $in
+  query. Only new or changed vehicles are written, with one bulk_write
+  per batch; a vehicle edited in the admin panel since still counts as
+  changed, as before.
+- The newest source updated_at seen is stored in sync_state as a
+  watermark; the next run only reads documents updated since then, plus
+  documents without an updated_at date (they can't be filtered). A full
+  run ignores the watermark.
+
+Dry runs read the same way and write nothing, not even the watermark.
+
+Vehicles whose images already live in the image store (cleaned or
+uploaded, with blob_id/upload_id) keep them: images are left out of both
+their fingerprint and their update, so the feed's raw URLs neither
+overwrite stored images (orphaning blobs) nor make every run count the
+vehicle as changed.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from services.vehicle_derived_fields import refresh_derived_fields_for_vins
+from services.image_store import has_stored_images
+from services.inventory_cache import invalidate_inventory_cache
+
+logger = logging.getLogger(__name__)
+
+SYNC_STATE_COLLECTION = "sync_state"
+SYNC_TARGET_COLLECTION = "admin_vehicles"
+# Source documents per fingerprint lookup / bulk_write
+SYNC_BATCH_SIZE = 500
+MAX_PREVIEW_SAMPLES = 10
+MAX_REPORTED_ERRORS = 5
+
+
+def normalize_vehicle_for_admin(doc: dict) -> dict:
+    """
+    Normalize a vehicle document from any source to admin_vehicles format.
+
+    Handles common field name variations and data type differences.
+    """
+    # Price normalization
+    price = doc.get("price") or doc.get("internetPrice") or doc.get("salePrice") or doc.get("Price")
+    if price is not None:
+        try:
+            if isinstance(price, str):
+                price = float(price.replace(",", "").replace("$", "").strip())
+            price = float(price)
+        except (ValueError, TypeError):
+            price = None
+
+    # Mileage normalization
+    mileage = doc.get("mileage") or doc.get("odometer") or doc.get("Mileage")
+    if mileage is not None:
+        try:
+            if isinstance(mileage, str):
+                mileage = int(mileage.replace(",", "").strip())
+            mileage = int(mileage)
+        except (ValueError, TypeError):
+            mileage = None
+
+    # Year normalization
+    year = doc.get("year") or doc.get("Year")
+    if year is not None:
+        try:
+            year = int(year)
+        except (ValueError, TypeError):
+            year = None
+
+    # Images normalization
+    images = doc.get("images") or doc.get("photos") or doc.get("image_urls") or []
+    if isinstance(images, str):
+        images = [{"url": images, "is_primary": True}]
+    elif isinstance(images, list):
+        # Normalize to [{url, is_primary}] format
+        normalized_images = []
+        for i, img in enumerate(images):
+            if isinstance(img, str):
+                normalized_images.append({"url": img, "is_primary": i == 0})
+            elif isinstance(img, dict):
+                normalized_images.append(img)
+        images = normalized_images
+
+    # Handle primary_image_url separately
+    primary_url = doc.get("primary_image_url") or doc.get("image_url")
+    if primary_url and not images:
+        images = [{"url": primary_url, "is_primary": True}]
+
+    return {
+        "stock_number": doc.get("stock_number") or doc.get("stock") or doc.get("stockNumber") or doc.get("stock_id"),
+        "year": year,
+        "make": (doc.get("make") or doc.get("Make") or "").strip(),
+        "model": (doc.get("model") or doc.get("Model") or "").strip(),
+        "trim": (doc.get("trim") or doc.get("Trim") or "").strip(),
+        "mileage": mileage,
+        "price": price,
+        "condition": doc.get("condition") or doc.get("Condition") or "Used",
+        "body_style": doc.get("body_style") or doc.get("bodyStyle") or doc.get("body") or "",
+        "exterior_color": doc.get("exterior_color") or doc.get("exteriorColor") or doc.get("color") or "",
+        "interior_color": doc.get("interior_color") or doc.get("interiorColor") or "",
+        "transmission": doc.get("transmission") or doc.get("Transmission") or "",
+        "drivetrain": doc.get("drivetrain") or doc.get("driveType") or "",
+        "fuel_type": doc.get("fuel_type") or doc.get("fuelType") or "",
+        "engine": doc.get("engine") or doc.get("Engine") or "",
+        "carfax_url": doc.get("carfax_url") or doc.get("carfaxUrl") or "",
+        "window_sticker_url": doc.get("window_sticker_url") or doc.get("windowStickerUrl") or "",
+        "images": images,
+        "is_active": doc.get("is_active", True),
+        "is_featured_homepage": doc.get("is_featured_homepage", False),
+        "featured_rank": doc.get("featured_rank"),
+        "call_for_availability_enabled": doc.get("call_for_availability_enabled", False),
+        "sync_source": "admin_sync",
+    }
+
+
+# Fields sync writes (and compares)
+SYNC_FIELDS = list(normalize_vehicle_for_admin({})) + ["vin"]
+
+
+def sync_fingerprint(normalized: dict) -> str:
+    """Stable hash of the normalized fields (key order and timestamps don't matter)."""
+    canonical = json.dumps(normalized, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _synced_fields(normalized: dict, keep_images: bool) -> dict:
+    """The fields sync compares and writes; without images if the vehicle keeps its own."""
+    if not keep_images:
+        return normalized
+    return {k: v for k, v in normalized.items() if k != "images"}
+
+
+def _watermark_query(watermark: Optional[datetime]) -> dict:
+    if watermark is None:
+        return {}
+    return {"$or": [
+        {"updated_at": {"$gte": watermark}},
+        {"updated_at": {"$not": {"$type": "date"}}},
+    ]}
+
+
+async def run_vehicle_sync(
+    db,
+    source_collection: str,
+    dry_run: bool = False,
+    full: bool = False,
+    progress: Optional[Callable[[Dict[str, Any]], Any]] = None,
+) -> dict:
+    """
+    Upsert admin_vehicles from a source collection by VIN.
+
+    Args:
+        db: MongoDB database connection
+        source_collection: Collection to read from
+        dry_run: Only report what would change (no writes)
+        full: Ignore the stored watermark and read the whole source
+        progress: Optional async callback receiving running counts after each batch
+
+    Returns:
+        Sync report (same shape for the endpoint and the background job)
+    """
+    source = db[source_collection]
+    target = db[SYNC_TARGET_COLLECTION]
+    state_id = f"{SYNC_TARGET_COLLECTION}:{source_collection}"
+
+    state = await db[SYNC_STATE_COLLECTION].find_one({"_id": state_id})
+    watermark = None if full or not state else state.get("watermark")
+    query = _watermark_query(watermark)
+    to_scan = await source.count_documents(query)
+
+    report = {
+        "counts": {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0},
+        "errors": [],
+        "write_errors": 0,
+        "preview_samples": [],
+        # Dry run only: fingerprints earlier batches would have written
+        "planned_fingerprints": {} if dry_run else None,
+    }
+
+    logger.info(
+        f"Sync {'(DRY RUN) ' if dry_run else ''}starting: {to_scan} documents from '{source_collection}'"
+        f"{f' updated since {watermark.isoformat()}' if watermark else ''}"
+    )
+
+    scanned = 0
+    newest = watermark
+    batch = []
+    async for doc in source.find(query):
+        scanned += 1
+        updated_at = doc.get("updated_at")
+        if isinstance(updated_at, datetime) and (newest is None or updated_at > newest):
+            newest = updated_at
+        batch.append(doc)
+        if len(batch) >= SYNC_BATCH_SIZE:
+            await _sync_batch(target, batch, dry_run, report)
+            batch = []
+            if progress:
+                await progress({"processed": scanned, "total": to_scan, **report["counts"]})
+    if batch:
+        await _sync_batch(target, batch, dry_run, report)
+        if progress:
+            await progress({"processed": scanned, "total": to_scan, **report["counts"]})
+
+    counts = report["counts"]
+    if not dry_run:
+        if counts["inserted"] or counts["updated"]:
+            invalidate_inventory_cache("sync")
+        # Failed writes keep the old watermark so the next run retries them
+        if not report["write_errors"]:
+            await db[SYNC_STATE_COLLECTION].update_one(
+                {"_id": state_id},
+                {"$set": {
+                    "source_collection": source_collection,
+                    "target_collection": SYNC_TARGET_COLLECTION,
+                    "watermark": newest,
+                    "last_run_at": datetime.now(timezone.utc),
+                    "last_counts": dict(counts),
+                }},
+                upsert=True,
+            )
+
+    # Get counts
+    source_count = await source.count_documents({})
+    target_count = await target.count_documents({})
+
+    logger.info(
+        f"Sync {'(DRY RUN) ' if dry_run else ''}complete: {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['skipped']} skipped"
+    )
+
+    result = {
+        "success": True,
+        "dry_run": dry_run,
+        "source_collection": source_collection,
+        "target_collection": SYNC_TARGET_COLLECTION,
+        "source_count": source_count,
+        "incremental": watermark is not None,
+        "scanned": scanned,
+        "results": {
+            "would_insert" if dry_run else "inserted": counts["inserted"],
+            "would_update" if dry_run else "updated": counts["updated"],
+            "skipped": counts["skipped"],
+        },
+        "unchanged": counts["unchanged"],
+        "target_count_before" if dry_run else "target_count_after": target_count,
+        "errors": report["errors"][:MAX_REPORTED_ERRORS],
+    }
+
+    # Add preview samples for dry_run
+    if dry_run:
+        result["preview_samples"] = report["preview_samples"]
+        result["message"] = (
+            f"DRY RUN: Would insert {counts['inserted']}, update {counts['updated']}, "
+            f"skip {counts['skipped']} ({counts['unchanged']} unchanged). Run without dry_run=true to execute."
+        )
+
+    return result
+
+
+async def _sync_batch(target, docs: List[dict], dry_run: bool, report: dict) -> None:
+    """Diff a batch of source documents against admin_vehicles and write the changes."""
+    counts = report["counts"]
+
+    pending: List[Tuple[str, dict]] = []
+    for doc in docs:
+        # Get VIN (try different field names)
+        vin = doc.get("vin") or doc.get("VIN") or doc.get("Vin")
+        if not vin:
+            counts["skipped"] += 1
+            continue
+        try:
+            normalized = normalize_vehicle_for_admin(doc)
+        except Exception as e:
+            logger.error(f"Sync error for VIN={vin}: {e}")
+            report["errors"].append(str(e)[:100])
+            counts["skipped"] += 1
+            continue
+        normalized["vin"] = vin
+        pending.append((vin, normalized))
+
+    if not pending:
+        return
+
+    # Fingerprint of what admin_vehicles currently holds for each VIN
+    vins = list(dict.fromkeys(vin for vin, _ in pending))
+    known: Dict[str, str] = {}
+    stored_images = set()
+    async for existing in target.find({"vin": {"$in": vins}}, {field: 1 for field in SYNC_FIELDS}):
+        keep_images = has_stored_images(existing.get("images"))
+        if keep_images:
+            stored_images.add(existing["vin"])
+        current = {field: existing.get(field) for field in SYNC_FIELDS}
+        known[existing["vin"]] = sync_fingerprint(_synced_fields(current, keep_images))
+    planned = report["planned_fingerprints"]
+    if planned is not None:
+        known.update((vin, planned[vin]) for vin in vins if vin in planned)
+
+    # A VIN repeated in the source counts once per occurrence, as it would
+    # one upsert at a time; only its last version is written
+    actions: List[Tuple[str, str]] = []
+    changed: Dict[str, Tuple[dict, str]] = {}
+    for vin, normalized in pending:
+        normalized = _synced_fields(normalized, vin in stored_images)
+        fingerprint = sync_fingerprint(normalized)
+        if vin in known and known[vin] == fingerprint:
+            counts["unchanged"] += 1
+            continue
+        action = "updated" if vin in known else "inserted"
+        known[vin] = fingerprint
+        actions.append((vin, action))
+        changed[vin] = (normalized, fingerprint)
+
+        if dry_run and len(report["preview_samples"]) < MAX_PREVIEW_SAMPLES:
+            report["preview_samples"].append({
+                "vin": vin,
+                "action": "update" if action == "updated" else "insert",
+                "vehicle": f"{normalized.get('year')} {normalized.get('make')} {normalized.get('model')}",
+                "stock": normalized.get("stock_number"),
+            })
+
+    if dry_run:
+        planned.update((vin, fingerprint) for vin, (_, fingerprint) in changed.items())
+        for _, action in actions:
+            counts[action] += 1
+        return
+
+    failed = set()
+    if changed:
+        now = datetime.now(timezone.utc)
+        ops_vins = list(changed)
+        ops = [
+            UpdateOne(
+                {"vin": vin},
+                {
+                    "$set": {
+                        **normalized,
+                        "updated_at": now,
+                    },
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+            )
+            for vin, (normalized, _) in changed.items()
+        ]
+        try:
+            await target.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                vin = ops_vins[write_error["index"]]
+                failed.add(vin)
+                logger.error(f"Sync error for VIN={vin}: {write_error.get('errmsg')}")
+                report["errors"].append(str(write_error.get("errmsg"))[:100])
+            report["write_errors"] += len(failed)
+
+    for vin, action in actions:
+        counts["skipped" if vin in failed else action] += 1
+
+    await refresh_derived_fields_for_vins(target, [vin for vin in changed if vin not in failed])
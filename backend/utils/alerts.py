@@ -10,14 +10,33 @@ When provider credentials are added, simply update backend/.env with:
 - SMTP_HOST, SMTP_USER, SMTP_PASS, ALERT_EMAIL_TO (for email)
 - TWILIO_* vars (for SMS)
 - SLACK_WEBHOOK_URL (for Slack)
+
+Lead routes don't call the senders directly: new_lead_alerts() and
+status_change_alerts() build the messages, which are queued in the
+notification outbox and sent by its workers via send_alert().
+
+The senders are async and reuse long-lived connections: SMS and Slack go
+through the shared pooled httpx client (utils/http_client.py), email
+through one SMTP connection that stays logged in and is re-opened when
+the server drops it (close_alert_clients() on shutdown).
+
+Bursts are coalesced: alerts wait ALERT_DIGEST_WINDOW_SECONDS in the
+outbox, and everything queued for the same channel and recipient in that
+window goes out as one digest (build_alert_digest()). New leads of the
+ALERT_PRIORITY_LEAD_TYPES skip the window and are sent at once.
+- ALERT_DIGEST_WINDOW_SECONDS=30   (0 sends every alert on its own)
+- ALERT_PRIORITY_LEAD_TYPES=test_drive,pre_approval
 """
+import asyncio
 import os
 import logging
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional, Tuple
-import httpx
+from typing import Dict, List, Optional, Tuple
+
+import aiosmtplib
+
+from utils.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -26,11 +45,21 @@ ALERTS_ENABLED = os.getenv("ALERTS_ENABLED", "false").lower() == "true"
 ALERT_ON_NEW_LEAD = os.getenv("ALERT_ON_NEW_LEAD", "true").lower() == "true"
 ALERT_ON_STATUS_CHANGE = os.getenv("ALERT_ON_STATUS_CHANGE", "true").lower() == "true"
 
+# Digest batching
+ALERT_DIGEST_WINDOW_SECONDS = float(os.getenv("ALERT_DIGEST_WINDOW_SECONDS", "30"))
+ALERT_PRIORITY_LEAD_TYPES = {
+    lead_type.strip()
+    for lead_type in os.getenv("ALERT_PRIORITY_LEAD_TYPES", "test_drive,pre_approval").split(",")
+    if lead_type.strip()
+}
+
 # Email settings
 SMTP_HOST = os.getenv("SMTP_HOST", "")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER", "")
 SMTP_PASS = os.getenv("SMTP_PASS", "")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "20"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
 ALERT_EMAIL_TO = os.getenv("ALERT_EMAIL_TO", "")
 ALERT_EMAIL_FROM = os.getenv("ALERT_EMAIL_FROM", SMTP_USER)
 
@@ -39,10 +68,35 @@ TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "")
 TWILIO_FROM = os.getenv("TWILIO_FROM", "")
 ALERT_SMS_TO = os.getenv("ALERT_SMS_TO", "")
+TWILIO_API_URL = os.getenv("TWILIO_API_URL", "https://api.twilio.com").rstrip("/")
 
 # Slack settings
 SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL", "")
 
+# Persistent SMTP connection; the lock serializes sends on it
+_smtp: Optional[aiosmtplib.SMTP] = None
+_smtp_lock = asyncio.Lock()
+
+
+ALERT_CHANNELS = ("email", "sms", "slack")
+
+
+def channel_configured(channel: str) -> bool:
+    """Whether the provider credentials for an alert channel are set"""
+    if channel == "email":
+        return all([SMTP_HOST, SMTP_USER, SMTP_PASS, ALERT_EMAIL_TO])
+    if channel == "sms":
+        return all([TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_FROM, ALERT_SMS_TO])
+    if channel == "slack":
+        return bool(SLACK_WEBHOOK_URL)
+    return False
+
+
+def alert_digest_key(channel: str) -> str:
+    """Alerts with the same key (channel + recipient) are merged into one digest"""
+    recipient = {"email": ALERT_EMAIL_TO, "sms": ALERT_SMS_TO}.get(channel, "webhook")
+    return f"{channel}:{recipient}"
+
 
 def get_notification_status() -> dict:
     """Get the current status of all notification channels"""
@@ -149,26 +203,65 @@ def format_lead_message(lead: dict, event_type: str = "new") -> Tuple[str, str]:
     return subject, body
 
 
-def send_email(subject: str, body: str) -> dict:
+async def _smtp_connection() -> aiosmtplib.SMTP:
+    """The open SMTP connection, connecting and logging in if needed (hold _smtp_lock)."""
+    global _smtp
+    if _smtp is None or not _smtp.is_connected:
+        smtp = aiosmtplib.SMTP(
+            hostname=SMTP_HOST,
+            port=SMTP_PORT,
+            timeout=SMTP_TIMEOUT,
+            start_tls=SMTP_STARTTLS,
+        )
+        await smtp.connect()
+        await smtp.login(SMTP_USER, SMTP_PASS)
+        _smtp = smtp
+        logger.info(f"📧 SMTP connection opened to {SMTP_HOST}:{SMTP_PORT}")
+    return _smtp
+
+
+def _drop_smtp_connection() -> None:
+    """Forget the current connection (after an error) so the next send reconnects."""
+    global _smtp
+    smtp, _smtp = _smtp, None
+    if smtp is not None and smtp.is_connected:
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+
+async def send_email(subject: str, body: str) -> dict:
     """
     Send email notification
     Returns: {"sent": bool, "status": "sent"|"deferred"|"error", "message": str}
     """
-    if not all([SMTP_HOST, SMTP_USER, SMTP_PASS, ALERT_EMAIL_TO]):
+    if not channel_configured("email"):
         logger.info(f"📧 [EMAIL DEFERRED] Provider not configured - Subject: {subject[:50]}...")
         return {"sent": False, "status": "deferred", "message": "Email provider not configured"}
     
+    msg = MIMEMultipart()
+    msg["From"] = ALERT_EMAIL_FROM
+    msg["To"] = ALERT_EMAIL_TO
+    msg["Subject"] = subject
+    msg.attach(MIMEText(body, "plain"))
+    
     try:
-        msg = MIMEMultipart()
-        msg["From"] = ALERT_EMAIL_FROM
-        msg["To"] = ALERT_EMAIL_TO
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain"))
-        
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASS)
-            server.sendmail(ALERT_EMAIL_FROM, ALERT_EMAIL_TO.split(","), msg.as_string())
+        async with _smtp_lock:
+            reused = _smtp is not None and _smtp.is_connected
+            try:
+                smtp = await _smtp_connection()
+                await smtp.send_message(msg, sender=ALERT_EMAIL_FROM, recipients=ALERT_EMAIL_TO.split(","))
+            except aiosmtplib.SMTPServerDisconnected:
+                _drop_smtp_connection()
+                if not reused:
+                    raise
+                # The server closed the idle connection: reconnect once
+                smtp = await _smtp_connection()
+                await smtp.send_message(msg, sender=ALERT_EMAIL_FROM, recipients=ALERT_EMAIL_TO.split(","))
+            except Exception:
+                _drop_smtp_connection()
+                raise
         
         logger.info(f"📧 [EMAIL SENT] {subject}")
         return {"sent": True, "status": "sent", "message": "Email sent successfully"}
@@ -177,12 +270,12 @@ def send_email(subject: str, body: str) -> dict:
         return {"sent": False, "status": "error", "message": str(e)}
 
 
-def send_sms(body: str) -> dict:
+async def send_sms(body: str) -> dict:
     """
     Send SMS notification via Twilio
     Returns: {"sent": bool, "status": "sent"|"deferred"|"error", "message": str}
     """
-    if not all([TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_FROM, ALERT_SMS_TO]):
+    if not channel_configured("sms"):
         logger.info(f"📱 [SMS DEFERRED] Provider not configured")
         return {"sent": False, "status": "deferred", "message": "SMS provider not configured"}
     
@@ -190,37 +283,36 @@ def send_sms(body: str) -> dict:
         # Truncate body for SMS (160 char limit for single SMS)
         sms_body = body[:300] + "..." if len(body) > 300 else body
         
-        url = f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
+        url = f"{TWILIO_API_URL}/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
         
-        with httpx.Client() as client:
-            response = client.post(
-                url,
-                auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
-                data={
-                    "From": TWILIO_FROM,
-                    "To": ALERT_SMS_TO,
-                    "Body": sms_body,
-                },
-                timeout=10,
-            )
-            
-            if response.status_code in (200, 201):
-                logger.info(f"📱 [SMS SENT]")
-                return {"sent": True, "status": "sent", "message": "SMS sent successfully"}
-            else:
-                logger.error(f"📱 [SMS ERROR] {response.text}")
-                return {"sent": False, "status": "error", "message": response.text}
+        response = await get_http_client().post(
+            url,
+            auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+            data={
+                "From": TWILIO_FROM,
+                "To": ALERT_SMS_TO,
+                "Body": sms_body,
+            },
+            timeout=10,
+        )
+        
+        if response.status_code in (200, 201):
+            logger.info(f"📱 [SMS SENT]")
+            return {"sent": True, "status": "sent", "message": "SMS sent successfully"}
+        else:
+            logger.error(f"📱 [SMS ERROR] {response.text}")
+            return {"sent": False, "status": "error", "message": response.text}
     except Exception as e:
         logger.error(f"📱 [SMS ERROR] {e}")
-        return {"sent": False, "status": "error", "message": str(e)}
+        return {"sent": False, "status": "error", "message": str(e) or type(e).__name__}
 
 
-def send_slack(subject: str, body: str) -> dict:
+async def send_slack(subject: str, body: str) -> dict:
     """
     Send Slack notification
     Returns: {"sent": bool, "status": "sent"|"deferred"|"error", "message": str}
     """
-    if not SLACK_WEBHOOK_URL:
+    if not channel_configured("slack"):
         logger.info(f"💬 [SLACK DEFERRED] Webhook not configured - Subject: {subject[:50]}...")
         return {"sent": False, "status": "deferred", "message": "Slack webhook not configured"}
     
@@ -239,86 +331,150 @@ def send_slack(subject: str, body: str) -> dict:
             ]
         }
         
-        with httpx.Client() as client:
-            response = client.post(
-                SLACK_WEBHOOK_URL,
-                json=payload,
-                timeout=10,
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"💬 [SLACK SENT] {subject}")
-                return {"sent": True, "status": "sent", "message": "Slack message sent"}
-            else:
-                logger.error(f"💬 [SLACK ERROR] {response.text}")
-                return {"sent": False, "status": "error", "message": response.text}
+        response = await get_http_client().post(
+            SLACK_WEBHOOK_URL,
+            json=payload,
+            timeout=10,
+        )
+        
+        if response.status_code == 200:
+            logger.info(f"💬 [SLACK SENT] {subject}")
+            return {"sent": True, "status": "sent", "message": "Slack message sent"}
+        else:
+            logger.error(f"💬 [SLACK ERROR] {response.text}")
+            return {"sent": False, "status": "error", "message": response.text}
     except Exception as e:
         logger.error(f"💬 [SLACK ERROR] {e}")
-        return {"sent": False, "status": "error", "message": str(e)}
+        return {"sent": False, "status": "error", "message": str(e) or type(e).__name__}
 
 
-def notify_new_lead(lead: dict) -> dict:
+async def close_alert_clients() -> None:
+    """Log out of the persistent SMTP connection (app shutdown)."""
+    global _smtp
+    smtp, _smtp = _smtp, None
+    if smtp is not None and smtp.is_connected:
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+
+def new_lead_alerts(lead: dict) -> Dict[str, dict]:
     """
-    Send notifications for a new lead
-    Returns: {"notified": bool, "channels": {...}, "email_status": "sent"|"deferred"|"error"|"disabled"}
+    Alert messages for a new lead, per channel
+    Returns: {"email": {...}, "sms": {...}, "slack": {...}}, or {} when new lead alerts are off
     """
-    result = {
-        "notified": False,
-        "channels": {},
-        "email_status": "disabled"
-    }
-    
     if not ALERTS_ENABLED:
         logger.info(f"🔔 [ALERTS DISABLED] New lead received - ID: {lead.get('id', 'unknown')}")
-        return result
+        return {}
     
     if not ALERT_ON_NEW_LEAD:
         logger.info(f"🔔 [NEW LEAD ALERTS DISABLED] Lead ID: {lead.get('id', 'unknown')}")
-        return result
+        return {}
     
     subject, body = format_lead_message(lead, "new")
+    return {
+        "email": {"subject": subject, "body": body},
+        "sms": {"body": f"{subject}\n\nPhone: {lead.get('phone', 'N/A')}\nEmail: {lead.get('email', 'N/A')}"},
+        "slack": {"subject": subject, "body": body},
+    }
+
+
+def status_change_alerts(lead: dict, old_status: str, new_status: str) -> Dict[str, dict]:
+    """
+    Alert messages for a lead status change, per channel
+    Returns: {"email": {...}, "sms": {...}, "slack": {...}}, or {} when status alerts are off
+    """
+    if not ALERTS_ENABLED:
+        logger.info(f"🔔 [ALERTS DISABLED] Status change: {old_status} → {new_status}")
+        return {}
     
-    # Send via all configured channels
-    result["channels"]["email"] = send_email(subject, body)
-    result["channels"]["sms"] = send_sms(f"{subject}\n\nPhone: {lead.get('phone', 'N/A')}\nEmail: {lead.get('email', 'N/A')}")
-    result["channels"]["slack"] = send_slack(subject, body)
+    if not ALERT_ON_STATUS_CHANGE:
+        logger.info(f"🔔 [STATUS ALERTS DISABLED] {old_status} → {new_status}")
+        return {}
     
-    # Set overall status
-    result["notified"] = any(ch.get("sent") for ch in result["channels"].values())
-    result["email_status"] = result["channels"]["email"]["status"]
+    subject, body = format_lead_message(lead, "status_change")
+    extra_info = f"\n\nStatus changed: {old_status.upper()} → {new_status.upper()}"
+    return {
+        "email": {"subject": subject, "body": body + extra_info},
+        "sms": {"body": f"{subject}\n{old_status} → {new_status}"},
+        "slack": {"subject": subject, "body": body + extra_info},
+    }
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def build_alert_digest(channel: str, messages: List[dict]) -> dict:
+    """
+    Merge several alert messages of one channel into a single one
+    Returns: a message in the same shape send_alert() takes
+    """
+    count = len(messages)
+    subject = f"🔔 {count} Lead Alerts"
+    if channel == "sms":
+        # One line (the subject) per alert; send_sms truncates the rest
+        lines = [message["body"].split("\n", 1)[0] for message in messages]
+        return {"body": "\n".join([subject] + lines)}
     
-    return result
+    headlines = "\n".join(f"• {message['subject']}" for message in messages)
+    details = "\n\n".join(f"{message['subject']}\n{message['body']}" for message in messages)
+    body = f"{headlines}\n\n{details}"
+    if channel == "slack":
+        # Slack section blocks hold at most 3000 characters
+        body = _clip(body, 2900)
+    return {"subject": subject, "body": body}
 
 
-def notify_status_change(lead: dict, old_status: str, new_status: str) -> dict:
+async def send_alert(channel: str, message: dict) -> dict:
     """
-    Send notifications for a status change
-    Returns: {"notified": bool, "channels": {...}, "email_status": "sent"|"deferred"|"error"|"disabled"}
+    Send one alert message built by new_lead_alerts / status_change_alerts
+    Returns: {"sent": bool, "status": "sent"|"deferred"|"error", "message": str}
     """
+    if channel == "email":
+        return await send_email(message["subject"], message["body"])
+    if channel == "sms":
+        return await send_sms(message["body"])
+    if channel == "slack":
+        return await send_slack(message["subject"], message["body"])
+    return {"sent": False, "status": "error", "message": f"Unknown alert channel '{channel}'"}
+
+
+async def _send_alerts(alerts: Dict[str, dict]) -> dict:
     result = {
         "notified": False,
         "channels": {},
         "email_status": "disabled"
     }
-    
-    if not ALERTS_ENABLED:
-        logger.info(f"🔔 [ALERTS DISABLED] Status change: {old_status} → {new_status}")
-        return result
-    
-    if not ALERT_ON_STATUS_CHANGE:
-        logger.info(f"🔔 [STATUS ALERTS DISABLED] {old_status} → {new_status}")
+    if not alerts:
         return result
     
-    subject, body = format_lead_message(lead, "status_change")
-    extra_info = f"\n\nStatus changed: {old_status.upper()} → {new_status.upper()}"
-    
-    # Send via all configured channels
-    result["channels"]["email"] = send_email(subject, body + extra_info)
-    result["channels"]["sms"] = send_sms(f"{subject}\n{old_status} → {new_status}")
-    result["channels"]["slack"] = send_slack(subject, body + extra_info)
+    # Send via all configured channels at once
+    channels = list(alerts)
+    sent = await asyncio.gather(*(send_alert(channel, alerts[channel]) for channel in channels))
+    result["channels"] = dict(zip(channels, sent))
     
     # Set overall status
     result["notified"] = any(ch.get("sent") for ch in result["channels"].values())
     result["email_status"] = result["channels"]["email"]["status"]
     
     return result
+
+
+async def notify_new_lead(lead: dict) -> dict:
+    """
+    Send notifications for a new lead right away (lead routes queue them
+    through services/lead_notifications.py instead)
+    Returns: {"notified": bool, "channels": {...}, "email_status": "sent"|"deferred"|"error"|"disabled"}
+    """
+    return await _send_alerts(new_lead_alerts(lead))
+
+
+async def notify_status_change(lead: dict, old_status: str, new_status: str) -> dict:
+    """
+    Send notifications for a status change right away (lead routes queue
+    them through services/lead_notifications.py instead)
+    Returns: {"notified": bool, "channels": {...}, "email_status": "sent"|"deferred"|"error"|"disabled"}
+    """
+    return await _send_alerts(status_change_alerts(lead, old_status, new_status))
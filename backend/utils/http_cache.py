@@ -0,0 +1,20 @@
+"""
+HTTP caching helpers (ETag / If-None-Match).
+"""
+from typing import Optional
+
+
+def _opaque_tag(tag: str) -> str:
+    """Strip the weak prefix so W/"x" and "x" compare equal (weak comparison)."""
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag using weak comparison."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    expected = _opaque_tag(etag)
+    return any(_opaque_tag(tag) == expected for tag in if_none_match.split(","))
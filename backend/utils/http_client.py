@@ -0,0 +1,137 @@
+"""
+Shared outbound HTTP client.
+
+One pooled httpx.AsyncClient per process instead of a new client (and new
+TCP/TLS handshake) per request. Keep-alive connections are reused across
+downloads, concurrency per remote host is capped so a batch job can't
+hammer a single dealer CDN, and transient failures are retried with
+exponential backoff.
+
+Configuration (backend/.env):
+- HTTP_MAX_CONNECTIONS=50
+- HTTP_MAX_KEEPALIVE=20
+- HTTP_PER_HOST_CONCURRENCY=6
+- HTTP_RETRIES=3
+- HTTP_BACKOFF_SECONDS=0.5
+- HTTP_CLIENT_HTTP2=false   (needs the optional h2 package)
+"""
+import asyncio
+import logging
+import os
+import random
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_PER_HOST_CONCURRENCY = int(os.environ.get("HTTP_PER_HOST_CONCURRENCY", "6"))
+HTTP_RETRIES = int(os.environ.get("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_SECONDS = float(os.environ.get("HTTP_BACKOFF_SECONDS", "0.5"))
+HTTP_CLIENT_HTTP2 = os.environ.get("HTTP_CLIENT_HTTP2", "false").lower() == "true"
+
+# Status codes worth retrying (throttling / transient upstream errors)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client: Optional[httpx.AsyncClient] = None
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("HTTP_CLIENT_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+        return False
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared pooled client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            follow_redirects=True,
+            http2=HTTP_CLIENT_HTTP2 and _http2_available(),
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared client (app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_slots.clear()
+
+
+def _host_slot(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc.lower()
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = _host_slots[host] = asyncio.Semaphore(HTTP_PER_HOST_CONCURRENCY)
+    return slot
+
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+    """Exponential backoff with jitter; honors a numeric Retry-After."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+    return HTTP_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+
+async def fetch_bytes(url: str, timeout: float = 30, retries: int = HTTP_RETRIES) -> bytes:
+    """
+    GET a URL through the shared client and return the body.
+
+    Retries connection errors, timeouts and 429/5xx responses with backoff.
+
+    Raises:
+        httpx.HTTPError: If the request still fails after all retries
+    """
+    client = get_http_client()
+    async with _host_slot(url):
+        for attempt in range(retries + 1):
+            try:
+                response = await client.get(url, timeout=timeout)
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < retries:
+                    delay = _retry_delay(attempt, response)
+                    logger.info(f"GET {url[:80]} returned {response.status_code}, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                response.raise_for_status()
+                return response.content
+            except httpx.TransportError as e:
+                if attempt >= retries:
+                    raise
+                delay = _retry_delay(attempt)
+                logger.info(f"GET {url[:80]} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+async def fetch_validator(url: str, timeout: float = 10) -> Optional[str]:
+    """
+    HEAD a URL and return its ETag (or Last-Modified) if the server sends one.
+
+    Used to recognize an unchanged remote file without downloading it.
+    Returns None on any error or when no validator is present.
+    """
+    try:
+        async with _host_slot(url):
+            response = await get_http_client().head(url, timeout=timeout)
+        if response.status_code >= 400:
+            return None
+        return response.headers.get("etag") or response.headers.get("last-modified")
+    except httpx.HTTPError:
+        return None
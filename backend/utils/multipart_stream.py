@@ -0,0 +1,181 @@
+"""
+Streaming multipart/form-data uploads.
+
+Starlette's request.form() buffers the entire body before the route runs,
+and a route then typically read()s every file into memory at once. This
+parser consumes the request stream chunk by chunk and spools each file
+part straight to its own temp file, hashing it on the way. Per-file size
+limits are enforced while reading: an oversized part stops being written
+the moment it crosses the limit and the rest of it is discarded.
+
+Completed parts are yielded as soon as their closing boundary arrives, so
+callers can start processing the first file while later ones are still
+uploading. Peak memory is one network chunk, independent of batch size.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from typing import AsyncIterator, List, Optional
+
+from fastapi import Request
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+
+class MultipartStreamError(Exception):
+    """Raised when the request body is not parseable multipart/form-data"""
+    pass
+
+
+class SpooledUpload:
+    """One file part spooled to disk (or rejected while streaming)."""
+
+    def __init__(self, index: int, filename: str, content_type: Optional[str]):
+        self.index = index
+        self.filename = filename
+        self.content_type = content_type
+        self.path: Optional[str] = None
+        self.size = 0
+        self.sha256: Optional[str] = None
+        self.error: Optional[str] = None
+
+    def cleanup(self) -> None:
+        """Remove the spool file (safe to call more than once)."""
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+async def iter_spooled_uploads(
+    request: Request,
+    field_name: str,
+    max_files: int,
+    max_file_bytes: int,
+) -> AsyncIterator[SpooledUpload]:
+    """
+    Stream file parts named field_name to temp files.
+
+    Files past max_files and parts larger than max_file_bytes are yielded
+    with .error set and no .path; their bytes are never written. Callers
+    own the yielded spool files and must cleanup() them.
+
+    Args:
+        request: Incoming multipart/form-data request
+        field_name: Form field holding the files
+        max_files: Files to accept; later ones are rejected
+        max_file_bytes: Per-file size limit
+
+    Raises:
+        MultipartStreamError: If the body is not valid multipart/form-data
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise MultipartStreamError("Expected a multipart/form-data body")
+
+    completed: List[SpooledUpload] = []
+    state = {"part": None, "file": None, "hasher": None, "header_field": b"", "count": 0}
+    headers = {}
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        field = state["header_field"].lower()
+        headers[field] = headers.get(field, b"") + data[start:end]
+
+    def on_header_end():
+        state["header_field"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if name != field_name or filename is None:
+            return  # Other form fields are ignored
+
+        part_type = headers.get(b"content-type")
+        part = SpooledUpload(
+            index=state["count"],
+            filename=filename.decode("utf-8", "replace"),
+            content_type=part_type.decode("latin-1") if part_type else None,
+        )
+        state["count"] += 1
+        state["part"] = part
+        if part.index >= max_files:
+            part.error = f"Too many files. Maximum: {max_files} more"
+            return
+
+        spool = tempfile.NamedTemporaryFile(prefix="upload-", delete=False)
+        part.path = spool.name
+        state["file"] = spool
+        state["hasher"] = hashlib.sha256()
+
+    def on_part_data(data, start, end):
+        part, spool = state["part"], state["file"]
+        if part is None:
+            return
+        part.size += end - start
+        if spool is None:
+            return
+        if part.size > max_file_bytes:
+            # Stop spooling now; the rest of this part is read and dropped
+            part.error = f"File too large. Maximum: {max_file_bytes // (1024 * 1024)}MB"
+            spool.close()
+            part.cleanup()
+            state["file"] = None
+            return
+        spool.write(data[start:end])
+        state["hasher"].update(data[start:end])
+
+    def on_part_end():
+        part, spool = state["part"], state["file"]
+        if part is None:
+            return
+        if spool is not None:
+            spool.close()
+            part.sha256 = state["hasher"].hexdigest()
+        completed.append(part)
+        state["part"] = state["file"] = state["hasher"] = None
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                parser.write(chunk)
+            while completed:
+                yield completed.pop(0)
+        parser.finalize()
+        while completed:
+            yield completed.pop(0)
+        if state["part"] is not None:
+            # The body stopped before this part's closing boundary
+            raise MultipartStreamError(f"Upload ended in the middle of '{state['part'].filename}'")
+    except MultipartParseError as e:
+        raise MultipartStreamError(f"Malformed multipart body: {e}")
+    finally:
+        # Client disconnected or the caller stopped early: drop the partial spool
+        if state["file"] is not None:
+            state["file"].close()
+        if state["part"] is not None:
+            state["part"].cleanup()
+        for part in completed:
+            part.cleanup()
@@ -0,0 +1,73 @@
+"""
+Keyset (cursor) pagination helpers
+
+Pages are ordered by (sort_field DESC, _id DESC). The cursor is an opaque
+URL-safe token holding the last (sort_value, _id) pair of the previous page,
+so every page is a bounded index range scan regardless of collection size.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+class InvalidCursorError(Exception):
+    """Raised when a pagination cursor cannot be decoded"""
+    pass
+
+
+def encode_cursor(sort_value: Any, doc_id: Any) -> str:
+    """Encode the last (sort_value, _id) of a page into an opaque token."""
+    if isinstance(sort_value, datetime):
+        payload = {"t": "dt", "v": sort_value.isoformat()}
+    else:
+        payload = {"t": "raw", "v": sort_value}
+    payload["id"] = str(doc_id)
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    """Decode a token produced by encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        value = payload.get("v")
+        if payload.get("t") == "dt" and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, ObjectId(payload["id"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}")
+
+
+def keyset_filter(sort_field: str, cursor: str) -> dict:
+    """
+    Build the filter selecting documents after the cursor position
+    for a (sort_field DESC, _id DESC) ordering.
+
+    Documents missing sort_field sort last in descending order, so they
+    are always included after a non-null cursor value.
+    """
+    value, last_id = decode_cursor(cursor)
+
+    if value is None:
+        return {sort_field: None, "_id": {"$lt": last_id}}
+
+    return {"$or": [
+        {sort_field: {"$lt": value}},
+        {sort_field: value, "_id": {"$lt": last_id}},
+        {sort_field: None},
+    ]}
+
+
+def apply_keyset(query: dict, sort_field: str, cursor: Optional[str]) -> dict:
+    """Combine a base query with the keyset filter for cursor (if any)."""
+    if not cursor:
+        return query
+    after = keyset_filter(sort_field, cursor)
+    if not query:
+        return after
+    return {"$and": [query, after]}
@@ -181,6 +181,7 @@ const FeaturedVehicleCard = ({ vehicle, lang, copy, position }) => {
     price,
     mileage,
     primary_image_url,
+    primary_image_srcset,
     image_url,
     condition,
   } = vehicle;
@@ -261,9 +262,12 @@ const FeaturedVehicleCard = ({ vehicle, lang, copy, position }) => {
         <div className="fv-image-container">
           <img
             src={imageUrl}
+            srcSet={primary_image_srcset || undefined}
+            sizes="(max-width: 639px) 90vw, 280px"
             alt={title}
             loading="lazy"
             onError={(e) => {
+              e.currentTarget.removeAttribute("srcset");
               e.currentTarget.src = "/placeholder-car.svg";
             }}
           />
@@ -20,8 +20,8 @@ const CSVImportModal = ({ token, onClose, onSuccess }) => {
         setError("Please select a CSV file");
         return;
       }
-      if (selectedFile.size > 5 * 1024 * 1024) {
-        setError("File too large. Maximum size is 5MB");
+      if (selectedFile.size > 100 * 1024 * 1024) {
+        setError("File too large. Maximum size is 100MB");
         return;
       }
       setFile(selectedFile);
@@ -171,7 +171,7 @@ const CSVImportModal = ({ token, onClose, onSuccess }) => {
                 <div className="csv-dropzone-placeholder">
                   <span className="csv-upload-icon">📁</span>
                   <span>Click to select CSV file</span>
-                  <span className="csv-hint">Maximum 5MB</span>
+                  <span className="csv-hint">Maximum 100MB</span>
                 </div>
               )}
             </div>
@@ -267,14 +267,14 @@ const CSVImportModal = ({ token, onClose, onSuccess }) => {
             {/* Errors */}
             {previewData.errors.length > 0 && (
               <div className="csv-errors-section">
-                <h4>⚠️ Validation Errors ({previewData.errors.length})</h4>
+                <h4>⚠️ Validation Errors ({previewData.errors.length + (previewData.errors_truncated || 0)})</h4>
                 <div className="csv-errors-list">
                   {previewData.errors.slice(0, 10).map((err, idx) => (
                     <div key={idx} className="csv-error-item">{err}</div>
                   ))}
-                  {previewData.errors.length > 10 && (
+                  {previewData.errors.length + (previewData.errors_truncated || 0) > 10 && (
                     <div className="csv-error-more">
-                      ...and {previewData.errors.length - 10} more errors
+                      ...and {previewData.errors.length + (previewData.errors_truncated || 0) - 10} more errors
                     </div>
                   )}
                 </div>
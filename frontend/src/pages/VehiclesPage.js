@@ -242,6 +242,8 @@ const VehiclesPage = ({ initialFilters = {} }) => {
                 {v.image_url || (v.image_urls && v.image_urls[0]) ? (
                   <img
                     src={v.image_url || v.image_urls[0]}
+                    srcSet={v.primary_image_srcset || undefined}
+                    sizes="(min-width: 1280px) 33vw, (min-width: 768px) 50vw, 100vw"
                     alt={`${v.year} ${v.make} ${v.model}`}
                     className="mb-3 h-40 w-full rounded-lg bg-slate-200 object-cover"
                     loading="lazy"
@@ -13,6 +13,7 @@
  * @property {string|null} [exterior_color]
  * @property {string|null} [interior_color]
  * @property {string|null} [image_url]
+ * @property {string|null} [primary_image_srcset] - "url 320w, url 640w, ..." for <img srcSet>
  * @property {string[]} [image_urls]
  */
 
@@ -0,0 +1,149 @@
+"""
+Shared test fixtures.
+
+The backend modules are imported the way server.py imports them (backend/
+on sys.path). Async tests run on asyncio through the anyio pytest plugin.
+Outbound HTTP is exercised against StubHTTPServer, a real local HTTP/1.1
+server, so connection reuse, retries and concurrency are observed on the
+wire instead of mocked.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+# Read at import time by services/image_store.py - keep test blobs out of backend/data
+os.environ.setdefault("IMAGE_STORE_BACKEND", "local")
+os.environ.setdefault("IMAGE_STORE_PATH", tempfile.mkdtemp(prefix="cma-test-images-"))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+class StubResponse(NamedTuple):
+    status: int = 200
+    body: bytes = b""
+    headers: Dict[str, str] = {}
+    delay: float = 0.0
+
+
+class StubRequest(NamedTuple):
+    method: str
+    path: str
+    connection: int  # client port: one per TCP connection
+    headers: Dict[str, str]
+    body: bytes
+
+
+class StubHTTPServer:
+    """
+    Threaded local HTTP/1.1 server with scripted responses.
+
+    stub.add("/path", StubResponse(503), StubResponse(200, b"ok")) answers
+    the responses in order and keeps repeating the last one. Every request
+    is recorded, and the peak number of requests in flight is tracked.
+    """
+
+    def __init__(self):
+        self.routes: Dict[str, List[StubResponse]] = {}
+        self.requests: List[StubRequest] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def add(self, path: str, *responses: StubResponse) -> None:
+        self.routes[path] = list(responses)
+
+    def requests_for(self, path: str, method: Optional[str] = None) -> List[StubRequest]:
+        return [r for r in self.requests if r.path == path and (method is None or r.method == method)]
+
+    @property
+    def connections(self) -> set:
+        return {r.connection for r in self.requests}
+
+    def _next_response(self, path: str) -> StubResponse:
+        with self._lock:
+            responses = self.routes.get(path)
+            if not responses:
+                return StubResponse(404, b"not found")
+            return responses.pop(0) if len(responses) > 1 else responses[0]
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def _serve(self, send_body: bool):
+                length = int(self.headers.get("content-length") or 0)
+                body = self.rfile.read(length) if length else b""
+                with stub._lock:
+                    stub.requests.append(StubRequest(
+                        self.command, self.path, self.client_address[1], dict(self.headers), body
+                    ))
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    response = stub._next_response(self.path)
+                    if response.delay:
+                        time.sleep(response.delay)
+                    self.send_response(response.status)
+                    for name, value in response.headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", str(len(response.body)))
+                    self.end_headers()
+                    if send_body:
+                        self.wfile.write(response.body)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def do_GET(self):
+                self._serve(send_body=True)
+
+            def do_HEAD(self):
+                self._serve(send_body=False)
+
+            def do_POST(self):
+                self._serve(send_body=True)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StubHTTPServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stub_http():
+    server = StubHTTPServer().start()
+    yield server
+    server.stop()
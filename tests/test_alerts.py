@@ -0,0 +1,173 @@
+"""utils/alerts.py senders against a fake SMTP server and the local HTTP stub."""
+import asyncio
+import time
+
+import pytest
+
+from tests.conftest import StubResponse
+from utils import alerts, http_client
+
+pytestmark = pytest.mark.anyio
+
+LEAD = {"id": "lead-1", "lead_type": "contact", "first_name": "Ana", "last_name": "Ruiz", "phone": "555-0100"}
+
+
+class FakeSMTPServer:
+    """
+    Minimal ESMTP server (AUTH PLAIN/LOGIN, no TLS) that records sessions.
+
+    drop_on_mail makes the next N MAIL commands close the connection without
+    a reply, the way a server that timed out an idle session looks to the
+    client.
+    """
+
+    def __init__(self):
+        self.connections = 0
+        self.logins = 0
+        self.messages = []
+        self.drop_on_mail = 0
+        self._server = None
+
+    async def start(self) -> "FakeSMTPServer":
+        self._server = await asyncio.start_server(self._session, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+
+        async def reply(*lines: str) -> None:
+            writer.write("".join(f"{line}\r\n" for line in lines).encode())
+            await writer.drain()
+
+        try:
+            await reply("220 fake.smtp ESMTP")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                verb = line.decode().split(" ", 1)[0].strip().upper()
+                if verb == "EHLO":
+                    await reply("250-fake.smtp", "250 AUTH PLAIN LOGIN")
+                elif verb == "AUTH":
+                    self.logins += 1
+                    await reply("235 2.7.0 Authentication successful")
+                elif verb == "MAIL" and self.drop_on_mail:
+                    self.drop_on_mail -= 1
+                    break
+                elif verb == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = b""
+                    while not data.endswith(b"\r\n.\r\n"):
+                        chunk = await reader.readline()
+                        if not chunk:
+                            return
+                        data += chunk
+                    self.messages.append(data)
+                    await reply("250 2.0.0 Queued")
+                elif verb == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("250 OK")
+        finally:
+            writer.close()
+
+
+@pytest.fixture
+async def smtp_server(monkeypatch):
+    server = await FakeSMTPServer().start()
+    monkeypatch.setattr(alerts, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(alerts, "SMTP_PORT", server.port)
+    monkeypatch.setattr(alerts, "SMTP_USER", "alerts@dealer.test")
+    monkeypatch.setattr(alerts, "SMTP_PASS", "secret")
+    monkeypatch.setattr(alerts, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(alerts, "SMTP_TIMEOUT", 5)
+    monkeypatch.setattr(alerts, "ALERT_EMAIL_TO", "sales@dealer.test")
+    monkeypatch.setattr(alerts, "ALERT_EMAIL_FROM", "alerts@dealer.test")
+    monkeypatch.setattr(alerts, "_smtp", None)
+    yield server
+    await alerts.close_alert_clients()
+    await server.stop()
+
+
+async def test_email_reuses_one_logged_in_connection(smtp_server):
+    for i in range(3):
+        result = await alerts.send_email(f"Lead {i}", "body")
+        assert result["sent"], result
+
+    assert len(smtp_server.messages) == 3
+    assert smtp_server.connections == 1
+    assert smtp_server.logins == 1
+
+
+async def test_email_reconnects_once_when_the_server_dropped_the_connection(smtp_server):
+    assert (await alerts.send_email("First", "body"))["sent"]
+
+    smtp_server.drop_on_mail = 1
+    result = await alerts.send_email("Second", "body")
+
+    assert result["sent"], result
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 2
+    assert smtp_server.logins == 2
+
+    # Back on a live connection: no further reconnects or logins
+    assert (await alerts.send_email("Third", "body"))["sent"]
+    assert smtp_server.connections == 2
+    assert smtp_server.logins == 2
+
+
+async def test_email_does_not_retry_on_a_fresh_connection(smtp_server):
+    smtp_server.drop_on_mail = 2
+
+    result = await alerts.send_email("Lost", "body")
+
+    assert result["status"] == "error"
+    assert smtp_server.connections == 1
+    assert smtp_server.messages == []
+
+
+@pytest.fixture
+async def webhooks(stub_http, monkeypatch):
+    monkeypatch.setattr(alerts, "ALERTS_ENABLED", True)
+    monkeypatch.setattr(alerts, "ALERT_ON_NEW_LEAD", True)
+    monkeypatch.setattr(alerts, "SMTP_HOST", "")  # email stays deferred
+    monkeypatch.setattr(alerts, "TWILIO_API_URL", stub_http.base_url)
+    monkeypatch.setattr(alerts, "TWILIO_ACCOUNT_SID", "AC123")
+    monkeypatch.setattr(alerts, "TWILIO_AUTH_TOKEN", "token")
+    monkeypatch.setattr(alerts, "TWILIO_FROM", "+15550001")
+    monkeypatch.setattr(alerts, "ALERT_SMS_TO", "+15550002")
+    monkeypatch.setattr(alerts, "SLACK_WEBHOOK_URL", stub_http.url("/slack/hook"))
+    monkeypatch.setattr(http_client, "HTTP_PER_HOST_CONCURRENCY", 4)
+    await http_client.close_http_client()
+    stub_http.add("/2010-04-01/Accounts/AC123/Messages.json", StubResponse(201, b"{}", delay=0.3))
+    stub_http.add("/slack/hook", StubResponse(200, b"ok", delay=0.3))
+    yield stub_http
+    await http_client.close_http_client()
+
+
+async def test_channels_fan_out_concurrently_on_the_shared_client(webhooks):
+    client = http_client.get_http_client()
+
+    started = time.monotonic()
+    result = await alerts.notify_new_lead(LEAD)
+    elapsed = time.monotonic() - started
+
+    assert result["channels"]["sms"]["sent"] and result["channels"]["slack"]["sent"]
+    assert result["email_status"] == "deferred"
+    # Both 0.3 s provider calls were in flight together
+    assert webhooks.max_in_flight == 2
+    assert elapsed < 0.55
+
+    # A second round goes over the same client and its kept-alive connections
+    await alerts.notify_new_lead(LEAD)
+    assert http_client.get_http_client() is client
+    assert len(webhooks.requests) == 4
+    assert len(webhooks.connections) == 2
+    sms = webhooks.requests_for("/2010-04-01/Accounts/AC123/Messages.json", "POST")[0]
+    assert b"From=%2B15550001" in sms.body
@@ -0,0 +1,85 @@
+"""utils/http_client.py against a local stub server."""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from tests.conftest import StubResponse
+from utils import http_client
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def shared_client(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF_SECONDS", 0.05)
+    monkeypatch.setattr(http_client, "HTTP_PER_HOST_CONCURRENCY", 3)
+    await http_client.close_http_client()
+    yield http_client
+    await http_client.close_http_client()
+
+
+async def test_retries_throttling_and_unavailable_then_succeeds(stub_http, shared_client):
+    stub_http.add("/photo.jpg", StubResponse(429), StubResponse(503), StubResponse(200, b"jpeg-bytes"))
+
+    started = time.monotonic()
+    body = await shared_client.fetch_bytes(stub_http.url("/photo.jpg"))
+    elapsed = time.monotonic() - started
+
+    assert body == b"jpeg-bytes"
+    assert len(stub_http.requests_for("/photo.jpg")) == 3
+    # Backoff of attempts 0 and 1 with the smallest jitter: 0.05 * (1 + 2) * 0.5
+    assert elapsed >= 0.075
+    # Retries reuse the keep-alive connection
+    assert len(stub_http.connections) == 1
+
+
+async def test_gives_up_after_retries(stub_http, shared_client):
+    stub_http.add("/down.jpg", StubResponse(503))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await shared_client.fetch_bytes(stub_http.url("/down.jpg"), retries=2)
+
+    assert len(stub_http.requests_for("/down.jpg")) == 3
+
+
+async def test_client_errors_are_not_retried(stub_http, shared_client):
+    stub_http.add("/missing.jpg", StubResponse(404))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await shared_client.fetch_bytes(stub_http.url("/missing.jpg"))
+
+    assert len(stub_http.requests_for("/missing.jpg")) == 1
+
+
+async def test_retry_after_header_sets_the_delay():
+    throttled = httpx.Response(429, headers={"Retry-After": "7"})
+    assert http_client._retry_delay(0, throttled) == 7.0
+
+    capped = httpx.Response(429, headers={"Retry-After": "3600"})
+    assert http_client._retry_delay(0, capped) == 30.0
+
+
+async def test_per_host_concurrency_is_capped(stub_http, shared_client):
+    for i in range(12):
+        stub_http.add(f"/slow/{i}.jpg", StubResponse(200, b"x", delay=0.1))
+
+    bodies = await asyncio.gather(*(
+        shared_client.fetch_bytes(stub_http.url(f"/slow/{i}.jpg")) for i in range(12)
+    ))
+
+    assert bodies == [b"x"] * 12
+    assert stub_http.max_in_flight == 3
+    # Pooled: at most one connection per concurrent slot, not one per request
+    assert len(stub_http.connections) <= 3
+
+
+async def test_fetch_validator_returns_etag(stub_http, shared_client):
+    stub_http.add("/tagged.jpg", StubResponse(200, headers={"ETag": '"v1"'}))
+    stub_http.add("/plain.jpg", StubResponse(200))
+
+    assert await shared_client.fetch_validator(stub_http.url("/tagged.jpg")) == '"v1"'
+    assert await shared_client.fetch_validator(stub_http.url("/plain.jpg")) is None
+    assert await shared_client.fetch_validator(stub_http.url("/nowhere.jpg")) is None
+    assert [r.method for r in stub_http.requests] == ["HEAD", "HEAD", "HEAD"]
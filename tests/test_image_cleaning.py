@@ -0,0 +1,87 @@
+"""Batch image cleaning end to end: dealer photos served by a local stub."""
+import io
+
+import pytest
+from PIL import Image
+
+from tests.conftest import StubResponse
+from services import image_cleaning_service, image_pipeline, image_store
+from utils import http_client
+
+pytestmark = pytest.mark.anyio
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def jpeg_bytes(color, size=(640, 480)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+async def db(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF_SECONDS", 0.01)
+    monkeypatch.setattr(http_client, "HTTP_PER_HOST_CONCURRENCY", 2)
+    await http_client.close_http_client()
+    database = mongomock_motor.AsyncMongoMockClient()["cleaning_test"]
+    image_store.init_image_store(database, backend="local")
+    yield database
+    await http_client.close_http_client()
+    image_pipeline.shutdown_image_pipeline()
+
+
+async def test_batch_cleaning_end_to_end(stub_http, db):
+    shared = "/photos/shared.jpg"
+    stub_http.add(shared, StubResponse(200, jpeg_bytes((200, 0, 0)), {"ETag": '"shared-1"'}))
+    # A flaky CDN: the validator HEAD and the first download are throttled
+    stub_http.add(
+        "/photos/flaky.jpg", StubResponse(429), StubResponse(429), StubResponse(200, jpeg_bytes((0, 0, 200)))
+    )
+
+    vehicles = []
+    for v in range(3):
+        paths = [shared] + [f"/photos/{v}-{i}.jpg" for i in range(3)]
+        for i in range(3):
+            stub_http.add(f"/photos/{v}-{i}.jpg", StubResponse(200, jpeg_bytes((10 * v, 20 * i, 90))))
+        if v == 0:
+            paths.append("/photos/flaky.jpg")
+        vehicles.append({
+            "stock_number": f"STK{v}",
+            "vin": f"VIN{v}",
+            "is_active": True,
+            "images": [{"url": stub_http.url(path), "is_primary": i == 0} for i, path in enumerate(paths)],
+        })
+    await db["admin_vehicles"].insert_many(vehicles)
+
+    progress = []
+
+    async def record(update):
+        progress.append(update)
+
+    result = await image_cleaning_service.run_batch_image_cleaning(db, progress=record)
+
+    assert result["vehicles_checked"] == 3
+    assert result["images_processed"] == 13
+    assert result["errors"] == []
+    assert progress[-1] == {"vehicles_done": 3, "vehicles_total": 3, "images_processed": 13}
+
+    async for vehicle in db["admin_vehicles"].find():
+        for img in vehicle["images"]:
+            assert img["source_url"].startswith(stub_http.base_url)
+            assert "/api/images/" in img["url"] and "/api/images/" in img["thumbnail_url"]
+            upload_id, variant = img["url"].split("/api/images/", 1)[1].split("/")
+            assert await image_store.get_image_store().stat(upload_id, variant) is not None
+        assert vehicle["primary_thumbnail_url"] == vehicle["images"][0]["thumbnail_url"]
+
+    # The photo shared by all three vehicles is downloaded and stored once
+    assert len(stub_http.requests_for(shared, "GET")) == 1
+    shared_blob = await db["image_blobs"].find_one({"refcount": 3})
+    assert shared_blob is not None
+    # The throttled photo was retried, never more than two requests at once
+    assert len(stub_http.requests_for("/photos/flaky.jpg", "GET")) == 2
+    assert stub_http.max_in_flight <= 2
+
+    # A second run finds nothing left to clean
+    again = await image_cleaning_service.run_batch_image_cleaning(db)
+    assert again["vehicles_checked"] == 0
@@ -0,0 +1,60 @@
+"""Which image entries count as stored, and releasing them on a rewrite."""
+import pytest
+
+from services import csv_import_service, image_store
+from services.image_service import migrate_legacy_photo_urls
+
+pytestmark = pytest.mark.anyio
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+VIN = "1HGCM82633A004352"
+
+
+@pytest.fixture
+async def db():
+    database = mongomock_motor.AsyncMongoMockClient()["image_store_test"]
+    image_store.init_image_store(database, backend="local")
+    yield database
+
+
+def test_migrated_remote_urls_are_not_stored_images():
+    migrated = migrate_legacy_photo_urls(["https://dealer.example/1.jpg", "https://dealer.example/2.jpg"])
+    assert all(img["upload_id"] for img in migrated)
+
+    assert not image_store.has_stored_images(migrated)
+    assert image_store.is_stored_image({"url": "/api/images/abc/full", "upload_id": "abc"})
+    assert image_store.is_stored_image({"url": "https://cdn/x.jpg", "blob_id": "b1"})
+
+
+async def test_release_skips_migrated_remote_entries(db, monkeypatch):
+    urls = await image_store.store_variants("real", {"full": b"bytes"})
+    stored = {"url": urls["full"], "upload_id": "real"}
+    [remote] = migrate_legacy_photo_urls(["https://dealer.example/1.jpg"])
+
+    deleted = []
+    delete_upload = image_store.get_image_store().delete_upload
+
+    async def spy(upload_id):
+        deleted.append(upload_id)
+        return await delete_upload(upload_id)
+    monkeypatch.setattr(image_store.get_image_store(), "delete_upload", spy)
+
+    await image_store.release_replaced_images([stored, remote], [])
+
+    assert deleted == ["real"]
+
+
+async def test_csv_import_replaces_migrated_remote_photos(db):
+    images = migrate_legacy_photo_urls(["https://dealer.example/old.jpg"])
+    await db["admin_vehicles"].insert_one({"vin": VIN, "make": "Honda", "images": images})
+
+    csv = (
+        "vin,year,make,model,price,primary_image_url\n"
+        f"{VIN},2020,Honda,Accord,18995,https://dealer.example/new.jpg\n"
+    ).encode()
+    result = await csv_import_service.process_csv_import(csv, db)
+
+    assert result["counts"]["updated"] == 1
+    vehicle = await db["admin_vehicles"].find_one({"vin": VIN})
+    assert [img["url"] for img in vehicle["images"]] == ["https://dealer.example/new.jpg"]
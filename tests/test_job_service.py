@@ -0,0 +1,39 @@
+"""services/job_service.py submission rules on an in-memory database."""
+import pytest
+
+from services import job_service
+
+pytestmark = pytest.mark.anyio
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+async def jobs(monkeypatch):
+    monkeypatch.setattr(job_service, "_handlers", {})
+    database = mongomock_motor.AsyncMongoMockClient()["jobs_test"]
+    job_service.init_job_store(database)
+
+    async def handler(ctx):
+        return {}
+    job_service.register_job_handler("csv_import", handler)
+    yield database["jobs"]
+
+
+async def test_one_active_job_per_type(jobs):
+    first = await job_service.submit_job("csv_import", {"dry_run": False})
+
+    with pytest.raises(job_service.JobConflictError) as conflict:
+        await job_service.submit_job("csv_import", {"dry_run": False})
+    assert conflict.value.job_id == first["_id"]
+
+
+async def test_dry_runs_neither_block_nor_are_blocked(jobs):
+    preview = await job_service.submit_job("csv_import", {"dry_run": True})
+    assert "active" not in preview
+
+    real = await job_service.submit_job("csv_import", {"dry_run": False})
+    assert real["active"] is True
+    await job_service.submit_job("csv_import", {"dry_run": True})
+
+    assert await jobs.count_documents({"status": "queued"}) == 3
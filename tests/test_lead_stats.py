@@ -0,0 +1,46 @@
+"""services/lead_stats.py caching around concurrent lead writes."""
+import pytest
+
+from services import lead_stats
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeLeads:
+    """aggregate() yields one $facet document; on_aggregate runs mid-scan."""
+
+    def __init__(self, total: int, on_aggregate=None):
+        self.total = total
+        self.on_aggregate = on_aggregate
+        self.aggregations = 0
+
+    async def aggregate(self, pipeline):
+        self.aggregations += 1
+        if self.on_aggregate:
+            self.on_aggregate()
+        yield {"totals": [{"_id": None, "total": self.total, "new": 0}]}
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    lead_stats.invalidate_lead_stats()
+    yield
+    lead_stats.invalidate_lead_stats()
+
+
+async def test_summary_is_cached():
+    leads = FakeLeads(3)
+
+    assert (await lead_stats.get_lead_stats(leads))["total"] == 3
+    assert (await lead_stats.get_lead_stats(leads))["total"] == 3
+    assert leads.aggregations == 1
+
+
+async def test_write_during_aggregation_is_not_cached_stale():
+    # A lead is saved (and invalidates) while the aggregation is running
+    racing = FakeLeads(3, on_aggregate=lead_stats.invalidate_lead_stats)
+    assert (await lead_stats.get_lead_stats(racing))["total"] == 3
+
+    fresh = FakeLeads(4)
+    assert (await lead_stats.get_lead_stats(fresh))["total"] == 4
+    assert fresh.aggregations == 1
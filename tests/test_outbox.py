@@ -0,0 +1,80 @@
+"""services/outbox_service.py workers on an in-memory database."""
+import asyncio
+
+import pytest
+
+from services import outbox_service
+
+pytestmark = pytest.mark.anyio
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+async def outbox(monkeypatch):
+    monkeypatch.setattr(outbox_service, "OUTBOX_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(outbox_service, "_channels", {})
+    monkeypatch.setattr(outbox_service, "_digests", {})
+    monkeypatch.setattr(outbox_service, "_counters", {})
+    database = mongomock_motor.AsyncMongoMockClient()["outbox_test"]
+    outbox_service.init_outbox(database)
+    yield database["outbox"]
+    await outbox_service.stop_outbox_workers()
+
+
+async def wait_for(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+async def test_broken_digest_dead_letters_the_group_and_worker_survives(outbox):
+    sent = []
+
+    async def sender(payload):
+        sent.append(payload)
+        return {"sent": True, "status": "sent"}
+
+    def broken_digest(payloads):
+        raise KeyError("subject")
+
+    outbox_service.register_outbox_channel("email", sender, workers=1, digest=broken_digest)
+    await outbox_service.enqueue_outbox_messages(
+        [("email", {"n": 1}), ("email", {"n": 2})],
+        digest_keys={"email": "email:sales"}, digest_window_seconds=0.01,
+    )
+    await asyncio.sleep(0.02)
+    outbox_service.start_outbox_workers()
+
+    async def group_dead():
+        return await outbox.count_documents({"status": "dead"}) == 2
+    await wait_for(group_dead)
+    dead = await outbox.find_one({"status": "dead"})
+    assert dead["last_error"].startswith("Digest failed")
+    assert sent == []
+
+    # The same worker still delivers what comes next
+    await outbox_service.enqueue_outbox_messages([("email", {"n": 3})])
+
+    async def delivered():
+        return await outbox.count_documents({"status": "sent"}) == 1
+    await wait_for(delivered)
+    assert sent == [{"n": 3}]
+
+
+async def test_malformed_sender_result_is_retried(outbox):
+    async def sender(payload):
+        return None
+
+    outbox_service.register_outbox_channel("slack", sender, workers=1)
+    [message_id] = await outbox_service.enqueue_outbox_messages([("slack", {"text": "hi"})])
+    outbox_service.start_outbox_workers()
+
+    async def rescheduled():
+        message = await outbox.find_one({"_id": message_id})
+        return message["status"] == "pending" and message["attempts"] == 1
+    await wait_for(rescheduled)
+    message = await outbox.find_one({"_id": message_id})
+    assert "Sender returned None" in message["last_error"]
+    assert all(not task.done() for task in outbox_service._workers)